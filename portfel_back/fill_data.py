@@ -5,7 +5,6 @@ from datetime import datetime, timedelta
 from django.utils import timezone
 from decimal import Decimal, ROUND_HALF_UP
 from django.db.models import Max
-from django.db import transaction
 from django.contrib.auth import get_user_model # <--- ИМПОРТИРОВАТЬ
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'portfel.settings')
@@ -16,6 +15,7 @@ User = get_user_model() # <--- ПОЛУЧИТЬ МОДЕЛЬ USER
 
 # Импортируем модели из вашего приложения
 from portfel_online.models import AssetTypes, Assets, Portfolios, PortfolioAssets, Deals, DealSource
+from portfel_online.valuation import revalue_portfolios
 # НЕ ИМПОРТИРУЕМ AuthUser, она не нужна
 
 NUM_PORTFOLIOS = 5
@@ -189,60 +189,11 @@ def create_portfolio_assets(portfolios, all_assets, assets_per_portfolio=NUM_ASS
 
     print(f"Создано {created_portfolio_assets_count} / Обновлено {updated_portfolio_assets_count} записей PortfolioAssets.")
 
-# --- (recalculate_all_portfolios - без изменений) ---
+# --- (recalculate_all_portfolios - общий движок переоценки из portfel_online.valuation) ---
+# Как и в API, без текущих цен profit_loss и yield_percent нулевые (прежний скрипт записывал -себестоимость)
 def recalculate_all_portfolios(portfolios):
     print("Пересчет агрегированных данных портфелей...")
-    updated_count = 0
-    for portfolio in portfolios:
-        total_portfolio_value = Decimal('0.0')
-        total_portfolio_cost = Decimal('0.0')
-
-        with transaction.atomic():
-            portfolio_assets = PortfolioAssets.objects.filter(portfolio=portfolio).select_related('asset')
-
-            if not portfolio_assets.exists():
-                portfolio.total_value = 0
-                portfolio.profit_loss = Decimal('0.00')
-                portfolio.yield_percent = Decimal('0.0000')
-                portfolio.annual_yield = Decimal('0.0000')
-                portfolio.save(update_fields=['total_value', 'profit_loss', 'yield_percent', 'annual_yield'])
-                updated_count += 1
-                continue
-
-            for pa in portfolio_assets:
-                current_price = pa.asset.current_price
-                asset_total_value = Decimal('0.0')
-
-                if current_price is not None and pa.quantity is not None:
-                    asset_total_value = (pa.quantity * current_price).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                    total_portfolio_value += asset_total_value
-
-                if pa.total_value != asset_total_value:
-                     pa.total_value = asset_total_value
-                     pa.save(update_fields=['total_value'])
-
-                if pa.average_price is not None and pa.quantity is not None:
-                   total_portfolio_cost += (pa.quantity * pa.average_price)
-
-            total_portfolio_value = total_portfolio_value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-            total_portfolio_cost = total_portfolio_cost.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-            portfolio.total_value = int(total_portfolio_value) if total_portfolio_value == total_portfolio_value.to_integral_value() else total_portfolio_value
-
-            profit_loss = total_portfolio_value - total_portfolio_cost
-            portfolio.profit_loss = profit_loss
-
-            if total_portfolio_cost > 0:
-                yield_percent = (profit_loss / total_portfolio_cost) * 100
-                portfolio.yield_percent = yield_percent.quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
-            else:
-                portfolio.yield_percent = Decimal('0.0000')
-
-            portfolio.annual_yield = Decimal('0.0000')
-
-            portfolio.save(update_fields=['total_value', 'profit_loss', 'yield_percent', 'annual_yield'])
-            updated_count += 1
-
+    updated_count = revalue_portfolios(portfolios.values_list('Port_ID', flat=True))
     print(f"Обновлено {updated_count} портфелей.")
 
 # --- (create_deals - без изменений) ---
@@ -13,4 +13,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'portfel.settings')
 
-application = get_asgi_application()
+# Django инициализируется до импорта consumers (они импортируют модели)
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+
+from portfel_online.consumers import QueryTokenAuthMiddleware  # noqa: E402
+from portfel_online.routing import websocket_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    'websocket': AllowedHostsOriginValidator(
+        QueryTokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+    ),
+})
@@ -1,3 +1,5 @@
+import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 # from decouple import config
@@ -27,8 +29,42 @@ CORS_ALLOWED_ORIGINS = [
 ALLOWED_HOSTS=['*']
 
 
-REDIS_HOST = 'localhost'
-REDIS_PORT = 6379
+# Без REDIS_HOST кэш и channel layer живут в памяти процесса (один воркер, разработка)
+REDIS_HOST = os.environ.get('REDIS_HOST', '')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+
+# Кэш каталога активов: Redis, если он настроен (REDIS_HOST не пустой), иначе память процесса
+if REDIS_HOST:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/1',
+            'KEY_PREFIX': 'portfel',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'portfel',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+CATALOG_CACHE_TIMEOUT = 300
+
+# Шаг исторических снимков стоимости портфелей: 'day' или 'hour' (команда snapshot_portfolios)
+PORTFOLIO_SNAPSHOT_INTERVAL = 'day'
+# Годовая безрисковая ставка для Sharpe/Sortino в /portfolios/{id}/analytics/
+ANALYTICS_RISK_FREE_RATE = 0.0
+
+# Tinkoff Invest API: адрес gRPC и таймаут одного вызова в секундах.
+# TINKOFF_API_INSECURE=1 — канал без TLS, для локального стенда (команда tinkoff_stub_server)
+TINKOFF_API_TARGET = os.environ.get('TINKOFF_API_TARGET', 'invest-public-api.tinkoff.ru:443')
+TINKOFF_API_INSECURE = os.environ.get('TINKOFF_API_INSECURE') == '1'
+TINKOFF_API_TIMEOUT = float(os.environ.get('TINKOFF_API_TIMEOUT', 10))
+# Время жизни кэша портфеля Tinkoff (кнопка "обновить") и выбранного счета, в секундах
+TINKOFF_PORTFOLIO_CACHE_TTL = 30
+TINKOFF_ACCOUNT_CACHE_TTL = 60 * 60
 
 # Установленные пакеты
 
@@ -39,6 +75,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # DRF
     'rest_framework',
@@ -46,6 +83,7 @@ INSTALLED_APPS = [
     'django_filters',
     'corsheaders',
     'djoser',
+    'channels',
     # Наше приложение
     'portfel_online',
 ]
@@ -63,14 +101,19 @@ DJOSER = {
 
 
 MIDDLEWARE = [
+    # Первым — чтобы Server-Timing и /metrics учитывали время всех остальных middleware
+    'portfel_online.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'portfel_online.dbrouting.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    # Последним — оборачивает только вьюху
+    'portfel_online.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'portfel.urls'
@@ -94,6 +137,37 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'portfel.wsgi.application'
+ASGI_APPLICATION = 'portfel.asgi.application'
+
+# Channel layer для WebSocket-пушей: Redis при REDIS_HOST (несколько воркеров), иначе память процесса
+if REDIS_HOST:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [(REDIS_HOST, REDIS_PORT)]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+# Не чаще одного сообщения portfolio.update на соединение за этот интервал
+PORTFOLIO_PUSH_INTERVAL_MS = 500
+
+# Метрики запросов: заголовок Server-Timing (SQL, сериализация, Tinkoff) и /metrics для Prometheus.
+# METRICS_TOKEN — если задан, /metrics отдается только с Authorization: Bearer <token>.
+# Без токена — сотрудникам (is_staff) по Token/JWT и адресам из METRICS_ALLOWED_NETWORKS="10.0.0.0/8,...".
+# Сети сверяются с REMOTE_ADDR: за reverse proxy это адрес прокси, его сеть сюда добавлять нельзя
+SERVER_TIMING_ENABLED = True
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_NETWORKS = [
+    network.strip() for network in os.environ.get('METRICS_ALLOWED_NETWORKS', '').split(',') if network.strip()
+]
+
+# Профилирование запросов: X-Profile: 1 или ?profile=1 от сотрудника, плюс доля случайных запросов.
+# Профили (pstats + JSON) — в PROFILING_DIR, хранятся последние PROFILING_KEEP; список — /profiles/
+PROFILING_ENABLED = True
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_DIR = os.environ.get('PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'portfel-profiles'))
+PROFILING_KEEP = 200
 
 
 # Database
@@ -110,6 +184,28 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: DATABASE_REPLICAS="host[:port][/name],..." — недостающее берется из default.
+# Для локальной проверки хватит второй базы на том же сервере: DATABASE_REPLICAS=localhost/invest_db_replica.
+# В тестах реплики зеркалят default (TEST.MIRROR), отдельные тестовые базы не создаются
+DATABASE_REPLICAS = []
+for _index, _replica in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), start=1):
+    _address, _, _name = _replica.strip().partition('/')
+    _host, _, _port = _address.partition(':')
+    DATABASES[f'replica_{_index}'] = {
+        **DATABASES['default'],
+        'HOST': _host or DATABASES['default']['HOST'],
+        'PORT': _port or DATABASES['default']['PORT'],
+        'NAME': _name or DATABASES['default']['NAME'],
+        'OPTIONS': {'connect_timeout': 2},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{_index}')
+DATABASE_ROUTERS = ['portfel_online.dbrouting.ReplicaRouter']
+# После записи пользователь столько секунд читает с primary
+DATABASE_STICKY_SECONDS = int(os.environ.get('DATABASE_STICKY_SECONDS', 5))
+DATABASE_REPLICA_CHECK_INTERVAL = 5
+DATABASE_REPLICA_MAX_LAG_SECONDS = float(os.environ.get('DATABASE_REPLICA_MAX_LAG_SECONDS', 10))
+
 
 
 
@@ -168,7 +264,14 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
-    )
+    ),
+    # application/json по умолчанию; бинарный и быстрый JSON — по заголовку Accept
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'portfel_online.renderers.FastJSONRenderer',
+        'portfel_online.renderers.MessagePackRenderer',
+    ),
 }
 
 # Internationalization
@@ -1,9 +1,10 @@
 # portfel_back/urls.py
 
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework_nested import routers
 from portfel_online import views
+from portfel_online.async_views import AsyncReadView
 
 router = routers.DefaultRouter()
 router.register(r'asset-types', views.AssetTypesViewSet)
@@ -11,6 +12,7 @@ router.register(r'deal-sources', views.DealSourceViewSet)
 router.register(r'assets', views.AssetsViewSet)
 router.register(r'portfolios', views.PortfoliosViewSet, basename='portfolio')
 router.register(r'portfolio-assets', views.PortfolioAssetsViewSet, basename='portfolioasset')
+router.register(r'deals', views.DealsViewSet, basename='deal')
 router.register(r'users', views.AuthUserViewSet)
 
 portfolios_router = routers.NestedDefaultRouter(router, r'portfolios', lookup='portfolio')
@@ -23,5 +25,22 @@ urlpatterns = [
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.jwt')),
     path('tinkoff/portfolio/', views.TinkoffPortfolioView.as_view(), name='tinkoff-portfolio'),
+    path('tinkoff/portfolio/async/', views.AsyncTinkoffPortfolioView.as_view(), name='tinkoff-portfolio-async'),
+    # Асинхронные версии read-эндпоинтов для ASGI-деплоя: те же ответы, но не быстрее синхронных (bench_http)
+    path('async/assets/', AsyncReadView.as_view(
+        viewset_class=views.AssetsViewSet, basename='assets'), name='async-assets-list'),
+    path('async/assets/<pk>/', AsyncReadView.as_view(
+        viewset_class=views.AssetsViewSet, basename='assets', action='retrieve'), name='async-assets-detail'),
+    path('async/portfolios/', AsyncReadView.as_view(
+        viewset_class=views.PortfoliosViewSet, basename='portfolio'), name='async-portfolio-list'),
+    # Числовой pk, как lookup_value_regex у PortfoliosViewSet
+    re_path(r'^async/portfolios/(?P<pk>\d+)/$', AsyncReadView.as_view(
+        viewset_class=views.PortfoliosViewSet, basename='portfolio', action='retrieve'), name='async-portfolio-detail'),
+    re_path(r'^async/portfolios/(?P<portfolio_pk>\d+)/deals/$', AsyncReadView.as_view(
+        viewset_class=views.DealsViewSet, basename='portfolio-deals'), name='async-portfolio-deals-list'),
+    path('prices/ticks/', views.PriceTicksView.as_view(), name='price-ticks'),
+    path('metrics', views.MetricsView.as_view(), name='metrics'),
+    path('profiles/', views.ProfilesView.as_view(), name='profile-list'),
+    path('profiles/<str:profile_id>/', views.ProfileDownloadView.as_view(), name='profile-download'),
     # path('admin/', admin.site.urls),
 ]
\ No newline at end of file
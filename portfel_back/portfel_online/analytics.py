@@ -0,0 +1,129 @@
+import logging
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import FloatField, Max
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import PortfolioAssets, PortfolioSnapshots
+
+logger = logging.getLogger(__name__)
+
+PERIODS_PER_YEAR = {'day': 365, 'hour': 365 * 24}
+ANALYTICS_CACHE_TIMEOUT = 60 * 60
+
+
+def load_positions(portfolio_id):
+    """Стоимость, beta и risk_level позиций — сразу float из БД, без Decimal на строку."""
+    rows = PortfolioAssets.objects.filter(portfolio_id=portfolio_id).values_list(
+        Cast('total_value', FloatField()),
+        Cast('asset__beta', FloatField()),
+        Cast('asset__asset_type__risk_level', FloatField()),
+    )
+    data = np.array(list(rows), dtype=np.float64).reshape(-1, 3)
+    return data[:, 0], data[:, 1], data[:, 2]
+
+
+def load_series(portfolio_id, since):
+    rows = PortfolioSnapshots.objects.filter(portfolio_id=portfolio_id, taken_at__gte=since).order_by(
+        'taken_at'
+    ).values_list(Cast('total_value', FloatField()), Cast('profit_loss', FloatField()))
+    data = np.array(list(rows), dtype=np.float64).reshape(-1, 2)
+    return data[:, 0], data[:, 1]
+
+
+def period_returns(values, profit_loss):
+    """Доходности по периодам без учета пополнений: ΔP&L / стоимость на начало периода."""
+    if values.size < 2:
+        return np.empty(0)
+    base = values[:-1]
+    returns = np.divide(np.diff(profit_loss), base, out=np.zeros_like(base), where=base > 0)
+    return returns
+
+
+def weighted_average(weights, values):
+    total = weights.sum()
+    if total <= 0:
+        return None
+    return float(np.dot(weights, values) / total)
+
+
+def max_drawdown(returns):
+    if returns.size == 0:
+        return None
+    wealth = np.cumprod(1.0 + returns)
+    peaks = np.maximum.accumulate(np.concatenate(([1.0], wealth)))[1:]
+    return float((wealth / peaks - 1.0).min())
+
+
+def risk_metrics(returns, periods_per_year, risk_free_rate=0.0):
+    if returns.size < 2:
+        return {'volatility': None, 'sharpe': None, 'sortino': None, 'mean_return': None}
+    excess = returns - risk_free_rate / periods_per_year
+    std = returns.std(ddof=1)
+    downside = np.sqrt(np.mean(np.minimum(excess, 0.0) ** 2))
+    annualizer = np.sqrt(periods_per_year)
+    return {
+        'volatility': float(std * annualizer),
+        'sharpe': float(excess.mean() / std * annualizer) if std > 0 else None,
+        'sortino': float(excess.mean() / downside * annualizer) if downside > 0 else None,
+        'mean_return': float(returns.mean() * periods_per_year),
+    }
+
+
+def _rounded(metrics):
+    return {key: (round(value, 6) if isinstance(value, float) else value) for key, value in metrics.items()}
+
+
+def compute_analytics(portfolio_id, window_days=365):
+    """Риск-метрики портфеля по его снимкам за ``window_days`` дней.
+
+    Это приближение, а не расчет по истории цен. Доходности берутся из
+    снимков портфеля (ΔP&L за период / стоимость на начало периода), поэтому
+    точность ограничена шагом снимков, а пропущенные снимки сливаются в один
+    длинный период. weighted_beta и weighted_risk_level — средние beta и
+    risk_level из справочника активов, взвешенные по текущей стоимости
+    позиций, а не регрессия доходностей на рынок.
+    """
+    interval = getattr(settings, 'PORTFOLIO_SNAPSHOT_INTERVAL', 'day')
+    periods_per_year = PERIODS_PER_YEAR.get(interval, 365)
+    values, betas, risk_levels = load_positions(portfolio_id)
+    series_values, series_pnl = load_series(portfolio_id, timezone.now() - timedelta(days=window_days))
+    returns = period_returns(series_values, series_pnl)
+
+    metrics = {
+        'positions': int(values.size),
+        'total_value': float(values.sum()),
+        'weighted_beta': weighted_average(values, betas),
+        'weighted_risk_level': weighted_average(values, risk_levels),
+        'observations': int(returns.size),
+        'max_drawdown': max_drawdown(returns),
+    }
+    metrics.update(risk_metrics(returns, periods_per_year, getattr(settings, 'ANALYTICS_RISK_FREE_RATE', 0.0)))
+    return _rounded(metrics)
+
+
+def get_portfolio_analytics(portfolio_id, version, window_days=365):
+    """Аналитика с кэшем на версию портфеля и последний снимок.
+
+    Версия меняется при любых сделках и переоценке, а новый снимок
+    добавляет точку в ряд доходностей, поэтому оба входят в ключ.
+    """
+    latest = PortfolioSnapshots.objects.filter(portfolio_id=portfolio_id).aggregate(latest=Max('taken_at'))['latest']
+    key = f"analytics:{portfolio_id}:v{version}:{latest.timestamp() if latest else 0}:{window_days}"
+    try:
+        result = cache.get(key)
+    except Exception as e:
+        logger.error(f"Analytics cache unavailable for portfolio {portfolio_id}: {e}")
+        result = None
+    if result is not None:
+        return result
+    result = compute_analytics(portfolio_id, window_days)
+    try:
+        cache.set(key, result, timeout=ANALYTICS_CACHE_TIMEOUT)
+    except Exception as e:
+        logger.error(f"Failed to cache analytics for portfolio {portfolio_id}: {e}")
+    return result
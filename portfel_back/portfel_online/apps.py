@@ -0,0 +1,21 @@
+from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import pre_migrate
+
+
+def ensure_postgres_extensions(sender, using='default', **kwargs):
+    # Миграции приложения не хранятся в репозитории, поэтому расширения
+    # для индексов (gin_trgm_ops) включаем перед каждым migrate
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+
+class PortfelOnlineConfig(AppConfig):
+    name = 'portfel_online'
+
+    def ready(self):
+        pre_migrate.connect(ensure_postgres_extensions, sender=self)
+        from . import caching, conditional, metrics  # noqa: F401 — сигналы кэша, версий портфелей и учет SQL
@@ -0,0 +1,31 @@
+import csv
+import io
+
+from django.db import connection
+
+BULK_BATCH_SIZE = 1000
+
+
+def copy_rows(model, field_names, rows):
+    """COPY ... FROM STDIN через psycopg2: без моделей и INSERT, в разы быстрее bulk_create.
+
+    ``rows`` — кортежи значений в порядке ``field_names``; None пишется как NULL.
+    """
+    opts = model._meta
+    columns = ', '.join(connection.ops.quote_name(opts.get_field(name).column) for name in field_names)
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {connection.ops.quote_name(opts.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+
+
+def insert_rows(model, field_names, rows, batch_size=BULK_BATCH_SIZE):
+    """Пачка строк в таблицу модели: COPY на PostgreSQL, иначе bulk_create."""
+    if connection.vendor == 'postgresql':
+        copy_rows(model, field_names, rows)
+        return
+    attnames = [model._meta.get_field(name).attname for name in field_names]
+    model.objects.bulk_create([model(**dict(zip(attnames, row))) for row in rows], batch_size=batch_size)
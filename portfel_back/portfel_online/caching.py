@@ -0,0 +1,320 @@
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.response import Response
+
+from .dbrouting import use_primary
+from .models import AssetTypes, Assets
+
+logger = logging.getLogger(__name__)
+
+ASSETS_NAMESPACE = 'assets'
+ASSET_TYPES_NAMESPACE = 'asset-types'
+
+LOCK_TIMEOUT = 10
+LOCK_WAIT_SECONDS = 2.0
+LOCK_POLL_INTERVAL = 0.05
+
+# Ключи версий живут дольше ответов (CATALOG_CACHE_TIMEOUT), но не вечно: версия на каждый
+# запрошенный /assets/<pk>/, включая несуществующие, иначе копилась бы в Redis без предела.
+# Истекшая версия создается заново от времени и не совпадает со старыми ключами ответов
+VERSION_TIMEOUT = 24 * 60 * 60
+
+
+# Кэши в памяти процесса: их a*-методы — тот же синхронный вызов, обернутый в sync_to_async
+IN_PROCESS_CACHE_BACKENDS = (LocMemCache, DummyCache)
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def in_process_cache():
+    return isinstance(get_cache(), IN_PROCESS_CACHE_BACKENDS)
+
+
+async def _acall(cache, method, *args, **kwargs):
+    # Кэш в памяти процесса не ждет сети — вызывается прямо в цикле событий, без перехода в поток
+    if isinstance(cache, IN_PROCESS_CACHE_BACKENDS):
+        return getattr(cache, method)(*args, **kwargs)
+    return await getattr(cache, f'a{method}')(*args, **kwargs)
+
+
+def _version_key(namespace):
+    return f"catalog:ver:{namespace}"
+
+
+def _changed_key(namespace):
+    return f"catalog:changed:{namespace}"
+
+
+def _initial_version():
+    # Начальная версия от времени: если ключ версии вытеснен из кэша,
+    # новая версия не совпадет со старыми ключами и устаревшие ответы не всплывут
+    return int(time.time() * 1000)
+
+
+def get_version(namespace):
+    cache = get_cache()
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=VERSION_TIMEOUT)
+        version = cache.get(key) or _initial_version()
+    return version
+
+
+def bump_version(namespace):
+    cache = get_cache()
+    key = _version_key(namespace)
+    try:
+        # incr сохраняет оставшийся TTL ключа
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=VERSION_TIMEOUT)
+    if settings.DATABASE_REPLICAS:
+        # Пока реплики могут не догнать изменение, ответ под новой версией считается по primary
+        cache.set(_changed_key(namespace), 1, timeout=settings.DATABASE_STICKY_SECONDS)
+
+
+def recently_changed(namespaces):
+    if not settings.DATABASE_REPLICAS:
+        return False
+    try:
+        return bool(get_cache().get_many([_changed_key(namespace) for namespace in namespaces]))
+    except Exception as e:
+        logger.error(f"Failed to read catalog change marks, reading from primary: {e}")
+        return True
+
+
+async def arecently_changed(namespaces):
+    if not settings.DATABASE_REPLICAS:
+        return False
+    try:
+        return bool(await _acall(get_cache(), 'get_many', [_changed_key(namespace) for namespace in namespaces]))
+    except Exception as e:
+        logger.error(f"Failed to read catalog change marks, reading from primary: {e}")
+        return True
+
+
+def _safe_bump(*namespaces):
+    try:
+        for namespace in namespaces:
+            bump_version(namespace)
+    except Exception as e:
+        logger.error(f"Failed to invalidate catalog cache {namespaces}: {e}")
+
+
+def invalidate_assets(asset_ids=()):
+    """Сбрасывает списки активов и детали перечисленных активов.
+
+    Вызывается из сигналов и явно из путей, которые обходят save()
+    (bulk_update/update), например при загрузке цен.
+    """
+    namespaces = [ASSETS_NAMESPACE] + [f"{ASSETS_NAMESPACE}:{asset_id}" for asset_id in asset_ids]
+    transaction.on_commit(lambda: _safe_bump(*namespaces))
+
+
+def invalidate_asset_types():
+    # asset_type_name входит в ответы по активам, поэтому они тоже устаревают
+    transaction.on_commit(lambda: _safe_bump(ASSET_TYPES_NAMESPACE))
+
+
+@receiver([post_save, post_delete], sender=Assets)
+def _assets_changed(sender, instance, **kwargs):
+    invalidate_assets([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=AssetTypes)
+def _asset_types_changed(sender, instance, **kwargs):
+    invalidate_asset_types()
+
+
+def get_or_compute(key, compute, timeout):
+    """Чтение из кэша с защитой от "стампида".
+
+    При промахе значение считает только владелец короткой блокировки
+    (cache.add), остальные ждут его результат до LOCK_WAIT_SECONDS, а потом
+    считают сами. TTL слегка размазывается, чтобы ключи не истекали разом.
+    """
+    cache = get_cache()
+    value = cache.get(key)
+    if value is not None:
+        return value, True
+
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        try:
+            value = compute()
+            if value is not None:
+                cache.set(key, value, timeout=int(timeout * random.uniform(0.9, 1.1)))
+            return value, False
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value, True
+    return compute(), False
+
+
+async def aget_or_compute(key, compute, timeout):
+    """get_or_compute для асинхронных вьюх: compute — корутина, ожидание без блокировки цикла."""
+    cache = get_cache()
+    value = await _acall(cache, 'get', key)
+    if value is not None:
+        return value, True
+
+    lock_key = f"{key}:lock"
+    if await _acall(cache, 'add', lock_key, 1, timeout=LOCK_TIMEOUT):
+        try:
+            value = await compute()
+            if value is not None:
+                await _acall(cache, 'set', key, value, timeout=int(timeout * random.uniform(0.9, 1.1)))
+            return value, False
+        finally:
+            await _acall(cache, 'delete', lock_key)
+
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        value = await _acall(cache, 'get', key)
+        if value is not None:
+            return value, True
+    return await compute(), False
+
+
+class CachedReadMixin:
+    """Кэширует list/retrieve публичных read-only вьюсетов по параметрам запроса.
+
+    Ключ включает версии пространств имен, от которых зависит ответ:
+    ``cache_list_namespaces`` для списка, ``cache_detail_namespaces`` и версию
+    самого объекта (``cache_object_namespace``) для детали.
+    """
+    cache_list_namespaces = ()
+    cache_detail_namespaces = ()
+    cache_object_namespace = None
+
+    def _cache_key(self, request, action, namespaces, pk=None):
+        versions = [str(get_version(namespace)) for namespace in namespaces]
+        if pk is not None and self.cache_object_namespace:
+            versions.append(str(get_version(f"{self.cache_object_namespace}:{pk}")))
+        query = '&'.join(f"{k}={v}" for k, v in sorted(request.query_params.lists()))
+        query_hash = hashlib.md5(query.encode('utf-8')).hexdigest()
+        return f"catalog:{self.basename}:{action}:{pk or ''}:{'.'.join(versions)}:{query_hash}"
+
+    def _dependencies(self, namespaces, pk=None):
+        dependencies = list(namespaces)
+        if pk is not None and self.cache_object_namespace:
+            dependencies.append(f"{self.cache_object_namespace}:{pk}")
+        return dependencies
+
+    def _namespaces(self, action):
+        return self.cache_detail_namespaces if action == 'retrieve' else self.cache_list_namespaces
+
+    def cache_lookup(self, request, action, pk=None):
+        """Ключ ответа и закэшированные данные для асинхронных вьюх.
+
+        Данные None при промахе; ключ None, если кэш недоступен.
+        """
+        try:
+            key = self._cache_key(request, action, self._namespaces(action), pk)
+            return key, get_cache().get(key)
+        except Exception as e:
+            logger.error(f"Catalog cache unavailable, serving uncached {self.basename} {action}: {e}")
+            return None, None
+
+    def cached_response(self, data, hit):
+        response = Response(data)
+        response['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response
+
+    async def acached(self, key, action, compute, pk=None):
+        """_cached для вьюх на async ORM: compute — корутина, возвращающая Response."""
+        if key is None:
+            return await compute()
+        uncacheable = {}
+        dependencies = self._dependencies(self._namespaces(action), pk)
+
+        async def compute_data():
+            try:
+                if await arecently_changed(dependencies):
+                    with use_primary():
+                        response = await compute()
+                else:
+                    response = await compute()
+            except Exception as e:
+                uncacheable['error'] = e
+                raise
+            if response.status_code != status.HTTP_200_OK:
+                uncacheable['response'] = response
+                return None
+            return response.data
+
+        try:
+            data, hit = await aget_or_compute(key, compute_data, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+        except Exception as e:
+            if 'error' in uncacheable:
+                raise
+            logger.error(f"Catalog cache unavailable, serving uncached {self.basename} {action}: {e}")
+            return uncacheable.get('response') or await compute()
+        if data is None:
+            return uncacheable.get('response') or await compute()
+        return self.cached_response(data, hit)
+
+    def _cached(self, request, action, namespaces, compute, pk=None):
+        uncacheable = {}
+        dependencies = self._dependencies(namespaces, pk)
+
+        def compute_data():
+            try:
+                with use_primary() if recently_changed(dependencies) else nullcontext():
+                    response = compute()
+            except Exception as e:
+                uncacheable['error'] = e
+                raise
+            if response.status_code != status.HTTP_200_OK:
+                uncacheable['response'] = response
+                return None
+            return response.data
+
+        try:
+            key = self._cache_key(request, action, namespaces, pk)
+            data, hit = get_or_compute(key, compute_data, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+        except Exception as e:
+            if 'error' in uncacheable:
+                raise
+            # Недоступный кэш не должен ронять каталог — отдаем ответ напрямую
+            logger.error(f"Catalog cache unavailable, serving uncached {self.basename} {action}: {e}")
+            return uncacheable.get('response') or compute()
+        if data is None:
+            return uncacheable.get('response') or compute()
+        return self.cached_response(data, hit)
+
+    def list(self, request, *args, **kwargs):
+        return self._cached(
+            request, 'list', self.cache_list_namespaces,
+            lambda: super(CachedReadMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(
+            request, 'retrieve', self.cache_detail_namespaces,
+            lambda: super(CachedReadMixin, self).retrieve(request, *args, **kwargs),
+            pk=kwargs.get(self.lookup_url_kwarg or self.lookup_field),
+        )
@@ -0,0 +1,87 @@
+import hashlib
+
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .caching import ASSETS_NAMESPACE, ASSET_TYPES_NAMESPACE, get_version
+from .models import Deals, PortfolioAssets, Portfolios
+
+
+def touch_portfolios(portfolio_ids):
+    Portfolios.objects.filter(Port_ID__in=portfolio_ids).update(version=F('version') + 1)
+
+
+@receiver([post_save, post_delete], sender=PortfolioAssets)
+@receiver([post_save, post_delete], sender=Deals)
+def _portfolio_child_changed(sender, instance, **kwargs):
+    touch_portfolios([instance.portfolio_id])
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    candidates = parse_etags(header)
+    return '*' in candidates or etag.removeprefix('W/') in [c.removeprefix('W/') for c in candidates]
+
+
+class PortfolioETagMixin:
+    """ETag/If-None-Match для ответов, зависящих от портфелей пользователя.
+
+    ETag строится из (Port_ID, version) затронутых портфелей, версий
+    каталога активов и параметров запроса — один короткий запрос. При
+    совпадении отдается 304 без queryset'а и сериализаторов.
+    """
+    etag_catalog_namespaces = (ASSETS_NAMESPACE, ASSET_TYPES_NAMESPACE)
+
+    def get_etag_portfolios(self):
+        return Portfolios.objects.filter(user=self.request.user)
+
+    def compute_etag(self, request, action):
+        versions = list(self.get_etag_portfolios().order_by('Port_ID').values_list('Port_ID', 'version'))
+        if action == 'retrieve' and not versions:
+            return None
+        try:
+            catalog = [get_version(namespace) for namespace in self.etag_catalog_namespaces]
+        except Exception:
+            # Без версий каталога ETag не может гарантировать свежесть вложенных активов
+            return None
+        query = sorted(request.query_params.lists())
+        # JSON и MessagePack — разные представления, у каждого свой ETag
+        media_type = getattr(request, 'accepted_media_type', '')
+        payload = f"{self.basename}|{action}|{sorted(self.kwargs.items())}|{query}|{media_type}|{versions}|{catalog}"
+        return '"' + hashlib.md5(payload.encode('utf-8')).hexdigest() + '"'
+
+    def not_modified(self, request, etag):
+        return etag is not None and _etag_matches(request, etag)
+
+    def add_conditional_headers(self, response, etag):
+        if etag is not None:
+            response['ETag'] = etag
+        # Браузер хранит ответ и всегда переспрашивает сервер с If-None-Match
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization', 'Accept'])
+        return response
+
+    def _conditional(self, request, action, handler):
+        etag = self.compute_etag(request, action)
+        if self.not_modified(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        return self.add_conditional_headers(response, etag)
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(request, 'list', lambda: super(PortfolioETagMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(
+            request, 'retrieve', lambda: super(PortfolioETagMixin, self).retrieve(request, *args, **kwargs)
+        )
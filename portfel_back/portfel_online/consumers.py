@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .models import Portfolios
+from .push import user_group
+
+logger = logging.getLogger(__name__)
+
+UNAUTHORIZED_CLOSE_CODE = 4401
+
+
+@database_sync_to_async
+def _user_for_token(raw_token):
+    # Тот же набор, что и в REST: JWT из localStorage фронта или DRF Token
+    jwt_auth = JWTAuthentication()
+    try:
+        return jwt_auth.get_user(jwt_auth.get_validated_token(raw_token))
+    except (InvalidToken, TokenError):
+        pass
+    token = Token.objects.select_related('user').filter(key=raw_token).first()
+    return token.user if token else AnonymousUser()
+
+
+class QueryTokenAuthMiddleware(BaseMiddleware):
+    """Аутентификация WebSocket по ``?token=``: браузер не дает выставить заголовки."""
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get('query_string', b'').decode('utf-8'))
+        raw_token = (query.get('token') or [''])[0]
+        scope = dict(scope, user=await _user_for_token(raw_token) if raw_token else AnonymousUser())
+        return await super().__call__(scope, receive, send)
+
+
+@database_sync_to_async
+def _owned_portfolio_ids(user, portfolio_ids=None):
+    portfolios = Portfolios.objects.filter(user=user)
+    if portfolio_ids is not None:
+        portfolios = portfolios.filter(Port_ID__in=portfolio_ids)
+    return set(portfolios.values_list('Port_ID', flat=True))
+
+
+@database_sync_to_async
+def _portfolio_values(portfolio_ids):
+    return [
+        {
+            'id': row['Port_ID'],
+            'total_value': str(row['total_value']),
+            'profit_loss': str(row['profit_loss']),
+            'yield_percent': str(row['yield_percent']),
+            'version': row['version'],
+        }
+        for row in Portfolios.objects.filter(Port_ID__in=portfolio_ids).order_by('Port_ID').values(
+            'Port_ID', 'total_value', 'profit_loss', 'yield_percent', 'version'
+        )
+    ]
+
+
+class PortfolioUpdatesConsumer(AsyncJsonWebsocketConsumer):
+    """Живые total_value/profit_loss портфелей пользователя.
+
+    Клиент шлет ``{"action": "subscribe", "portfolios": [id, ...]}`` (пустой
+    список — все свои портфели) или ``unsubscribe``. Изменения копятся и
+    уходят не чаще раза в PORTFOLIO_PUSH_INTERVAL_MS одним сообщением
+    ``portfolio.update`` со свежими значениями из БД.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=UNAUTHORIZED_CLOSE_CODE)
+            return
+        self.user = user
+        self.group_name = user_group(user.pk)
+        self.subscribed = set()
+        self.dirty = set()
+        self.flush_task = None
+        self.last_flush = 0.0
+        self.interval = settings.PORTFOLIO_PUSH_INTERVAL_MS / 1000
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if getattr(self, 'flush_task', None):
+            self.flush_task.cancel()
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        action = content.get('action') if isinstance(content, dict) else None
+        requested = content.get('portfolios') if isinstance(content, dict) else None
+        if requested is not None and (
+            not isinstance(requested, list) or not all(isinstance(pk, int) for pk in requested)
+        ):
+            await self.send_json({'type': 'error', 'detail': "portfolios must be a list of ids."})
+            return
+
+        if action == 'subscribe':
+            owned = await _owned_portfolio_ids(self.user, requested or None)
+            self.subscribed |= owned
+            # Текущие значения сразу, дальше — только изменения
+            await self.send_json({'type': 'subscribed', 'portfolios': await _portfolio_values(owned)})
+        elif action == 'unsubscribe':
+            removed = set(requested) if requested else set(self.subscribed)
+            self.subscribed -= removed
+            self.dirty -= removed
+            await self.send_json({'type': 'unsubscribed', 'portfolios': sorted(removed)})
+        else:
+            await self.send_json({'type': 'error', 'detail': "Unknown action, expected subscribe or unsubscribe."})
+
+    async def portfolio_changed(self, event):
+        changed = self.subscribed.intersection(event['portfolios'])
+        if not changed:
+            return
+        self.dirty |= changed
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self.flush_task is None and self.dirty:
+            delay = max(0.0, self.last_flush + self.interval - time.monotonic())
+            self.flush_task = asyncio.ensure_future(self._flush_after(delay))
+
+    async def _flush_after(self, delay):
+        await asyncio.sleep(delay)
+        portfolio_ids, self.dirty = self.dirty, set()
+        self.last_flush = time.monotonic()
+        try:
+            if portfolio_ids:
+                await self.send_json({'type': 'portfolio.update', 'portfolios': await _portfolio_values(portfolio_ids)})
+        except Exception:
+            logger.exception(f"Failed to push portfolio updates to user {self.user.pk}")
+        self.flush_task = None
+        # Изменения, пришедшие во время отправки, уйдут следующим окном
+        self._schedule_flush()
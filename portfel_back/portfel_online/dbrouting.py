@@ -0,0 +1,203 @@
+"""Чтение с реплик с привязкой к primary после записи.
+
+ReplicaRoutingMiddleware заводит на запрос состояние маршрутизации,
+ReplicaRouter по нему выбирает базу:
+
+* запись и чтение внутри небезопасных запросов (POST/PUT/PATCH/DELETE) и
+  после первой записи в запросе — primary;
+* после записи пользователь DATABASE_STICKY_SECONDS читает с primary и в
+  следующих запросах (метка в общем кэше), чтобы не увидеть старые позиции;
+* остальные чтения — случайная здоровая реплика из DATABASE_REPLICAS;
+  реплика, которая не отвечает или отстает больше
+  DATABASE_REPLICA_MAX_LAG_SECONDS, исключается до следующей проверки;
+* вне HTTP-запросов (команды, consumers, фоновые задачи) — только primary.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = DEFAULT_DB_ALIAS
+SAFE_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+# Аутентификация читает только primary: свежевыданный токен может еще не дойти до реплики
+PRIMARY_ONLY_APPS = frozenset(['admin', 'auth', 'authtoken', 'contenttypes', 'sessions', 'token_blacklist'])
+REPLICA_LAG_SQL = (
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+_state = ContextVar('portfel_db_routing', default=None)
+_health = {}
+_health_lock = threading.Lock()
+
+
+class RoutingState:
+    __slots__ = ('request', 'pinned', 'wrote', 'sticky')
+
+    def __init__(self, request, pinned):
+        self.request = request
+        self.pinned = pinned
+        self.wrote = False
+        self.sticky = None
+
+
+def _sticky_key(user_id):
+    return f"db:primary-pin:user:{user_id}"
+
+
+@contextmanager
+def use_primary():
+    """Чтения внутри блока идут на primary (для данных, которые нельзя брать с отстающей реплики)."""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    pinned, state.pinned = state.pinned, True
+    try:
+        yield
+    finally:
+        state.pinned = pinned
+
+
+def replica_lag(alias):
+    """Отставание реплики в секундах; DatabaseError, если она недоступна."""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor != 'postgresql':
+            cursor.execute('SELECT 1')
+            return 0.0
+        cursor.execute(REPLICA_LAG_SQL)
+        lag = cursor.fetchone()[0]
+    return float(lag or 0)
+
+
+def _check(alias):
+    try:
+        lag = replica_lag(alias)
+    except DatabaseError as e:
+        logger.warning(f"Replica {alias} is unavailable, reading from primary: {e}")
+        # Следующая проверка откроет соединение заново
+        connections[alias].close()
+        return False
+    if lag > settings.DATABASE_REPLICA_MAX_LAG_SECONDS:
+        logger.warning(f"Replica {alias} lags {lag:.1f}s behind primary, excluded from reads")
+        return False
+    return True
+
+
+def healthy_replicas():
+    """Реплики, прошедшие последнюю проверку; проверка — не чаще DATABASE_REPLICA_CHECK_INTERVAL.
+
+    Пока один поток проверяет реплику, остальные пользуются прежним результатом.
+    """
+    healthy_aliases = []
+    for alias in settings.DATABASE_REPLICAS:
+        now = time.monotonic()
+        with _health_lock:
+            healthy, checked_at = _health.get(alias, (False, None))
+            due = checked_at is None or now - checked_at >= settings.DATABASE_REPLICA_CHECK_INTERVAL
+            if due:
+                _health[alias] = (healthy, now)
+        if due:
+            was_healthy, healthy = healthy, _check(alias)
+            with _health_lock:
+                _health[alias] = (healthy, time.monotonic())
+            if healthy and not was_healthy and checked_at is not None:
+                logger.info(f"Replica {alias} is back, routing reads to it")
+        if healthy:
+            healthy_aliases.append(alias)
+    return healthy_aliases
+
+
+def _is_sticky(state):
+    if state.sticky is None:
+        user = getattr(state.request, 'user', None)
+        if user is None or not user.is_authenticated:
+            # DRF аутентифицирует пользователя позже — не запоминаем ответ
+            return False
+        try:
+            state.sticky = bool(cache.get(_sticky_key(user.pk)))
+        except Exception as e:
+            logger.error(f"Failed to read primary pin for user {user.pk}, reading from primary: {e}")
+            state.sticky = True
+    return state.sticky
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not settings.DATABASE_REPLICAS or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return PRIMARY
+        if state.pinned or _is_sticky(state):
+            return PRIMARY
+        replicas = healthy_replicas()
+        return random.choice(replicas) if replicas else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и на primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaRoutingMiddleware:
+    """Состояние маршрутизации на время запроса и привязка пользователя к primary после записи."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = RoutingState(request, pinned=request.method not in SAFE_METHODS)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        self._remember_write(request, state)
+        return response
+
+    async def __acall__(self, request):
+        state = RoutingState(request, pinned=request.method not in SAFE_METHODS)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            # request.user может быть ленивым (сессия) — обращение к БД только в потоке
+            await sync_to_async(self._remember_write)(request, state)
+        return response
+
+    def _remember_write(self, request, state):
+        if not state.wrote or not settings.DATABASE_REPLICAS:
+            return
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return
+        try:
+            cache.set(_sticky_key(user.pk), 1, timeout=settings.DATABASE_STICKY_SECONDS)
+        except Exception as e:
+            logger.error(f"Failed to pin user {user.pk} to primary after write: {e}")
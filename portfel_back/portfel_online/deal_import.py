@@ -0,0 +1,225 @@
+import csv
+import json
+import logging
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .bulk import copy_rows
+from .ledger import COMPLETED_STATUS, rebuild_portfolio
+from .models import Assets, Deals, Portfolios
+from .pricing import parse_text, parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ADDRESS = "Broker Report"
+DEFAULT_STATUS = COMPLETED_STATUS
+IMPORT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+
+BUY_VALUES = {'buy', 'b', 'true', '1', 'покупка'}
+SELL_VALUES = {'sell', 's', 'false', '0', 'продажа'}
+COPY_FIELDS = ['portfolio', 'asset', 'address', 'status', 'type', 'quantity', 'price', 'total', 'commission', 'tax', 'date']
+
+
+class DealRow:
+    __slots__ = ('ticker', 'isin', 'is_buy', 'quantity', 'price', 'total', 'commission', 'tax', 'date', 'status')
+
+    def __init__(self, ticker, isin, is_buy, quantity, price, total, commission, tax, date, status):
+        self.ticker = ticker
+        self.isin = isin
+        self.is_buy = is_buy
+        self.quantity = quantity
+        self.price = price
+        self.total = total
+        self.commission = commission
+        self.tax = tax
+        self.date = date
+        self.status = status
+
+
+def _check_digits(value, name):
+    # Значение сверх max_digits поля уронило бы COPY/bulk_create всего импорта
+    field = Deals._meta.get_field(name)
+    if abs(value) >= Decimal(10) ** (field.max_digits - field.decimal_places):
+        raise ValueError(f"{name.capitalize()} is out of range.")
+    return value
+
+
+def _decimal(raw, name, required=True):
+    """Значение поля сделки ``name``, округленное до decimal_places модели."""
+    value = raw.get(name)
+    quant = Decimal(1).scaleb(-Deals._meta.get_field(name).decimal_places)
+    if value in (None, ''):
+        if required:
+            raise ValueError(f"{name.capitalize()} is required.")
+        return Decimal('0').quantize(quant)
+    try:
+        parsed = Decimal(str(value)).quantize(quant, rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError(f"Invalid {name} format.")
+    if not parsed.is_finite():
+        raise ValueError(f"Invalid {name} format.")
+    return _check_digits(parsed, name)
+
+
+def _deal_type(value):
+    if isinstance(value, bool):
+        return value
+    normalized = str(value or '').strip().lower()
+    if normalized in BUY_VALUES:
+        return True
+    if normalized in SELL_VALUES:
+        return False
+    raise ValueError("Type must be buy or sell.")
+
+
+def parse_deal_row(raw):
+    if not isinstance(raw, dict):
+        raise ValueError("Row must be an object.")
+    ticker = parse_text(raw.get('ticker'), 'Ticker')
+    isin = parse_text(raw.get('isin') or raw.get('ISIN'), 'ISIN')
+    if not ticker and not isin:
+        raise ValueError("Ticker or ISIN is required.")
+    quantity = _decimal(raw, 'quantity')
+    if quantity <= 0:
+        raise ValueError("Quantity must be positive.")
+    price = _decimal(raw, 'price')
+    if price < 0:
+        raise ValueError("Price cannot be negative.")
+    if raw.get('date') in (None, ''):
+        raise ValueError("Date is required.")
+    total = _decimal(raw, 'total', required=False)
+    if raw.get('total') in (None, ''):
+        total = _check_digits((quantity * price).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP), 'total')
+    return DealRow(
+        ticker=ticker,
+        isin=isin,
+        is_buy=_deal_type(raw.get('type')),
+        quantity=quantity,
+        price=price,
+        total=total,
+        commission=_decimal(raw, 'commission', required=False),
+        tax=_decimal(raw, 'tax', required=False),
+        date=parse_timestamp(raw.get('date')),
+        status=parse_text(raw.get('status'), 'Status') or DEFAULT_STATUS,
+    )
+
+
+def read_rows(stream, fmt):
+    """Строки отчета из CSV (с заголовком) или NDJSON. Битая строка NDJSON отдается как ``None``."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def _resolve_assets(rows):
+    """Одним запросом сопоставляет тикеры и ISIN пачки с Asset_ID."""
+    tickers = {row.ticker for row in rows if row.ticker}
+    isins = {row.isin for row in rows if row.isin}
+    by_ticker = {}
+    by_isin = {}
+    for asset_id, ticker, isin in Assets.objects.filter(
+        Q(ticker__in=tickers) | Q(ISIN__in=isins)
+    ).values_list('Asset_ID', 'ticker', 'ISIN'):
+        by_ticker.setdefault(ticker, []).append(asset_id)
+        by_isin.setdefault(isin, []).append(asset_id)
+    return by_ticker, by_isin
+
+
+def _copy_deals(portfolio_id, address, deals):
+    copy_rows(Deals, COPY_FIELDS, (
+        (
+            portfolio_id, asset_id, address, row.status, 't' if row.is_buy else 'f',
+            row.quantity, row.price, row.total, row.commission, row.tax, row.date.isoformat(),
+        ) for asset_id, row in deals
+    ))
+
+
+def _insert_deals(portfolio_id, address, deals, use_copy):
+    if not deals:
+        return
+    if use_copy:
+        _copy_deals(portfolio_id, address, deals)
+        return
+    Deals.objects.bulk_create([
+        Deals(
+            portfolio_id=portfolio_id, asset_id=asset_id, address=address, status=row.status,
+            type=row.is_buy, quantity=row.quantity, price=row.price, total=row.total,
+            commission=row.commission, tax=row.tax, date=row.date,
+        ) for asset_id, row in deals
+    ], batch_size=1000)
+
+
+def _add_error(result, number, message):
+    result['invalid'] += 1
+    if len(result['errors']) < MAX_REPORTED_ERRORS:
+        result['errors'][number] = message
+
+
+def import_deals(portfolio_id, rows, address=DEFAULT_ADDRESS, chunk_size=IMPORT_CHUNK_SIZE, skip_invalid=False):
+    """Импорт сделок брокерского отчета в портфель.
+
+    Строки валидируются пачками по ``chunk_size``, инструменты каждой пачки
+    ищутся одним запросом, сделки пишутся COPY (PostgreSQL) или bulk_create.
+    Позиции и агрегаты портфеля пересобираются из журнала один раз в конце.
+    Все выполняется в одной транзакции: при ошибочных строках без
+    ``skip_invalid`` импорт откатывается целиком.
+    """
+    result = {'received': 0, 'imported': 0, 'invalid': 0, 'errors': {}, 'unknown': set(), 'positions': None}
+    use_copy = connection.vendor == 'postgresql'
+    numbered = enumerate(rows, start=1)
+
+    with transaction.atomic():
+        # Блокировка портфеля не дает параллельным сделкам вклиниться между импортом и пересборкой
+        Portfolios.objects.select_for_update().get(Port_ID=portfolio_id)
+        while True:
+            chunk = list(islice(numbered, chunk_size))
+            if not chunk:
+                break
+            result['received'] += len(chunk)
+
+            parsed = []
+            for number, raw in chunk:
+                try:
+                    parsed.append((number, parse_deal_row(raw)))
+                except ValueError as e:
+                    _add_error(result, number, str(e))
+
+            by_ticker, by_isin = _resolve_assets([row for _, row in parsed])
+            deals = []
+            for number, row in parsed:
+                asset_ids = by_isin.get(row.isin) if row.isin else by_ticker.get(row.ticker)
+                if not asset_ids:
+                    result['unknown'].add(row.isin or row.ticker)
+                    _add_error(result, number, f"Unknown instrument: {row.isin or row.ticker}.")
+                    continue
+                if len(asset_ids) > 1:
+                    _add_error(result, number, f"Ambiguous ticker: {row.ticker}, use ISIN.")
+                    continue
+                deals.append((asset_ids[0], row))
+            _insert_deals(portfolio_id, address, deals, use_copy)
+            result['imported'] += len(deals)
+
+        if result['invalid'] and not skip_invalid:
+            transaction.set_rollback(True)
+            result['imported'] = 0
+        elif result['imported']:
+            result['positions'] = rebuild_portfolio(portfolio_id)
+
+    result['unknown'] = sorted(result['unknown'])
+    logger.info(
+        f"Imported {result['imported']} of {result['received']} deals into Portfolio ID: {portfolio_id} "
+        f"({result['invalid']} invalid)"
+    )
+    return result
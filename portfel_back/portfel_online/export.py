@@ -0,0 +1,177 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+from .models import Deals, PortfolioAssets
+
+EXPORT_CHUNK_SIZE = 2000
+# Строк на один кусок ответа: меньше — больше накладных расходов сервера на yield
+ROWS_PER_WRITE = 500
+
+# (колонка выгрузки, поле values_list). Колонки сделок совпадают с форматом import_deals
+DEAL_EXPORT_FIELDS = [
+    ('id', 'Deal_ID'),
+    ('date', 'date'),
+    ('ticker', 'asset__ticker'),
+    ('isin', 'asset__ISIN'),
+    ('type', 'type'),
+    ('quantity', 'quantity'),
+    ('price', 'price'),
+    ('total', 'total'),
+    ('commission', 'commission'),
+    ('tax', 'tax'),
+    ('status', 'status'),
+    ('address', 'address'),
+]
+POSITION_EXPORT_FIELDS = [
+    ('id', 'ID'),
+    ('ticker', 'asset__ticker'),
+    ('isin', 'asset__ISIN'),
+    ('currency', 'asset__currency'),
+    ('quantity', 'quantity'),
+    ('average_price', 'average_price'),
+    ('current_price', 'asset__current_price'),
+    ('total_value', 'total_value'),
+]
+
+
+class _StreamRenderer(BaseRenderer):
+    """Формат для ``?format=`` выгрузок.
+
+    Сами строки пишет StreamingHttpResponse; через рендерер проходят только
+    ответы с ошибками, они отдаются как JSON.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, cls=DjangoJSONEncoder).encode('utf-8')
+
+
+class CSVStreamRenderer(_StreamRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONStreamRenderer(_StreamRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+EXPORT_RENDERERS = [CSVStreamRenderer, NDJSONStreamRenderer]
+
+
+def _export_value(column, value):
+    if column == 'type':
+        return 'buy' if value else 'sell'
+    return value
+
+
+def _csv_header(header):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(header)
+    return buffer.getvalue()
+
+
+def _csv_rows(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_export_value(column, value) for column, value in zip(header, row)])
+    return buffer.getvalue()
+
+
+def _ndjson_rows(header, rows):
+    encoder = DjangoJSONEncoder()
+    # Decimal сериализуется строкой, без потери точности
+    lines = [
+        encoder.encode({column: _export_value(column, value) for column, value in zip(header, row)}) for row in rows
+    ]
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def _no_header(header):
+    return ''
+
+
+# формат: (начало файла, кусок из пачки строк, Content-Type)
+EXPORT_FORMATS = {
+    'csv': (_csv_header, _csv_rows, 'text/csv; charset=utf-8'),
+    'ndjson': (_no_header, _ndjson_rows, 'application/x-ndjson'),
+}
+
+
+def _chunks(fmt, header, rows):
+    start, encode_rows, _ = EXPORT_FORMATS[fmt]
+    # Заголовок уходит клиенту до выполнения запроса
+    first = start(header)
+    if first:
+        yield first
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == ROWS_PER_WRITE:
+            yield encode_rows(header, batch)
+            batch = []
+    if batch:
+        yield encode_rows(header, batch)
+
+
+async def _achunks(fmt, header, rows):
+    start, encode_rows, _ = EXPORT_FORMATS[fmt]
+    first = start(header)
+    if first:
+        yield first
+    # values_list().aiterator() в Django 5.1 выполняет запрос прямо в event loop
+    # (SynchronousOnlyOperation), поэтому ленивый iterator() открывает курсор и
+    # читается в потоке sync_to_async — по одной пачке ROWS_PER_WRITE строк за переход
+    while True:
+        batch = await sync_to_async(list)(islice(rows, ROWS_PER_WRITE))
+        if batch:
+            yield encode_rows(header, batch)
+        if len(batch) < ROWS_PER_WRITE:
+            break
+
+
+def is_asgi_request(request):
+    """Запрос пришел через ASGI-обработчик (для DRF Request смотрим исходный HttpRequest)."""
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+def stream_export(queryset, fields, fmt, filename, chunk_size=EXPORT_CHUNK_SIZE, asynchronous=False):
+    """Потоковая выгрузка queryset в CSV или NDJSON.
+
+    Строки читаются курсором пачками по ``chunk_size`` и сразу пишутся в
+    ответ, поэтому память не растет с размером выгрузки. Под ASGI
+    (``asynchronous=True``) ответ получает асинхронный итератор: синхронный
+    Django под ASGI сначала вычитал бы целиком через sync_to_async(list).
+    """
+    header = [column for column, _ in fields]
+    rows = queryset.values_list(*[lookup for _, lookup in fields]).iterator(chunk_size=chunk_size)
+    chunks = _achunks if asynchronous else _chunks
+    response = StreamingHttpResponse(chunks(fmt, header, rows), content_type=EXPORT_FORMATS[fmt][2])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+def deals_export(portfolio_id, fmt, asynchronous=False):
+    deals = Deals.objects.filter(portfolio_id=portfolio_id).order_by('date', 'Deal_ID')
+    return stream_export(
+        deals, DEAL_EXPORT_FIELDS, fmt, f"portfolio-{portfolio_id}-deals", asynchronous=asynchronous
+    )
+
+
+def positions_export(portfolio_id, fmt, asynchronous=False):
+    positions = PortfolioAssets.objects.filter(portfolio_id=portfolio_id).order_by('ID')
+    return stream_export(
+        positions, POSITION_EXPORT_FIELDS, fmt, f"portfolio-{portfolio_id}-positions", asynchronous=asynchronous
+    )
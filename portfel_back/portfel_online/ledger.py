@@ -0,0 +1,208 @@
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import BigIntegerField, DecimalField, ExpressionWrapper, F, Q, Value
+from django.db.models.functions import Cast, Round
+
+from .models import Assets, Deals, Portfolios, PortfolioAssets
+from .money import PRICE_PLACES, QUANTITY_PLACES, div_round, to_decimal
+from .valuation import apply_position_delta, position_contribution, position_value, revalue_portfolios
+
+logger = logging.getLogger(__name__)
+
+PRICE_QUANT = Decimal("0.0001")
+# Только исполненные сделки меняют позиции; остальные статусы (заявки, отмены) в журнал не попадают
+COMPLETED_STATUS = "Completed"
+LEDGER_CHUNK_SIZE = 2000
+BULK_BATCH_SIZE = 500
+
+
+def apply_trade(position, is_buy, quantity, price):
+    """Один шаг журнала: (количество, средняя цена) до сделки -> после нее.
+
+    Покупка пересчитывает среднюю цену так же, как PortfolioAssetsViewSet.create,
+    продажа уменьшает количество и среднюю цену не трогает. ``None`` —
+    позиции нет (еще не открыта или закрыта продажей).
+    """
+    if is_buy:
+        if position is None:
+            return quantity, price.quantize(PRICE_QUANT)
+        old_quantity, old_avg_price = position
+        new_quantity = old_quantity + quantity
+        if new_quantity > 0:
+            new_avg_price = ((old_avg_price or Decimal('0.0')) * old_quantity + price * quantity) / new_quantity
+        else:
+            new_avg_price = price
+        return new_quantity, new_avg_price.quantize(PRICE_QUANT)
+
+    if position is None:
+        return None
+    old_quantity, old_avg_price = position
+    new_quantity = old_quantity - quantity
+    if new_quantity <= 0:
+        return None
+    return new_quantity, old_avg_price
+
+
+def apply_trade_scaled(position, is_buy, quantity, price):
+    """apply_trade на целых с фиксированной точкой (money.QUANTITY_PLACES/PRICE_PLACES).
+
+    Округление средней цены то же, что у quantize в apply_trade.
+    """
+    if is_buy:
+        if position is None:
+            return quantity, price
+        old_quantity, old_avg_price = position
+        new_quantity = old_quantity + quantity
+        if new_quantity > 0:
+            new_avg_price = div_round(old_avg_price * old_quantity + price * quantity, new_quantity)
+        else:
+            new_avg_price = price
+        return new_quantity, new_avg_price
+
+    if position is None:
+        return None
+    old_quantity, old_avg_price = position
+    new_quantity = old_quantity - quantity
+    if new_quantity <= 0:
+        return None
+    return new_quantity, old_avg_price
+
+
+def replay_deals(rows):
+    """Позиции по потоку (asset_id, type, quantity, price), упорядоченному по (date, Deal_ID).
+
+    Количество и цена — целые с фиксированной точкой (см. stream_deals).
+    Один проход, в памяти только текущее состояние по активам. Актив,
+    позиция по которому закрыта продажами, остается в результате с ``None``.
+    """
+    positions = {}
+    for asset_id, is_buy, quantity, price in rows:
+        positions[asset_id] = apply_trade_scaled(positions.get(asset_id), is_buy, quantity, price)
+    return positions
+
+
+def _scaled(field, places):
+    # numeric * 10^places в bigint считает сама БД: из курсора приходят int, а не Decimal
+    return Cast(Round(ExpressionWrapper(
+        F(field) * Value(10 ** places), output_field=DecimalField(max_digits=24, decimal_places=places)
+    )), BigIntegerField())
+
+
+def stream_deals(portfolio_id, chunk_size=LEDGER_CHUNK_SIZE):
+    # iterator() на PostgreSQL читает через серверный курсор — журнал не грузится в память целиком
+    deals = Deals.objects.filter(portfolio_id=portfolio_id, status=COMPLETED_STATUS)
+    return deals.order_by('date', 'Deal_ID').annotate(
+        quantity_scaled=_scaled('quantity', QUANTITY_PLACES),
+        price_scaled=_scaled('price', PRICE_PLACES),
+    ).values_list('asset_id', 'type', 'quantity_scaled', 'price_scaled').iterator(chunk_size=chunk_size)
+
+
+def rebuild_portfolio(portfolio_id, chunk_size=LEDGER_CHUNK_SIZE, asset_ids=()):
+    """Пересобирает позиции портфеля из журнала сделок и пересчитывает агрегаты.
+
+    Трогает только активы, по которым в журнале есть исполненные сделки,
+    и ``asset_ids`` — активы, сделки по которым могли исчезнуть из журнала
+    (удаленная или перенесенная сделка): их позиция без сделок закрывается.
+    Позиции, заведенные без сделок (старые данные, ручной ввод), остаются
+    как есть. Возвращает число открытых позиций по журналу или ``None``,
+    если портфеля нет.
+    """
+    with transaction.atomic():
+        if not Portfolios.objects.select_for_update().filter(Port_ID=portfolio_id).exists():
+            return None
+        positions = replay_deals(stream_deals(portfolio_id, chunk_size))
+        for asset_id in asset_ids:
+            positions.setdefault(asset_id, None)
+        existing = {pa.asset_id: pa for pa in PortfolioAssets.objects.filter(
+            portfolio_id=portfolio_id, asset_id__in=list(positions),
+        )}
+
+        to_create = []
+        to_update = []
+        to_delete = []
+        for asset_id, state in positions.items():
+            if state is None:
+                if asset_id in existing:
+                    to_delete.append(existing[asset_id].ID)
+                continue
+            quantity, average_price = state
+            quantity = to_decimal(quantity, QUANTITY_PLACES)
+            average_price = to_decimal(average_price, PRICE_PLACES)
+            portfolio_asset = existing.get(asset_id)
+            if portfolio_asset is None:
+                to_create.append(PortfolioAssets(
+                    portfolio_id=portfolio_id, asset_id=asset_id, quantity=quantity,
+                    average_price=average_price, total_value=Decimal('0.00'),
+                ))
+            elif portfolio_asset.quantity != quantity or portfolio_asset.average_price != average_price:
+                portfolio_asset.quantity = quantity
+                portfolio_asset.average_price = average_price
+                to_update.append(portfolio_asset)
+
+        if to_delete:
+            PortfolioAssets.objects.filter(ID__in=to_delete).delete()
+        PortfolioAssets.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+        PortfolioAssets.objects.bulk_update(to_update, ['quantity', 'average_price'], batch_size=BULK_BATCH_SIZE)
+        # total_value позиций и агрегаты портфеля — одним пересчетом
+        revalue_portfolios([portfolio_id])
+
+    open_positions = len(positions) - sum(1 for state in positions.values() if state is None)
+    logger.info(
+        f"Rebuilt Portfolio ID: {portfolio_id} from ledger: {open_positions} positions "
+        f"({len(to_create)} created, {len(to_update)} updated, {len(to_delete)} closed)"
+    )
+    return open_positions
+
+
+def apply_deal(deal):
+    """Инкрементально применяет новую сделку к позиции и агрегатам портфеля.
+
+    Если по активу уже есть более поздние сделки (сделка задним числом),
+    порядок журнала нарушен и портфель пересобирается целиком. Неисполненная
+    сделка позиции не меняет.
+    """
+    if deal.status != COMPLETED_STATUS:
+        logger.info(f"Deal {deal.Deal_ID} has status {deal.status!r}, positions are not changed")
+        return
+    with transaction.atomic():
+        portfolio = Portfolios.objects.select_for_update().get(Port_ID=deal.portfolio_id)
+        has_later_deals = Deals.objects.filter(
+            portfolio_id=deal.portfolio_id, asset_id=deal.asset_id, status=COMPLETED_STATUS,
+        ).filter(
+            Q(date__gt=deal.date) | Q(date=deal.date, Deal_ID__gt=deal.Deal_ID)
+        ).exists()
+        if has_later_deals:
+            logger.info(f"Deal {deal.Deal_ID} is backdated, replaying ledger of Portfolio ID: {deal.portfolio_id}")
+            rebuild_portfolio(deal.portfolio_id)
+            return
+
+        current_price = Assets.objects.filter(Asset_ID=deal.asset_id).values_list('current_price', flat=True).first()
+        portfolio_asset = PortfolioAssets.objects.select_for_update().filter(
+            portfolio_id=deal.portfolio_id, asset_id=deal.asset_id
+        ).first()
+        old_contribution = position_contribution(portfolio_asset, current_price)
+
+        previous = None if portfolio_asset is None else (portfolio_asset.quantity, portfolio_asset.average_price)
+        state = apply_trade(previous, deal.type, deal.quantity, deal.price)
+        if state is None:
+            if portfolio_asset is not None:
+                if deal.quantity > portfolio_asset.quantity:
+                    logger.warning(
+                        f"Deal {deal.Deal_ID} sells {deal.quantity} of asset {deal.asset_id}, "
+                        f"but only {portfolio_asset.quantity} held in Portfolio ID: {deal.portfolio_id}"
+                    )
+                portfolio_asset.delete()
+            else:
+                logger.warning(f"Deal {deal.Deal_ID} sells asset {deal.asset_id} not held in Portfolio ID: {deal.portfolio_id}")
+            new_contribution = position_contribution(None, None)
+        else:
+            if portfolio_asset is None:
+                portfolio_asset = PortfolioAssets(portfolio_id=deal.portfolio_id, asset_id=deal.asset_id)
+            portfolio_asset.quantity, portfolio_asset.average_price = state
+            portfolio_asset.total_value = position_value(portfolio_asset.quantity, current_price)
+            portfolio_asset.save()
+            new_contribution = position_contribution(portfolio_asset, current_price)
+
+        apply_position_delta(portfolio, old_contribution, new_contribution)
@@ -0,0 +1,235 @@
+import io
+import json
+import os
+import statistics
+import subprocess
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from portfel_online.caching import invalidate_assets
+from portfel_online.models import Assets, Portfolios, PortfolioAssets
+
+from .generate_load_data import Command as GenerateLoadData
+
+User = get_user_model()
+
+# Наборы данных для generate_load_data: на каждом размере бюджеты запросов одни и те же,
+# рост числа запросов вместе с данными — это N+1
+SIZES = {
+    'small': {'users': 5, 'portfolios_per_user': 2, 'assets': 200,
+              'instruments_per_portfolio': 10, 'deals_per_portfolio': 100},
+    'medium': {'users': 20, 'portfolios_per_user': 3, 'assets': 2000,
+               'instruments_per_portfolio': 30, 'deals_per_portfolio': 1000},
+    'large': {'users': 50, 'portfolios_per_user': 4, 'assets': 10000,
+              'instruments_per_portfolio': 60, 'deals_per_portfolio': 10000},
+}
+# Максимум SQL-запросов на один запрос к эндпоинту (без SAVEPOINT/RELEASE)
+QUERY_BUDGETS = {
+    'assets.list': 2,
+    'assets.list.cached': 1,
+    'assets.search': 2,
+    'portfolios.list': 4,
+    'portfolios.detail': 4,
+    'positions.create': 14,
+    'positions.destroy': 8,
+    'deals.list': 4,
+    'deals.create': 13,
+}
+SAVEPOINT_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ("Бенчмарк API: на воспроизводимых наборах данных разного размера замеряет задержку (p50/p95/p99) "
+            "и число SQL-запросов эндпоинтов активов, портфелей, позиций и сделок. Падает при превышении "
+            "бюджета запросов или регрессии p95 относительно --baseline, результаты пишет в JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium', help=f"Через запятую из: {', '.join(SIZES)}.")
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Процессов генерации данных.")
+        parser.add_argument('--output', help="Файл JSON с результатами.")
+        parser.add_argument('--baseline', help="JSON прошлого прогона (--output) для сравнения p95.")
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help="Допустимый рост p95 относительно baseline, доля (0.25 = +25%%).")
+        parser.add_argument('--keep', action='store_true', help="Не удалять сгенерированные данные.")
+
+    def _seed(self, size, options):
+        prefix = f"bench{size}"
+        started = time.perf_counter()
+        call_command(
+            'generate_load_data', prefix=prefix, clear=True, seed=options['seed'], workers=options['workers'],
+            stdout=io.StringIO(), **SIZES[size],
+        )
+        self.stdout.write(f"[{size}] данные сгенерированы за {time.perf_counter() - started:.1f} с")
+        return prefix
+
+    def _endpoints(self, prefix):
+        user = User.objects.get(username=f"{prefix}-0000000")
+        portfolio = Portfolios.objects.filter(user=user).order_by('Port_ID').first()
+        position = PortfolioAssets.objects.filter(portfolio=portfolio).select_related('asset').order_by('ID').first()
+        held = PortfolioAssets.objects.filter(portfolio=portfolio).values('asset_id')
+        new_asset = (Assets.objects.filter(ticker__startswith=prefix.upper()).exclude(Asset_ID__in=held)
+                     .order_by('Asset_ID').first())
+        if position is None or new_asset is None:
+            raise CommandError(f"В наборе '{prefix}' нет позиции или свободного актива для замеров.")
+
+        client = Client(HTTP_AUTHORIZATION=f"Token {Token.objects.get_or_create(user=user)[0].key}")
+        pid = portfolio.Port_ID
+        deal = {
+            'portfolio': pid, 'asset': new_asset.Asset_ID, 'address': 'Bench', 'status': 'Completed', 'type': True,
+            'quantity': '3.0000', 'price': str(new_asset.current_price), 'total': str(
+                (new_asset.current_price * 3).quantize(Decimal('0.01'))),
+            'commission': '0.00', 'tax': '0.00', 'date': '2024-01-02T10:00:00Z',
+        }
+        position_data = {'portfolio': pid, 'asset_id': new_asset.Asset_ID, 'quantity': '3',
+                         'price': str(new_asset.current_price)}
+        search = position.asset.ticker[:len(prefix) + 3]
+
+        # (имя, метод, путь, тело, ожидаемый статус, сбросить кэш каталога перед запросом)
+        return client, [
+            ('assets.list', 'get', '/assets/', None, 200, True),
+            ('assets.list.cached', 'get', '/assets/', None, 200, False),
+            ('assets.search', 'get', f'/assets/?search={search}', None, 200, True),
+            ('portfolios.list', 'get', '/portfolios/', None, 200, False),
+            ('portfolios.detail', 'get', f'/portfolios/{pid}/', None, 200, False),
+            ('positions.create', 'post', '/portfolio-assets/', position_data, 201, False),
+            ('positions.destroy', 'delete', f'/portfolio-assets/{position.ID}/', None, 204, False),
+            ('deals.list', 'get', f'/portfolios/{pid}/deals/', None, 200, False),
+            ('deals.create', 'post', f'/portfolios/{pid}/deals/', deal, 201, False),
+        ]
+
+    def _call(self, client, method, path, body, expected, cold):
+        if cold:
+            invalidate_assets()
+        kwargs = {'data': json.dumps(body), 'content_type': 'application/json'} if body is not None else {}
+        # Запись откатывается: каждая итерация видит тот же набор данных
+        with transaction.atomic(), ExitStack() as stack:
+            # Чтения могут уйти на реплики — считаем запросы по всем базам
+            captured = [stack.enter_context(CaptureQueriesContext(db)) for db in connections.all()]
+            started = time.perf_counter()
+            response = getattr(client, method)(path, **kwargs)
+            elapsed = (time.perf_counter() - started) * 1000
+            transaction.set_rollback(True)
+        if response.status_code != expected:
+            raise CommandError(f"{method.upper()} {path}: статус {response.status_code}, ожидался {expected}: "
+                               f"{response.content[:300]!r}")
+        count = sum(
+            1 for queries in captured for query in queries.captured_queries
+            if not query['sql'].startswith(SAVEPOINT_PREFIXES)
+        )
+        return elapsed, count
+
+    def _bench(self, size, prefix, options):
+        client, endpoints = self._endpoints(prefix)
+        results = []
+        for name, method, path, body, expected, cold in endpoints:
+            for _ in range(options['warmup']):
+                self._call(client, method, path, body, expected, cold)
+            timings = []
+            counts = []
+            for _ in range(options['iterations']):
+                elapsed, count = self._call(client, method, path, body, expected, cold)
+                timings.append(elapsed)
+                counts.append(count)
+            timings.sort()
+            result = {
+                'size': size, 'endpoint': name, 'method': method.upper(), 'path': path,
+                'iterations': len(timings), 'mean_ms': round(statistics.mean(timings), 3),
+                'p50_ms': round(percentile(timings, 0.50), 3), 'p95_ms': round(percentile(timings, 0.95), 3),
+                'p99_ms': round(percentile(timings, 0.99), 3), 'max_ms': round(timings[-1], 3),
+                'queries': max(counts), 'query_budget': QUERY_BUDGETS[name],
+            }
+            results.append(result)
+            self.stdout.write(
+                f"[{size}] {name:<19} mean={result['mean_ms']:8.2f} ms  p50={result['p50_ms']:8.2f} ms  "
+                f"p95={result['p95_ms']:8.2f} ms  p99={result['p99_ms']:8.2f} ms  "
+                f"queries={result['queries']}/{result['query_budget']}"
+            )
+        return results
+
+    def _failures(self, results, baseline, threshold):
+        failures = []
+        previous = {(row['size'], row['endpoint']): row for row in baseline.get('results', [])}
+        for row in results:
+            label = f"[{row['size']}] {row['endpoint']}"
+            if row['queries'] > row['query_budget']:
+                failures.append(f"{label}: {row['queries']} SQL-запросов при бюджете {row['query_budget']}")
+            before = previous.get((row['size'], row['endpoint']))
+            if before and row['p95_ms'] > before['p95_ms'] * (1 + threshold):
+                failures.append(f"{label}: p95 {row['p95_ms']:.2f} ms против {before['p95_ms']:.2f} ms в baseline "
+                                f"(+{(row['p95_ms'] / before['p95_ms'] - 1) * 100:.0f}%)")
+        return failures
+
+    def handle(self, *args, **options):
+        sizes = [size.strip() for size in options['sizes'].split(',') if size.strip()]
+        unknown = [size for size in sizes if size not in SIZES]
+        if not sizes or unknown:
+            raise CommandError(f"Unknown sizes: {', '.join(unknown) or '(empty)'}. Expected: {', '.join(SIZES)}.")
+        for name in ('iterations', 'workers'):
+            if options[name] <= 0:
+                raise CommandError(f"--{name} must be positive.")
+        if options['warmup'] < 0 or options['threshold'] < 0:
+            raise CommandError("--warmup and --threshold must not be negative.")
+        baseline = {}
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline {options['baseline']}: {e}")
+
+        results = []
+        for size in sizes:
+            prefix = self._seed(size, options)
+            try:
+                results.extend(self._bench(size, prefix, options))
+            finally:
+                if not options['keep']:
+                    GenerateLoadData()._clear(prefix)
+
+        failures = self._failures(results, baseline, options['threshold'])
+        if options['output']:
+            report = {
+                'created_at': datetime.now(dt_timezone.utc).isoformat(),
+                'git_commit': _git_commit(),
+                'database': connection.vendor,
+                'seed': options['seed'],
+                'iterations': options['iterations'],
+                'sizes': {size: SIZES[size] for size in sizes},
+                'threshold': options['threshold'],
+                'results': results,
+                'failures': failures,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результаты записаны в {options['output']}")
+
+        if failures:
+            raise CommandError("Бенчмарк API не прошел:\n" + "\n".join(failures))
+        self.stdout.write(self.style.SUCCESS(f"Все эндпоинты в пределах бюджетов: {len(results)} замеров"))
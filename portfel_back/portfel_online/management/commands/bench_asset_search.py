@@ -0,0 +1,120 @@
+import random
+import statistics
+import string
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from portfel_online.models import AssetTypes, Assets
+from portfel_online.search import search_assets
+
+from .bench_api import percentile
+
+WORDS = [
+    'energy', 'bank', 'oil', 'gas', 'metal', 'gold', 'retail', 'telecom', 'software', 'semiconductor',
+    'pharma', 'bio', 'logistics', 'railway', 'airline', 'insurance', 'capital', 'holding', 'global',
+    'industrial', 'chemical', 'fertilizer', 'steel', 'mining', 'power', 'utility', 'media', 'auto',
+]
+
+
+class Command(BaseCommand):
+    help = ("Бенчмарк поиска активов: старый ILIKE по четырем полям против индексированного поиска "
+            "на синтетическом каталоге. Данные создаются в транзакции и откатываются.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assets', type=int, default=100_000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=50, help="Размер выдачи (как страница списка).")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help="Не откатывать созданные активы.")
+
+    def _seed(self, rng, count):
+        asset_type = AssetTypes.objects.create(name='Bench', risk_level=3, liquidity=3)
+        batch = []
+        tickers = []
+        for i in range(count):
+            ticker = ''.join(rng.choices(string.ascii_uppercase, k=rng.randint(3, 5))) + str(i % 100)
+            words = rng.sample(WORDS, 2)
+            tickers.append(ticker)
+            batch.append(Assets(
+                ISIN=f"BN{i:010d}",
+                ticker=ticker,
+                company=f"{words[0].title()} {words[1].title()} {ticker}",
+                country='Global', region='Global', exchange='BENCH', market='Stocks',
+                trading_type='Common Stock', management_fee=Decimal('0.00'), currency='USD',
+                description=' '.join(rng.choices(WORDS, k=30)),
+                dividend_yield=Decimal('0.00'), pe_ratio=Decimal('10.00'), pb_ratio=Decimal('1.00'),
+                beta=Decimal('1.00'), current_price=Decimal('100.0000'), asset_type=asset_type,
+            ))
+            if len(batch) >= 5000:
+                Assets.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Assets.objects.bulk_create(batch)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE assets')
+        return tickers
+
+    def _query_mix(self, rng, tickers, count):
+        queries = []
+        for i in range(count):
+            kind = i % 4
+            if kind == 0:
+                queries.append(rng.choice(tickers))
+            elif kind == 1:
+                queries.append(rng.choice(tickers)[:3])
+            elif kind == 2:
+                queries.append(rng.choice(WORDS))
+            else:
+                queries.append(''.join(rng.choices(string.ascii_lowercase, k=6)))
+        return queries
+
+    def _time(self, build, queries, limit):
+        timings = []
+        for text in queries:
+            started = time.perf_counter()
+            list(build(text)[:limit])
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def _report(self, label, timings):
+        timings = sorted(timings)
+        self.stdout.write(
+            f"{label:<10} mean={statistics.mean(timings):8.2f} ms  p50={percentile(timings, 0.50):8.2f} ms  "
+            f"p95={percentile(timings, 0.95):8.2f} ms  p99={percentile(timings, 0.99):8.2f} ms"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Бенчмарк рассчитан на PostgreSQL (tsvector/pg_trgm).")
+        rng = random.Random(options['seed'])
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            tickers = self._seed(rng, options['assets'])
+            self.stdout.write(f"Создано {options['assets']} активов за {time.perf_counter() - started:.1f} с")
+
+            base = Assets.objects.select_related('asset_type')
+            queries = self._query_mix(rng, tickers, options['queries'])
+
+            def legacy(text):
+                return base.filter(
+                    Q(ticker__icontains=text) | Q(ISIN__icontains=text)
+                    | Q(company__icontains=text) | Q(description__icontains=text)
+                )
+
+            def indexed(text):
+                return search_assets(base, text)
+
+            # Прогрев кэшей до замеров
+            self._time(legacy, queries[:10], options['limit'])
+            self._time(indexed, queries[:10], options['limit'])
+
+            self._report('icontains', self._time(legacy, queries, options['limit']))
+            self._report('indexed', self._time(indexed, queries, options['limit']))
+
+            if not options['keep']:
+                transaction.set_rollback(True)
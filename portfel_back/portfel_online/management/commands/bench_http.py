@@ -0,0 +1,218 @@
+import http.client
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from portfel_online.models import Assets, Portfolios
+
+from .bench_api import SIZES, _git_commit, percentile
+from .generate_load_data import Command as GenerateLoadData
+
+User = get_user_model()
+
+PREFIX = 'benchhttp'
+ENDPOINTS = ('assets.list', 'assets.detail', 'portfolios.summary', 'deals.list')
+# (цель, префикс пути): синхронные вьюсеты под WSGI и ASGI, асинхронные вьюхи под ASGI
+VARIANTS = (('wsgi', ''), ('asgi', ''), ('asgi', '/async'))
+
+
+class Command(BaseCommand):
+    help = ("Нагрузочный бенчмарк HTTP: одни и те же read-эндпоинты (активы, сводка портфелей, сделки) "
+            "под WSGI-деплоем, синхронные вьюсеты под ASGI и асинхронные /async/... под ASGI при разной "
+            "конкурентности. Асинхронные вьюхи ходят в ORM и кэш через потоки и выигрыша не обещают: "
+            "команда показывает фактическое соотношение. Серверы запускаются отдельно на той же базе, например: "
+            "gunicorn portfel.wsgi -w 1 --threads 8 -b 127.0.0.1:8000 и "
+            "uvicorn portfel.asgi:application --workers 1 --port 8001; "
+            "затем: bench_http --wsgi http://127.0.0.1:8000 --asgi http://127.0.0.1:8001.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi', help="Базовый URL WSGI-сервера.")
+        parser.add_argument('--asgi', help="Базовый URL ASGI-сервера (uvicorn).")
+        parser.add_argument('--concurrency', default='1,8,32,64', help="Уровни конкурентности через запятую.")
+        parser.add_argument('--duration', type=float, default=10.0, help="Секунд нагрузки на каждый замер.")
+        parser.add_argument('--warmup', type=float, default=2.0, help="Секунд прогрева перед замером.")
+        parser.add_argument('--timeout', type=float, default=10.0, help="Таймаут одного запроса, с.")
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help=f"Через запятую из: {', '.join(ENDPOINTS)}.")
+        parser.add_argument('--size', default='small', choices=list(SIZES), help="Набор данных generate_load_data.")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help="Файл JSON с результатами.")
+        parser.add_argument('--keep', action='store_true', help="Не удалять сгенерированные данные.")
+
+    def _seed(self, options):
+        started = time.perf_counter()
+        call_command(
+            'generate_load_data', prefix=PREFIX, clear=True, seed=options['seed'], workers=1,
+            stdout=io.StringIO(), **SIZES[options['size']],
+        )
+        self.stdout.write(f"Данные ({options['size']}) сгенерированы за {time.perf_counter() - started:.1f} с")
+        user = User.objects.get(username=f"{PREFIX}-0000000")
+        portfolio = Portfolios.objects.filter(user=user).order_by('Port_ID').first()
+        asset = Assets.objects.filter(ticker__startswith=PREFIX.upper()).order_by('Asset_ID').first()
+        if portfolio is None or asset is None:
+            raise CommandError(f"В наборе '{PREFIX}' нет портфеля или актива для замеров.")
+        token = Token.objects.get_or_create(user=user)[0].key
+        return token, {
+            'assets.list': '/assets/',
+            'assets.detail': f'/assets/{asset.Asset_ID}/',
+            'portfolios.summary': '/portfolios/?view=summary',
+            'deals.list': f'/portfolios/{portfolio.Port_ID}/deals/',
+        }
+
+    def _load(self, base_url, path, headers, concurrency, seconds, timeout):
+        """concurrency клиентов с keep-alive шлют запросы seconds секунд; (задержки мс, ошибки)."""
+        url = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        full_path = url.path.rstrip('/') + path
+        deadline = time.monotonic() + seconds
+        timings = []
+        errors = []
+        lock = threading.Lock()
+
+        def client():
+            local_timings = []
+            local_errors = 0
+            last_error = None
+            conn = connection_class(url.hostname, url.port, timeout=timeout)
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    conn.request('GET', full_path, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException) as e:
+                    local_errors += 1
+                    last_error = repr(e)
+                    conn.close()
+                    conn = connection_class(url.hostname, url.port, timeout=timeout)
+                    continue
+                if response.status == 200:
+                    local_timings.append((time.perf_counter() - started) * 1000)
+                else:
+                    local_errors += 1
+                    last_error = f"HTTP {response.status}"
+            conn.close()
+            with lock:
+                timings.extend(local_timings)
+                errors.append((local_errors, last_error))
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for future in [pool.submit(client) for _ in range(concurrency)]:
+                future.result()
+        timings.sort()
+        return timings, sum(count for count, _ in errors), next((error for _, error in errors if error), None)
+
+    def _bench(self, targets, endpoints, levels, headers, options):
+        results = []
+        for target, prefix in VARIANTS:
+            if target not in targets:
+                continue
+            label = f"{target}{' async' if prefix else ''}"
+            for name, path in endpoints.items():
+                full_path = prefix + path
+                for concurrency in levels:
+                    if options['warmup']:
+                        self._load(targets[target], full_path, headers, concurrency, options['warmup'],
+                                   options['timeout'])
+                    started = time.perf_counter()
+                    timings, errors, last_error = self._load(
+                        targets[target], full_path, headers, concurrency, options['duration'], options['timeout'],
+                    )
+                    elapsed = time.perf_counter() - started
+                    if not timings:
+                        raise CommandError(f"{label} {full_path}: ни одного успешного ответа ({last_error}).")
+                    result = {
+                        'target': target, 'view': 'async' if prefix else 'sync', 'endpoint': name,
+                        'path': full_path, 'concurrency': concurrency, 'requests': len(timings), 'errors': errors,
+                        'rps': round(len(timings) / elapsed, 1),
+                        'p50_ms': round(percentile(timings, 0.50), 3), 'p95_ms': round(percentile(timings, 0.95), 3),
+                        'p99_ms': round(percentile(timings, 0.99), 3),
+                    }
+                    results.append(result)
+                    self.stdout.write(
+                        f"{label:<10} {name:<19} c={concurrency:<4} rps={result['rps']:9.1f}  "
+                        f"p50={result['p50_ms']:8.2f} ms  p95={result['p95_ms']:8.2f} ms  "
+                        f"p99={result['p99_ms']:8.2f} ms  errors={errors}"
+                        + (f" ({last_error})" if errors else "")
+                    )
+        return results
+
+    def _gains(self, results):
+        """Пропускная способность асинхронных вьюх под ASGI относительно WSGI и синхронных вьюсетов под ASGI
+        на том же уровне конкурентности. Отношение меньше 1 — асинхронная вьюха медленнее."""
+        rows = {(row['target'], row['view'], row['endpoint'], row['concurrency']): row for row in results}
+        gains = []
+        for row in results:
+            if row['target'] != 'asgi' or row['view'] != 'async':
+                continue
+            gain = {'endpoint': row['endpoint'], 'concurrency': row['concurrency'],
+                    'asgi_async_rps': row['rps'], 'asgi_async_p95_ms': row['p95_ms']}
+            for target, view in (('wsgi', 'sync'), ('asgi', 'sync')):
+                base = rows.get((target, view, row['endpoint'], row['concurrency']))
+                if base:
+                    gain[f'{target}_rps'] = base['rps']
+                    gain[f'{target}_p95_ms'] = base['p95_ms']
+                    gain[f'{target}_rps_ratio'] = round(row['rps'] / base['rps'], 2)
+            if len(gain) > 4:
+                gains.append(gain)
+        return gains
+
+    def handle(self, *args, **options):
+        targets = {name: options[name].rstrip('/') for name in ('wsgi', 'asgi') if options[name]}
+        if not targets:
+            raise CommandError("Specify --wsgi and/or --asgi base URL.")
+        for name, base_url in targets.items():
+            if urlsplit(base_url).scheme not in ('http', 'https'):
+                raise CommandError(f"--{name} must be an http(s) URL, got {base_url!r}.")
+        try:
+            levels = sorted({int(level) for level in options['concurrency'].split(',') if level.strip()})
+        except ValueError:
+            raise CommandError("--concurrency must be a comma-separated list of integers.")
+        if not levels or levels[0] <= 0:
+            raise CommandError("--concurrency levels must be positive.")
+        if options['duration'] <= 0 or options['timeout'] <= 0 or options['warmup'] < 0:
+            raise CommandError("--duration and --timeout must be positive, --warmup must not be negative.")
+        names = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        unknown = [name for name in names if name not in ENDPOINTS]
+        if not names or unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(unknown) or '(empty)'}. Expected: {', '.join(ENDPOINTS)}.")
+
+        token, paths = self._seed(options)
+        headers = {'Authorization': f"Token {token}", 'Accept': 'application/json'}
+        try:
+            results = self._bench(targets, {name: paths[name] for name in names}, levels, headers, options)
+        finally:
+            if not options['keep']:
+                GenerateLoadData()._clear(PREFIX)
+
+        gains = self._gains(results)
+        for gain in gains:
+            self.stdout.write(f"{gain['endpoint']:<19} c={gain['concurrency']:<4} " + "; ".join(
+                f"async ASGI / {label}: x{gain[f'{target}_rps_ratio']:.2f} rps "
+                f"({gain['asgi_async_rps']:.1f} против {gain[f'{target}_rps']:.1f}), "
+                f"p95 {gain['asgi_async_p95_ms']:.2f} против {gain[f'{target}_p95_ms']:.2f} ms"
+                for target, label in (('wsgi', 'WSGI'), ('asgi', 'sync ASGI')) if f'{target}_rps' in gain
+            ))
+        if options['output']:
+            report = {
+                'created_at': datetime.now(dt_timezone.utc).isoformat(),
+                'git_commit': _git_commit(),
+                'targets': targets,
+                'size': options['size'],
+                'seed': options['seed'],
+                'duration': options['duration'],
+                'results': results,
+                'gains': gains,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результаты записаны в {options['output']}")
+        self.stdout.write(self.style.SUCCESS(f"Замеров: {len(results)}"))
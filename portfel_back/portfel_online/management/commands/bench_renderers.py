@@ -0,0 +1,101 @@
+import gzip
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+
+from portfel_online.models import AssetTypes, Assets, Portfolios, PortfolioAssets
+from portfel_online.renderers import FastJSONRenderer, MessagePackRenderer
+from portfel_online.serializers import AssetsSerializer, PortfoliosSerializer
+
+RENDERERS = [
+    ('json (DRF)', JSONRenderer()),
+    ('fastjson', FastJSONRenderer()),
+    ('msgpack', MessagePackRenderer()),
+]
+
+
+class Command(BaseCommand):
+    help = ("Бенчмарк рендереров: время кодирования и размер ответа для списка портфелей с позициями "
+            "и полного списка активов. Данные создаются в транзакции и откатываются.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assets', type=int, default=2000)
+        parser.add_argument('--portfolios', type=int, default=20)
+        parser.add_argument('--positions', type=int, default=50, help="Позиций в каждом портфеле.")
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def _seed(self, rng, options):
+        asset_type = AssetTypes.objects.create(name='Bench', risk_level=3, liquidity=3)
+        assets = Assets.objects.bulk_create([
+            Assets(
+                ISIN=f"BR{i:010d}", ticker=f"BR{i}", company=f"Bench Company {i}",
+                country='Russia', region='Europe', exchange='MOEX', market='Stocks',
+                trading_type='Common Stock', management_fee=Decimal('0.00'), currency='RUB',
+                description=f"Синтетический актив {i} для бенчмарка рендереров",
+                dividend_yield=Decimal(rng.randint(0, 1200)) / 100, pe_ratio=Decimal(rng.randint(100, 3000)) / 100,
+                pb_ratio=Decimal(rng.randint(10, 500)) / 100, beta=Decimal(rng.randint(50, 200)) / 100,
+                current_price=Decimal(rng.randint(10_000, 5_000_000)) / 10_000, asset_type=asset_type,
+            ) for i in range(options['assets'])
+        ], batch_size=1000)
+        user = get_user_model().objects.create_user(f"bench-renderers-{rng.random()}", password=None)
+        positions = []
+        for p in range(options['portfolios']):
+            portfolio = Portfolios.objects.create(
+                user=user, name=f"Bench {p}", total_value=0, profit_loss=Decimal('0.00'),
+                yield_percent=Decimal('0.0000'), annual_yield=Decimal('0.0000'),
+            )
+            for asset in rng.sample(assets, min(options['positions'], len(assets))):
+                quantity = Decimal(rng.randint(1, 100_000)) / 100
+                positions.append(PortfolioAssets(
+                    portfolio=portfolio, asset=asset, quantity=quantity,
+                    average_price=Decimal(rng.randint(10_000, 5_000_000)) / 10_000,
+                    total_value=(quantity * asset.current_price).quantize(Decimal('0.01')),
+                ))
+        PortfolioAssets.objects.bulk_create(positions, batch_size=1000)
+        return user
+
+    def _payloads(self, user):
+        # Те же queryset'ы, что у PortfoliosViewSet и AssetsViewSet
+        portfolios = Portfolios.objects.filter(user=user).select_related('user').prefetch_related(Prefetch(
+            'portfolioassets_set',
+            queryset=PortfolioAssets.objects.select_related('asset', 'asset__asset_type').defer('asset__search_vector')
+        ))
+        assets = Assets.objects.select_related('asset_type').defer('search_vector')
+        return [
+            ('portfolios', PortfoliosSerializer(portfolios, many=True).data),
+            ('assets', AssetsSerializer(assets, many=True).data),
+        ]
+
+    def handle(self, *args, **options):
+        if min(options['assets'], options['portfolios'], options['positions'], options['repeat']) <= 0:
+            raise CommandError("--assets, --portfolios, --positions and --repeat must be positive.")
+        rng = random.Random(options['seed'])
+
+        with transaction.atomic():
+            payloads = self._payloads(self._seed(rng, options))
+            transaction.set_rollback(True)
+
+        for name, data in payloads:
+            self.stdout.write(f"{name} ({len(data)} объектов)")
+            baseline = None
+            for label, renderer in RENDERERS:
+                renderer.render(data)
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    body = renderer.render(data)
+                    timings.append((time.perf_counter() - started) * 1000)
+                mean = statistics.mean(timings)
+                baseline = baseline or mean
+                self.stdout.write(
+                    f"  {label:<11} mean={mean:8.2f} ms  p50={statistics.median(timings):8.2f} ms  "
+                    f"x{baseline / mean:5.1f}  size={len(body):>10} B  gzip={len(gzip.compress(body, 6)):>9} B"
+                )
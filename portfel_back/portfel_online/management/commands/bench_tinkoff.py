@@ -0,0 +1,57 @@
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from .bench_api import percentile
+
+
+class Command(BaseCommand):
+    help = ("Нагрузочный прогон эндпоинта портфеля Tinkoff: N параллельных клиентов против запущенного бэка "
+            "(обычно против стенда tinkoff_stub_server). Сравнивает синхронную и асинхронную вьюхи.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--auth', required=True, help="Заголовок Authorization, например 'Token abc' или 'Bearer ...'.")
+        parser.add_argument('--tinkoff-token', default='stub-token')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--endpoint', action='append', choices=['sync', 'async'],
+                            help="Какие вьюхи гонять. По умолчанию обе.")
+
+    def _run(self, url, options):
+        session = requests.Session()
+        session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=options['concurrency']))
+        headers = {'Authorization': options['auth']}
+        payload = {'tinkoff_token': options['tinkoff_token']}
+
+        def one(_):
+            started = time.perf_counter()
+            try:
+                status_code = session.post(url, json=payload, headers=headers, timeout=60).status_code
+            except requests.RequestException as e:
+                status_code = type(e).__name__
+            return status_code, (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = list(executor.map(one, range(options['requests'])))
+        return results, time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        if options['concurrency'] <= 0 or options['requests'] <= 0:
+            raise CommandError("--concurrency and --requests must be positive.")
+        paths = {'sync': '/tinkoff/portfolio/', 'async': '/tinkoff/portfolio/async/'}
+        for endpoint in options['endpoint'] or ['sync', 'async']:
+            url = options['base_url'].rstrip('/') + paths[endpoint]
+            results, elapsed = self._run(url, options)
+            timings = sorted(timing for _, timing in results)
+            statuses = Counter(str(code) for code, _ in results)
+            self.stdout.write(
+                f"{endpoint:<6} {len(results) / elapsed:8.1f} req/s  mean={statistics.mean(timings):8.1f} ms  "
+                f"p50={percentile(timings, 0.50):8.1f} ms  p95={percentile(timings, 0.95):8.1f} ms  "
+                f"p99={percentile(timings, 0.99):8.1f} ms  statuses={dict(statuses)}"
+            )
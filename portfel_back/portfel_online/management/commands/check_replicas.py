@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from portfel_online.dbrouting import replica_lag
+
+
+class Command(BaseCommand):
+    help = ("Проверка реплик чтения из DATABASE_REPLICAS: доступность и отставание от primary. "
+            "Падает, если ни одна реплика не принимает чтения.")
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            self.stdout.write("Реплики не настроены (DATABASE_REPLICAS): все чтения идут на primary.")
+            return
+        available = 0
+        for alias in settings.DATABASE_REPLICAS:
+            config = settings.DATABASES[alias]
+            label = f"{alias} ({config.get('HOST')}:{config.get('PORT')}/{config.get('NAME')})"
+            try:
+                lag = replica_lag(alias)
+            except DatabaseError as e:
+                self.stdout.write(self.style.ERROR(f"{label}: недоступна — {e}"))
+                continue
+            if lag > settings.DATABASE_REPLICA_MAX_LAG_SECONDS:
+                self.stdout.write(self.style.WARNING(
+                    f"{label}: отставание {lag:.1f} с больше {settings.DATABASE_REPLICA_MAX_LAG_SECONDS} с, чтения на primary"
+                ))
+                continue
+            available += 1
+            self.stdout.write(self.style.SUCCESS(f"{label}: отставание {lag:.1f} с"))
+        if not available:
+            raise CommandError("Ни одна реплика не принимает чтения: все чтения идут на primary.")
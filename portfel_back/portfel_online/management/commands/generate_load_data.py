@@ -0,0 +1,271 @@
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import ROUND_HALF_UP
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from portfel_online.bulk import insert_rows
+from portfel_online.caching import invalidate_assets
+from portfel_online.ledger import apply_trade_scaled
+from portfel_online.models import AssetTypes, Assets, Deals, Portfolios, PortfolioAssets
+from portfel_online.money import MONEY_PLACES, PRICE_PLACES, QUANTITY_PLACES, div_round, rescale, to_decimal, to_string
+from portfel_online.valuation import revalue_portfolios
+
+User = get_user_model()
+
+GENERATED_ADDRESS = "Generated Broker Report"
+# Фиксированное начало истории: при том же seed данные совпадают байт в байт
+HISTORY_START = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+ASSET_TYPES = [
+    ('Акции', 3, 3),
+    ('Облигации', 1, 2),
+    ('Фонды (ETF)', 2, 3),
+    ('Криптовалюта', 5, 4),
+]
+EXCHANGES = [('MOEX', 'Russia', 'Europe', 'RUB'), ('NASDAQ', 'USA', 'North America', 'USD'),
+             ('NYSE', 'USA', 'North America', 'USD'), ('LSE', 'UK', 'Europe', 'GBP')]
+WORDS = ['Energy', 'Bank', 'Oil', 'Gas', 'Metal', 'Gold', 'Retail', 'Telecom', 'Software', 'Pharma',
+         'Logistics', 'Railway', 'Insurance', 'Capital', 'Holding', 'Global', 'Steel', 'Mining', 'Power', 'Media']
+DEAL_FIELDS = ['portfolio', 'asset', 'address', 'status', 'type', 'quantity', 'price', 'total', 'commission', 'tax', 'date']
+POSITION_FIELDS = ['portfolio', 'asset', 'quantity', 'average_price', 'total_value']
+SELL_SHARE = 0.35
+COMMISSION_BPS = 5
+TAX_PERCENT = 13
+REVALUE_BATCH_SIZE = 10_000
+
+
+def _init_worker():
+    # При spawn дочерний процесс стартует без настроенного Django
+    django.setup()
+
+
+def _rng(seed, kind, index):
+    # Свой генератор на каждую сущность: результат не зависит от числа процессов и порядка шардов
+    return random.Random(f"{seed}:{kind}:{index}")
+
+
+def _portfolio_ledger(rng, portfolio_id, asset_ids, base_prices, options, value):
+    """Сделки и итоговые позиции одного портфеля; арифметика — на целых, как в ledger.replay_deals."""
+    universe = rng.sample(range(len(asset_ids)), min(options['instruments_per_portfolio'], len(asset_ids)))
+    count = options['deals_per_portfolio']
+    span = options['years'] * 365 * 86400
+    step = max(span // max(count, 1), 1)
+    moment = rng.randint(0, step)
+    positions = {}
+    deals = []
+    for _ in range(count):
+        moment += rng.randint(1, 2 * step)
+        index = rng.choice(universe)
+        # Цена дрейфует вверх по истории с шумом ±3%
+        growth = 700_000 + 600_000 * min(moment, span) // span + rng.randint(-30_000, 30_000)
+        price = max(base_prices[index] * growth // 1_000_000, 1)
+        state = positions.get(index)
+        is_buy = state is None or rng.random() >= SELL_SHARE
+        if is_buy:
+            quantity = rng.randint(1, 200) * 10 ** QUANTITY_PLACES
+        else:
+            quantity = rng.randint(1, state[0])
+        total = rescale(quantity * price, QUANTITY_PLACES + PRICE_PLACES, MONEY_PLACES, ROUND_HALF_UP)
+        tax = 0
+        if not is_buy and price > state[1]:
+            profit = rescale(quantity * (price - state[1]), QUANTITY_PLACES + PRICE_PLACES, MONEY_PLACES, ROUND_HALF_UP)
+            tax = div_round(profit * TAX_PERCENT, 100, ROUND_HALF_UP)
+        state = apply_trade_scaled(state, is_buy, quantity, price)
+        if state is None:
+            positions.pop(index, None)
+        else:
+            positions[index] = state
+        deals.append((
+            portfolio_id, asset_ids[index], GENERATED_ADDRESS, 'Completed', is_buy,
+            value(quantity, QUANTITY_PLACES), value(price, PRICE_PLACES), value(total, MONEY_PLACES),
+            value(div_round(total * COMMISSION_BPS, 10_000, ROUND_HALF_UP), MONEY_PLACES), value(tax, MONEY_PLACES),
+            HISTORY_START + timedelta(seconds=moment),
+        ))
+    position_rows = [
+        (portfolio_id, asset_ids[index], value(quantity, QUANTITY_PLACES), value(average_price, PRICE_PLACES),
+         value(0, MONEY_PLACES))
+        for index, (quantity, average_price) in sorted(positions.items())
+    ]
+    return deals, position_rows
+
+
+def generate_shard(shard, shards, portfolios, asset_ids, base_prices, options):
+    """Журналы и позиции портфелей шарда (порядковый номер % shards == shard), пачками по chunk_size сделок."""
+    started = time.perf_counter()
+    value = to_string if connection.vendor == 'postgresql' else to_decimal
+    deal_buffer = []
+    position_buffer = []
+    written = [0, 0]
+
+    def flush():
+        with transaction.atomic():
+            insert_rows(Deals, DEAL_FIELDS, deal_buffer)
+            insert_rows(PortfolioAssets, POSITION_FIELDS, position_buffer)
+        written[0] += len(deal_buffer)
+        written[1] += len(position_buffer)
+        deal_buffer.clear()
+        position_buffer.clear()
+
+    try:
+        for ordinal, portfolio_id in portfolios[shard::shards]:
+            deals, positions = _portfolio_ledger(
+                _rng(options['seed'], 'portfolio', ordinal), portfolio_id, asset_ids, base_prices, options, value
+            )
+            deal_buffer.extend(deals)
+            position_buffer.extend(positions)
+            if len(deal_buffer) >= options['chunk_size']:
+                flush()
+        flush()
+    finally:
+        connections.close_all()
+    return shard, written[0], written[1], time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = ("Детерминированный генератор данных для нагрузочных тестов: пользователи, каталог активов, "
+            "портфели с журналом сделок и позициями, согласованными с журналом. Объем задается опциями, "
+            "при одинаковом --seed данные одинаковы. Запись пачками через COPY (PostgreSQL) или bulk_create, "
+            "журналы портфелей генерируются параллельно в --workers процессах.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--portfolios-per-user', type=int, default=3)
+        parser.add_argument('--assets', type=int, default=2000)
+        parser.add_argument('--instruments-per-portfolio', type=int, default=20)
+        parser.add_argument('--deals-per-portfolio', type=int, default=200)
+        parser.add_argument('--years', type=int, default=3, help="Глубина истории сделок.")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='load', help="Префикс имен пользователей и тикеров сгенерированных данных.")
+        parser.add_argument('--password', default='load-test', help="Пароль всех сгенерированных пользователей.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=50_000, help="Сделок в одной пачке записи.")
+        parser.add_argument('--clear', action='store_true', help="Удалить ранее сгенерированные данные с этим префиксом.")
+
+    def _generated_users(self, prefix):
+        return User.objects.filter(username__startswith=f"{prefix}-")
+
+    def _generated_assets(self, prefix):
+        return Assets.objects.filter(ticker__startswith=prefix.upper(), description__startswith=GENERATED_ADDRESS)
+
+    def _raw_delete(self, model, column, subquery):
+        sql, params = subquery.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {connection.ops.quote_name(model._meta.db_table)} "
+                f"WHERE {connection.ops.quote_name(column)} IN ({sql})",
+                params,
+            )
+
+    def _clear(self, prefix):
+        portfolios = Portfolios.objects.filter(user__in=self._generated_users(prefix))
+        with transaction.atomic():
+            # Журнал, позиции и каталог — прямым DELETE: сигналы на миллионы строк не нужны
+            for model in (Deals, PortfolioAssets):
+                self._raw_delete(model, model._meta.get_field('portfolio').column, portfolios.values('Port_ID'))
+            portfolios.delete()
+            self._generated_users(prefix).delete()
+            self._raw_delete(Assets, Assets._meta.pk.column, self._generated_assets(prefix).values('Asset_ID'))
+            invalidate_assets()
+
+    def _assets(self, rng, options):
+        asset_types = [
+            AssetTypes.objects.get_or_create(name=name, defaults={'risk_level': risk, 'liquidity': liquidity})[0]
+            for name, risk, liquidity in ASSET_TYPES
+        ]
+        prefix = options['prefix'].upper()
+        rows = []
+        base_prices = []
+        for i in range(options['assets']):
+            exchange, country, region, currency = rng.choice(EXCHANGES)
+            asset_type = rng.choice(asset_types)
+            price = rng.randint(10_000, 50_000_000)
+            base_prices.append(price)
+            rows.append(Assets(
+                ISIN=f"{prefix[:2]}{i:010d}", ticker=f"{prefix}{i:06d}",
+                company=f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}",
+                country=country, region=region, exchange=exchange, market='Stocks',
+                trading_type='Common Stock', management_fee=to_decimal(rng.randint(0, 50), 2), currency=currency,
+                description=f"{GENERATED_ADDRESS}: {asset_type.name}",
+                dividend_yield=to_decimal(rng.randint(0, 900), 2), pe_ratio=to_decimal(rng.randint(300, 5000), 2),
+                pb_ratio=to_decimal(rng.randint(50, 1000), 2), beta=to_decimal(rng.randint(40, 250), 2),
+                current_price=to_decimal(price, PRICE_PLACES), asset_type=asset_type,
+            ))
+        Assets.objects.bulk_create(rows, batch_size=5000)
+        invalidate_assets()
+        asset_ids = list(self._generated_assets(options['prefix']).order_by('Asset_ID').values_list('Asset_ID', flat=True))
+        return asset_ids, base_prices
+
+    def _users_and_portfolios(self, options):
+        password = make_password(options['password'])
+        User.objects.bulk_create([
+            User(username=f"{options['prefix']}-{i:07d}", email=f"{options['prefix']}-{i}@example.com", password=password)
+            for i in range(options['users'])
+        ], batch_size=5000)
+        user_ids = list(self._generated_users(options['prefix']).order_by('username').values_list('id', flat=True))
+        Portfolios.objects.bulk_create([
+            Portfolios(user_id=user_id, name=f"Портфель {j + 1}")
+            for user_id in user_ids for j in range(options['portfolios_per_user'])
+        ], batch_size=5000)
+        # Порядковый номер портфеля — по (пользователь, Port_ID), от него зависит seed журнала
+        return list(enumerate(Portfolios.objects.filter(user_id__in=user_ids).order_by('user__username', 'Port_ID')
+                              .values_list('Port_ID', flat=True)))
+
+    def handle(self, *args, **options):
+        for name in ('users', 'portfolios_per_user', 'assets', 'instruments_per_portfolio', 'years', 'workers', 'chunk_size'):
+            if options[name] <= 0:
+                raise CommandError(f"--{name.replace('_', '-')} must be positive.")
+        if options['deals_per_portfolio'] < 0:
+            raise CommandError("--deals-per-portfolio must not be negative.")
+        prefix = options['prefix']
+        started = time.perf_counter()
+
+        if options['clear']:
+            self._clear(prefix)
+            self.stdout.write(f"Удалены данные с префиксом '{prefix}' за {time.perf_counter() - started:.1f} с")
+        elif self._generated_users(prefix).exists() or self._generated_assets(prefix).exists():
+            raise CommandError(f"Данные с префиксом '{prefix}' уже есть: добавьте --clear или смените --prefix.")
+
+        rng = _rng(options['seed'], 'catalog', 0)
+        with transaction.atomic():
+            asset_ids, base_prices = self._assets(rng, options)
+            portfolios = self._users_and_portfolios(options)
+        self.stdout.write(
+            f"Активов {len(asset_ids)}, пользователей {options['users']}, портфелей {len(portfolios)} "
+            f"за {time.perf_counter() - started:.1f} с"
+        )
+
+        workers = min(options['workers'], len(portfolios))
+        if workers == 1:
+            results = [generate_shard(0, 1, portfolios, asset_ids, base_prices, options)]
+        else:
+            # Соединения родителя не должны достаться дочерним процессам при fork
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                futures = [
+                    executor.submit(generate_shard, shard, workers, portfolios, asset_ids, base_prices, options)
+                    for shard in range(workers)
+                ]
+                results = sorted(future.result() for future in futures)
+        for shard, deals, positions, elapsed in results:
+            self.stdout.write(f"Шард {shard}: сделок {deals}, позиций {positions}, {elapsed:.1f} с")
+
+        revalue_started = time.perf_counter()
+        portfolio_ids = [portfolio_id for _, portfolio_id in portfolios]
+        for offset in range(0, len(portfolio_ids), REVALUE_BATCH_SIZE):
+            revalue_portfolios(portfolio_ids[offset:offset + REVALUE_BATCH_SIZE])
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for model in (Assets, Portfolios, PortfolioAssets, Deals):
+                    cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+        self.stdout.write(f"Переоценка портфелей: {time.perf_counter() - revalue_started:.1f} с")
+        self.stdout.write(self.style.SUCCESS(
+            f"Сгенерировано сделок: {sum(result[1] for result in results)} за {time.perf_counter() - started:.1f} с. "
+            f"Вход: {prefix}-0000000 / {options['password']}"
+        ))
@@ -0,0 +1,63 @@
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portfel_online.deal_import import DEFAULT_ADDRESS, IMPORT_CHUNK_SIZE, import_deals, read_rows
+from portfel_online.models import DealSource, Portfolios
+
+
+class Command(BaseCommand):
+    help = ("Импорт сделок из брокерского отчета CSV/NDJSON (ticker или isin, type, quantity, price, date, "
+            "[total, commission, tax, status]) в портфель с одной пересборкой позиций в конце.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Путь к отчету или '-' для stdin.")
+        parser.add_argument('--portfolio', type=int, required=True, help="Port_ID портфеля.")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default=None,
+                            help="Формат файла. По умолчанию определяется по расширению.")
+        parser.add_argument('--source', help="Название источника сделок (DealSource), пишется в address.")
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+        parser.add_argument('--skip-invalid', action='store_true',
+                            help="Пропускать ошибочные строки вместо отката всего импорта.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        if options['chunk_size'] <= 0:
+            raise CommandError("--chunk-size must be positive.")
+        if not Portfolios.objects.filter(Port_ID=options['portfolio']).exists():
+            raise CommandError(f"Портфель {options['portfolio']} не найден.")
+        address = DEFAULT_ADDRESS
+        if options['source']:
+            if not DealSource.objects.filter(name=options['source']).exists():
+                raise CommandError(f"Источник сделок '{options['source']}' не найден.")
+            address = options['source']
+
+        started = time.monotonic()
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        try:
+            result = import_deals(
+                options['portfolio'], read_rows(stream, fmt), address,
+                chunk_size=options['chunk_size'], skip_invalid=options['skip_invalid'],
+            )
+        except csv.Error as e:
+            raise CommandError(f"Ошибка чтения файла: {e}")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for number, error in result['errors'].items():
+            self.stderr.write(f"Строка {number}: {error}")
+        if result['invalid'] > len(result['errors']):
+            self.stderr.write(f"... и еще {result['invalid'] - len(result['errors'])} ошибочных строк")
+        if result['invalid'] and not options['skip_invalid']:
+            raise CommandError(f"Импорт отменен: ошибочных строк {result['invalid']}. Используйте --skip-invalid.")
+
+        elapsed = time.monotonic() - started
+        rate = result['received'] / elapsed if elapsed > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Строк: {result['received']}, импортировано: {result['imported']}, ошибочных: {result['invalid']}, "
+            f"открытых позиций: {result['positions']} за {elapsed:.2f} с ({rate:.0f} строк/с)"
+        ))
@@ -0,0 +1,73 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portfel_online.pricing import parse_ticks, ingest_price_ticks
+
+
+class Command(BaseCommand):
+    help = "Загрузка рыночных цен из CSV/NDJSON (ticker или isin, price, timestamp) пачками с переоценкой портфелей."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Путь к файлу с тиками или '-' для stdin.")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default=None,
+                            help="Формат файла. По умолчанию определяется по расширению.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def _read_rows(self, stream, fmt):
+        if fmt == 'csv':
+            yield from csv.DictReader(stream)
+            return
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+    def _flush(self, batch, totals):
+        ticks, errors = parse_ticks(batch)
+        for index, error in errors.items():
+            self.stderr.write(f"Пропущен тик {batch[index]!r}: {error}")
+        result = ingest_price_ticks(ticks)
+        totals['received'] += len(batch)
+        totals['applied'] += result['applied']
+        totals['stale'] += result['stale']
+        totals['invalid'] += len(errors)
+        totals['unknown'].update(result['unknown'])
+        totals['portfolios_revalued'] += result['portfolios_revalued']
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        if options['batch_size'] <= 0:
+            raise CommandError("--batch-size must be positive.")
+
+        totals = {'received': 0, 'applied': 0, 'stale': 0, 'invalid': 0, 'unknown': set(), 'portfolios_revalued': 0}
+        started = time.monotonic()
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            batch = []
+            for row in self._read_rows(stream, fmt):
+                batch.append(row)
+                if len(batch) >= options['batch_size']:
+                    self._flush(batch, totals)
+                    batch = []
+            if batch:
+                self._flush(batch, totals)
+        except (ValueError, csv.Error) as e:
+            raise CommandError(f"Ошибка чтения файла: {e}")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.monotonic() - started
+        rate = totals['received'] / elapsed if elapsed > 0 else 0
+        if totals['unknown']:
+            self.stderr.write(f"Неизвестные инструменты: {', '.join(sorted(totals['unknown']))}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Тиков: {totals['received']}, применено: {totals['applied']}, устаревших: {totals['stale']}, "
+            f"ошибочных: {totals['invalid']}, переоценено портфелей: {totals['portfolios_revalued']} "
+            f"за {elapsed:.2f} с ({rate:.0f} тиков/с)"
+        ))
@@ -0,0 +1,76 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Value
+from django.db.models.functions import Mod
+
+from portfel_online.ledger import LEDGER_CHUNK_SIZE, rebuild_portfolio
+from portfel_online.models import Portfolios
+
+
+def _init_worker():
+    # При spawn дочерний процесс стартует без настроенного Django
+    django.setup()
+
+
+def rebuild_shard(shard, shards, portfolio_ids=None, chunk_size=LEDGER_CHUNK_SIZE):
+    """Пересобирает портфели своего шарда (Port_ID % shards == shard) последовательно."""
+    started = time.perf_counter()
+    portfolios = Portfolios.objects.annotate(shard=Mod('Port_ID', Value(shards))).filter(shard=shard)
+    if portfolio_ids:
+        portfolios = portfolios.filter(Port_ID__in=portfolio_ids)
+    rebuilt = 0
+    positions = 0
+    try:
+        for portfolio_id in portfolios.order_by('Port_ID').values_list('Port_ID', flat=True):
+            result = rebuild_portfolio(portfolio_id, chunk_size)
+            if result is not None:
+                rebuilt += 1
+                positions += result
+    finally:
+        connections.close_all()
+    return shard, rebuilt, positions, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = ("Пересобирает позиции портфелей из журнала сделок. Портфели шардируются по Port_ID "
+            "между процессами; каждый портфель пересобирается в своей транзакции.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Число процессов. Каждый держит свое соединение с БД.")
+        parser.add_argument('--portfolio', type=int, nargs='+', dest='portfolio_ids',
+                            help="Пересобрать только эти портфели.")
+        parser.add_argument('--chunk-size', type=int, default=LEDGER_CHUNK_SIZE,
+                            help="Сколько сделок читать из курсора за раз.")
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError("--workers must be positive.")
+        portfolio_ids = options['portfolio_ids']
+        chunk_size = options['chunk_size']
+        started = time.perf_counter()
+
+        if workers == 1:
+            results = [rebuild_shard(0, 1, portfolio_ids, chunk_size)]
+        else:
+            # Соединения родителя не должны достаться дочерним процессам при fork
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                futures = [
+                    executor.submit(rebuild_shard, shard, workers, portfolio_ids, chunk_size)
+                    for shard in range(workers)
+                ]
+                results = sorted(future.result() for future in futures)
+
+        for shard, rebuilt, positions, elapsed in results:
+            self.stdout.write(f"Шард {shard}: портфелей {rebuilt}, позиций {positions}, {elapsed:.2f} с")
+        total = sum(result[1] for result in results)
+        self.stdout.write(self.style.SUCCESS(
+            f"Пересобрано портфелей: {total} за {time.perf_counter() - started:.2f} с"
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from portfel_online.valuation import revalue_portfolios
+
+
+class Command(BaseCommand):
+    help = ("Полный пересчет агрегатов портфелей (сверка инкрементально поддерживаемых сумм). "
+            "Обязателен один раз после migrate, добавившего market_value/cost_basis/priced_positions: "
+            "до пересчета портфель со старыми данными пересчитывается целиком при первом изменении позиции, "
+            "а снимки и сводки по нему неточны.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--portfolio', type=int, action='append', dest='portfolio_ids',
+            help="Port_ID портфеля; можно указать несколько раз. По умолчанию — все портфели.",
+        )
+
+    def handle(self, *args, **options):
+        updated_count = revalue_portfolios(options['portfolio_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано портфелей: {updated_count}"))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from portfel_online.snapshots import SNAPSHOT_INTERVALS, take_snapshots
+from portfel_online.valuation import revalue_portfolios
+
+
+class Command(BaseCommand):
+    help = "Снимок стоимости всех портфелей за текущий интервал (для графика доходности). Запускать по расписанию."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--at', help="Момент снимка в ISO 8601. По умолчанию — сейчас.")
+        parser.add_argument('--interval', choices=sorted(SNAPSHOT_INTERVALS),
+                            help="Шаг снимков. По умолчанию — settings.PORTFOLIO_SNAPSHOT_INTERVAL.")
+        parser.add_argument('--revalue', action='store_true',
+                            help="Перед снимком полностью пересчитать агрегаты портфелей.")
+
+    def handle(self, *args, **options):
+        moment = None
+        if options['at']:
+            moment = parse_datetime(options['at'])
+            if moment is None:
+                raise CommandError("Invalid --at datetime.")
+        if options['revalue']:
+            revalue_portfolios()
+        written = take_snapshots(moment, options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"Сохранено снимков: {written}"))
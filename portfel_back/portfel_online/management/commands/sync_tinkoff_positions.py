@@ -0,0 +1,37 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from tinkoff.invest import InvestError
+
+from portfel_online.models import Portfolios
+from portfel_online.tinkoff_api import TinkoffAccountError
+from portfel_online.tinkoff_sync import sync_tinkoff_portfolio
+
+
+class Command(BaseCommand):
+    help = ("Переносит позиции счета Tinkoff в портфель (PortfolioAssets) с записью корректирующих сделок. "
+            "Против локального стенда: TINKOFF_API_TARGET=127.0.0.1:50051 TINKOFF_API_INSECURE=1.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--portfolio', type=int, required=True, help="Port_ID портфеля.")
+        parser.add_argument('--token', default=os.environ.get('TINKOFF_TOKEN'),
+                            help="Токен Tinkoff API. По умолчанию из переменной TINKOFF_TOKEN.")
+        parser.add_argument('--prune', action='store_true', help="Закрыть позиции, которых нет у брокера.")
+
+    def handle(self, *args, **options):
+        if not options['token']:
+            raise CommandError("Tinkoff API token is required (--token or TINKOFF_TOKEN).")
+        if not Portfolios.objects.filter(Port_ID=options['portfolio']).exists():
+            raise CommandError(f"Портфель {options['portfolio']} не найден.")
+        try:
+            result = sync_tinkoff_portfolio(options['token'], options['portfolio'], prune=options['prune'])
+        except (TinkoffAccountError, InvestError) as e:
+            raise CommandError(f"Ошибка Tinkoff API: {e}")
+
+        if result['unmapped']:
+            self.stderr.write(f"Нет в каталоге: {', '.join(result['unmapped'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Счет {result['account_id']}: позиций у брокера {result['positions']}, создано {result['created']}, "
+            f"обновлено {result['updated']}, без изменений {result['unchanged']}, закрыто {result['removed']}, "
+            f"сделок {result['deals']}"
+        ))
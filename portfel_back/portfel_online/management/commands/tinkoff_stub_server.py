@@ -0,0 +1,147 @@
+import asyncio
+import random
+
+import grpc
+from django.core.management.base import BaseCommand
+from tinkoff.invest.grpc import (
+    common_pb2, instruments_pb2, instruments_pb2_grpc, operations_pb2, operations_pb2_grpc, users_pb2, users_pb2_grpc,
+)
+
+from portfel_online.models import Assets
+
+STUB_ACCOUNT_ID = 'stub-account'
+INVALID_TOKEN = 'invalid'
+
+
+def _money(value, currency='rub'):
+    units = int(value)
+    return common_pb2.MoneyValue(currency=currency, units=units, nano=int(round((value - units) * 1_000_000_000)))
+
+
+def _quotation(value):
+    units = int(value)
+    return common_pb2.Quotation(units=units, nano=int(round((value - units) * 1_000_000_000)))
+
+
+class _StubService:
+    def __init__(self, latency, jitter):
+        self.latency = latency
+        self.jitter = jitter
+
+    async def _handle(self, context):
+        token = dict(context.invocation_metadata()).get('authorization', '')
+        await asyncio.sleep(max(self.latency + random.uniform(-self.jitter, self.jitter), 0))
+        if token.removeprefix('Bearer ') == INVALID_TOKEN:
+            await context.abort(grpc.StatusCode.UNAUTHENTICATED, "40003: authentication token is missing or invalid")
+
+
+class UsersStub(_StubService, users_pb2_grpc.UsersServiceServicer):
+    async def GetAccounts(self, request, context):
+        await self._handle(context)
+        return users_pb2.GetAccountsResponse(accounts=[users_pb2.Account(
+            id=STUB_ACCOUNT_ID, type=users_pb2.ACCOUNT_TYPE_TINKOFF, name='Stub',
+            status=users_pb2.ACCOUNT_STATUS_OPEN, access_level=users_pb2.ACCOUNT_ACCESS_LEVEL_FULL_ACCESS,
+        )])
+
+
+class OperationsStub(_StubService, operations_pb2_grpc.OperationsServiceServicer):
+    def __init__(self, latency, jitter, holdings):
+        super().__init__(latency, jitter)
+        rng = random.Random(42)
+        self.positions = [
+            operations_pb2.PortfolioPosition(
+                figi=figi, instrument_type='share', quantity=_quotation(rng.randint(1, 100)),
+                average_position_price=_money(rng.uniform(10, 500)), expected_yield=_quotation(rng.uniform(-50, 50)),
+                current_nkd=_money(0), current_price=_money(rng.uniform(10, 500)),
+                quantity_lots=_quotation(rng.randint(1, 10)),
+            ) for figi, _, _ in holdings
+        ]
+
+    async def GetPortfolio(self, request, context):
+        await self._handle(context)
+        if request.account_id != STUB_ACCOUNT_ID:
+            await context.abort(grpc.StatusCode.NOT_FOUND, f"account {request.account_id} not found")
+        total = sum(p.current_price.units * p.quantity.units for p in self.positions)
+        return operations_pb2.PortfolioResponse(
+            account_id=STUB_ACCOUNT_ID,
+            total_amount_shares=_money(total), total_amount_bonds=_money(0), total_amount_etf=_money(0),
+            total_amount_currencies=_money(0), total_amount_futures=_money(0),
+            total_amount_portfolio=_money(total), expected_yield=_quotation(0),
+            positions=self.positions,
+        )
+
+
+class InstrumentsStub(_StubService, instruments_pb2_grpc.InstrumentsServiceServicer):
+    """Списки инструментов по типу: акции из позиций стенда, остальные типы пустые."""
+
+    def __init__(self, latency, jitter, holdings):
+        super().__init__(latency, jitter)
+        self.shares = [
+            instruments_pb2.Share(figi=figi, ticker=ticker, isin=isin, name=ticker, currency='rub')
+            for figi, ticker, isin in holdings
+        ]
+
+    async def Shares(self, request, context):
+        await self._handle(context)
+        return instruments_pb2.SharesResponse(instruments=self.shares)
+
+    async def Bonds(self, request, context):
+        await self._handle(context)
+        return instruments_pb2.BondsResponse()
+
+    async def Etfs(self, request, context):
+        await self._handle(context)
+        return instruments_pb2.EtfsResponse()
+
+    async def Currencies(self, request, context):
+        await self._handle(context)
+        return instruments_pb2.CurrenciesResponse()
+
+    async def Futures(self, request, context):
+        await self._handle(context)
+        return instruments_pb2.FuturesResponse()
+
+
+def _holdings(count, from_catalog):
+    """(figi, ticker, isin) позиций стенда: из каталога Assets или синтетические."""
+    if from_catalog:
+        return [
+            (f"STUB{asset_id:08d}", ticker, isin)
+            for asset_id, ticker, isin in Assets.objects.order_by('Asset_ID').values_list('Asset_ID', 'ticker', 'ISIN')[:count]
+        ]
+    return [(f"STUB{i:08d}", f"STB{i}", f"STUB{i:08d}XX") for i in range(count)]
+
+
+class Command(BaseCommand):
+    help = ("Локальный gRPC-стенд вместо Tinkoff Invest API (GetAccounts/GetPortfolio/списки инструментов) "
+            "с настраиваемой задержкой. "
+            "Запуск бэка против стенда: TINKOFF_API_TARGET=127.0.0.1:<port> TINKOFF_API_INSECURE=1. "
+            f"Токен '{INVALID_TOKEN}' дает UNAUTHENTICATED.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=50051)
+        parser.add_argument('--latency-ms', type=float, default=150.0, help="Задержка ответа на каждый вызов.")
+        parser.add_argument('--jitter-ms', type=float, default=20.0)
+        parser.add_argument('--positions', type=int, default=20, help="Позиций в ответе GetPortfolio.")
+        parser.add_argument('--from-catalog', action='store_true',
+                            help="Взять инструменты позиций из каталога Assets (для проверки синхронизации позиций).")
+
+    async def _serve(self, options, holdings):
+        latency = options['latency_ms'] / 1000
+        jitter = options['jitter_ms'] / 1000
+        server = grpc.aio.server()
+        users_pb2_grpc.add_UsersServiceServicer_to_server(UsersStub(latency, jitter), server)
+        operations_pb2_grpc.add_OperationsServiceServicer_to_server(OperationsStub(latency, jitter, holdings), server)
+        instruments_pb2_grpc.add_InstrumentsServiceServicer_to_server(InstrumentsStub(latency, jitter, holdings), server)
+        address = f"{options['host']}:{options['port']}"
+        server.add_insecure_port(address)
+        await server.start()
+        self.stdout.write(self.style.SUCCESS(f"Стенд Tinkoff API слушает {address} (задержка {options['latency_ms']} мс)"))
+        await server.wait_for_termination()
+
+    def handle(self, *args, **options):
+        try:
+            asyncio.run(self._serve(options, _holdings(options['positions'], options['from_catalog'])))
+        except KeyboardInterrupt:
+            pass
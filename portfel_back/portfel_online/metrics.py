@@ -0,0 +1,228 @@
+"""Метрики запросов: SQL, сериализация и вызовы Tinkoff.
+
+Middleware заводит на запрос RequestMetrics в contextvar, обертка курсора,
+сериализаторы и gRPC-интерсепторы добавляют в него время. Итог уходит в
+заголовок Server-Timing и в гистограммы по эндпоинтам, которые отдает
+/metrics в текстовом формате Prometheus. Гистограммы живут в памяти
+процесса: при нескольких воркерах каждый отдает свои.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+import grpc
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+HISTOGRAMS = {
+    'portfel_request_duration_seconds': ("Время обработки запроса.", DURATION_BUCKETS),
+    'portfel_request_db_queries': ("SQL-запросов на запрос.", QUERY_BUCKETS),
+    'portfel_request_db_seconds': ("Время SQL на запрос.", DURATION_BUCKETS),
+    'portfel_request_serialize_seconds': ("Время сериализаторов DRF на запрос.", DURATION_BUCKETS),
+    'portfel_request_grpc_seconds': ("Время вызовов Tinkoff API на запрос.", DURATION_BUCKETS),
+}
+UNMATCHED_ENDPOINT = 'unmatched'
+KNOWN_METHODS = frozenset(['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'])
+
+_current = ContextVar('portfel_request_metrics', default=None)
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+class RequestMetrics:
+    __slots__ = ('db_queries', 'db_seconds', 'serialize_seconds', 'serializing', 'grpc_calls', 'grpc_seconds')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.serializing = False
+        self.grpc_calls = 0
+        self.grpc_seconds = 0.0
+
+    def add_grpc(self, seconds):
+        self.grpc_calls += 1
+        self.grpc_seconds += seconds
+
+
+def current_metrics():
+    return _current.get()
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_seconds += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def _instrument_connection(sender, connection, **kwargs):
+    # Обертка остается на объекте соединения и после переподключения
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+class TimedSerializerMixin:
+    """Время to_representation верхнего уровня; вложенные сериализаторы не считаются дважды."""
+
+    def to_representation(self, instance):
+        metrics = _current.get()
+        if metrics is None or metrics.serializing:
+            return super().to_representation(instance)
+        metrics.serializing = True
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializing = False
+            metrics.serialize_seconds += time.perf_counter() - started
+
+
+class GrpcTimingInterceptor(grpc.UnaryUnaryClientInterceptor):
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        metrics = _current.get()
+        if metrics is None:
+            return continuation(client_call_details, request)
+        started = time.perf_counter()
+        try:
+            return continuation(client_call_details, request)
+        finally:
+            metrics.add_grpc(time.perf_counter() - started)
+
+
+class AsyncGrpcTimingInterceptor(grpc.aio.UnaryUnaryClientInterceptor):
+    async def intercept_unary_unary(self, continuation, client_call_details, request):
+        metrics = _current.get()
+        started = time.perf_counter()
+        call = await continuation(client_call_details, request)
+        if metrics is not None:
+            # continuation возвращает вызов раньше ответа — время считаем до его завершения
+            call.add_done_callback(lambda _: metrics.add_grpc(time.perf_counter() - started))
+        return call
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+def observe_request(method, endpoint, duration, metrics):
+    values = {
+        'portfel_request_duration_seconds': duration,
+        'portfel_request_db_queries': metrics.db_queries,
+        'portfel_request_db_seconds': metrics.db_seconds,
+        'portfel_request_serialize_seconds': metrics.serialize_seconds,
+        'portfel_request_grpc_seconds': metrics.grpc_seconds,
+    }
+    with _histograms_lock:
+        for name, value in values.items():
+            histogram = _histograms.get((name, method, endpoint))
+            if histogram is None:
+                histogram = _histograms[(name, method, endpoint)] = Histogram(HISTOGRAMS[name][1])
+            histogram.observe(value)
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics():
+    """Гистограммы в текстовом формате Prometheus 0.0.4."""
+    with _histograms_lock:
+        snapshot = sorted(
+            (key, list(histogram.counts), histogram.total, histogram.count)
+            for key, histogram in _histograms.items()
+        )
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for (metric, method, endpoint), counts, total, count in snapshot:
+            if metric != name:
+                continue
+            labels = f'method="{method}",endpoint="{endpoint}"'
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{{labels},le="{_format_value(bound)}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{{labels}}} {_format_value(total)}')
+            lines.append(f'{name}_count{{{labels}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def server_timing(duration, metrics):
+    return ', '.join([
+        f'db;dur={metrics.db_seconds * 1000:.1f};desc="{metrics.db_queries} queries"',
+        f'serialize;dur={metrics.serialize_seconds * 1000:.1f}',
+        f'grpc;dur={metrics.grpc_seconds * 1000:.1f};desc="{metrics.grpc_calls} calls"',
+        f'total;dur={duration * 1000:.1f}',
+    ])
+
+
+class RequestMetricsMiddleware:
+    """Считает метрики запроса, пишет Server-Timing и наблюдения в гистограммы.
+
+    Эндпоинт в метках — имя маршрута (``portfolio-detail``), а не путь:
+    число рядов в /metrics не растет с числом портфелей.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, time.perf_counter() - started, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, time.perf_counter() - started, metrics)
+
+    def _finish(self, request, response, duration, metrics):
+        match = request.resolver_match
+        method = request.method if request.method in KNOWN_METHODS else 'OTHER'
+        endpoint = (match.view_name or match.route) if match else UNMATCHED_ENDPOINT
+        observe_request(method, endpoint, duration, metrics)
+        if getattr(settings, 'SERVER_TIMING_ENABLED', True):
+            response['Server-Timing'] = server_timing(duration, metrics)
+        return response
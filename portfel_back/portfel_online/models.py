@@ -1,5 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.db.models.functions import Upper
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 
 User = get_user_model()
 class AssetTypes(models.Model):
@@ -14,8 +17,8 @@ class AssetTypes(models.Model):
 
 class Assets(models.Model):
     Asset_ID = models.AutoField(primary_key=True)
-    ISIN = models.CharField(max_length=255)
-    ticker = models.CharField(max_length=255)
+    ISIN = models.CharField(max_length=255, db_index=True)
+    ticker = models.CharField(max_length=255, db_index=True)
     company = models.CharField(max_length=255)
     country = models.CharField(max_length=255)
     region = models.CharField(max_length=255)
@@ -32,11 +35,34 @@ class Assets(models.Model):
     current_price = models.DecimalField(
         max_digits=12, decimal_places=4, null=True, blank=True
     )
+    price_updated_at = models.DateTimeField(null=True, blank=True) # Время последнего принятого тика цены
     asset_type = models.ForeignKey(AssetTypes, on_delete=models.PROTECT) # Изменено с DO_NOTHING и asset_type_id
+    # Поисковый вектор поддерживается самой БД (GENERATED ... STORED)
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('ticker', weight='A', config='simple')
+            + SearchVector('ISIN', weight='A', config='simple')
+            + SearchVector('company', weight='B', config='simple')
+            + SearchVector('description', weight='D', config='simple')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
     class Meta:
         managed = True
         db_table = 'assets'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='assets_search_vector_gin'),
+            # Триграммы для поиска по подстроке в тикере, ISIN и названии; выражения
+            # совпадают с тем, что Django строит для __icontains: UPPER(col) LIKE UPPER('%q%')
+            GinIndex(
+                OpClass(Upper('ticker'), name='gin_trgm_ops'),
+                OpClass(Upper('ISIN'), name='gin_trgm_ops'),
+                OpClass(Upper('company'), name='gin_trgm_ops'),
+                name='assets_trgm_gin',
+            ),
+        ]
 
 class AuthUser(models.Model):
     id = models.AutoField(primary_key=True)
@@ -63,6 +89,15 @@ class Portfolios(models.Model):
     yield_percent = models.DecimalField(max_digits=7, decimal_places=4, default=0)
     annual_yield = models.DecimalField(max_digits=7, decimal_places=4, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Точные суммы по позициям, из которых выводятся total_value/profit_loss/yield_percent
+    market_value = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+    cost_basis = models.DecimalField(max_digits=27, decimal_places=8, default=0)
+    priced_positions = models.IntegerField(default=0)
+    # Суммы заполнены полным пересчетом (revalue_portfolios); пока False, изменение позиции
+    # пересчитывает портфель целиком — у портфелей, созданных до появления сумм, в них нули
+    aggregates_reconciled = models.BooleanField(default=False)
+    # Увеличивается при любом изменении позиций, сделок или агрегатов; основа ETag
+    version = models.PositiveBigIntegerField(default=1)
 
     class Meta:
         db_table = 'portfolios'
@@ -97,6 +132,34 @@ class Deals(models.Model):
     class Meta:
         managed = True
         db_table = 'deals'
+        indexes = [
+            # Keyset-пагинация истории сделок портфеля по (date, Deal_ID)
+            models.Index(fields=['portfolio', 'date', 'Deal_ID'], name='deals_portfolio_date_idx'),
+        ]
+
+class PortfolioSnapshots(models.Model):
+    ID = models.AutoField(primary_key=True)
+    portfolio = models.ForeignKey(Portfolios, on_delete=models.CASCADE)
+    taken_at = models.DateTimeField() # Начало интервала снимка (день/час)
+    total_value = models.DecimalField(max_digits=17, decimal_places=2)
+    cost = models.DecimalField(max_digits=17, decimal_places=2)
+    profit_loss = models.DecimalField(max_digits=17, decimal_places=2)
+
+    class Meta:
+        managed = True
+        db_table = 'portfolio_snapshots'
+        # Уникальность по (portfolio, taken_at) заодно дает индекс для чтения диапазона
+        unique_together = ('portfolio', 'taken_at')
+
+class AssetFigis(models.Model):
+    ID = models.AutoField(primary_key=True)
+    figi = models.CharField(max_length=32, unique=True) # Идентификатор инструмента у брокера (Tinkoff)
+    asset = models.ForeignKey(Assets, on_delete=models.CASCADE, null=True, blank=True) # NULL — инструмента нет в каталоге
+    resolved_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        managed = True
+        db_table = 'asset_figis'
 
 class DealSource(models.Model):
     Source_ID = models.AutoField(primary_key=True)
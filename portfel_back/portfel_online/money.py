@@ -0,0 +1,73 @@
+"""Суммы, цены и количества как целые с фиксированной точкой.
+
+Значение — целое число единиц 10**-places, как units/nano у брокера.
+Горячие циклы считают на int, в Decimal значение переводится только на
+границе: запись в БД и сериализация. Округление повторяет Decimal.quantize,
+совпадение на случайных данных проверяет portfel_online.tests.test_money.
+"""
+from decimal import Decimal, ROUND_HALF_EVEN, ROUND_HALF_UP
+
+NANO_PLACES = 9
+NANO = 10 ** NANO_PLACES
+# Точность полей моделей: количество и цены — 4 знака, суммы — 2
+QUANTITY_PLACES = 4
+PRICE_PLACES = 4
+MONEY_PLACES = 2
+
+_POWERS = [10 ** i for i in range(40)]
+
+
+def div_round(numerator, denominator, rounding=ROUND_HALF_EVEN):
+    """Целое частное с округлением половины как у Decimal: ROUND_HALF_EVEN или ROUND_HALF_UP (от нуля)."""
+    if denominator < 0:
+        numerator, denominator = -numerator, -denominator
+    quotient, remainder = divmod(numerator if numerator >= 0 else -numerator, denominator)
+    twice = remainder * 2
+    if twice > denominator or twice == denominator and (rounding == ROUND_HALF_UP or quotient & 1):
+        quotient += 1
+    elif rounding != ROUND_HALF_EVEN and rounding != ROUND_HALF_UP:
+        raise ValueError(f"Unsupported rounding: {rounding}")
+    return quotient if numerator >= 0 else -quotient
+
+
+def rescale(value, places, new_places, rounding=ROUND_HALF_EVEN):
+    if new_places >= places:
+        return value * _POWERS[new_places - places]
+    return div_round(value, _POWERS[places - new_places], rounding)
+
+
+def from_units_nano(units, nano, places=NANO_PLACES, rounding=ROUND_HALF_UP):
+    """MoneyValue/Quotation брокера -> целое с ``places`` знаками."""
+    return rescale(units * NANO + nano, NANO_PLACES, places, rounding)
+
+
+def from_decimal(value, places, rounding=ROUND_HALF_EVEN):
+    """Decimal -> целое с ``places`` знаками; лишние знаки округляются как quantize."""
+    numerator, denominator = value.as_integer_ratio()
+    return div_round(numerator * _POWERS[places], denominator, rounding)
+
+
+def to_decimal(value, places):
+    """Целое -> Decimal с ровно ``places`` знаками, как после quantize."""
+    return Decimal(value).scaleb(-places)
+
+
+def to_string(value, places):
+    """Целое -> строка с ровно ``places`` знаками без Decimal (для COPY и CSV)."""
+    integer, fraction = divmod(abs(value), _POWERS[places])
+    sign = '-' if value < 0 else ''
+    return f"{sign}{integer}.{fraction:0{places}d}" if places else f"{sign}{integer}"
+
+
+def units_nano_to_string(units, nano):
+    """Строка суммы units/nano, та же, что str(Decimal(units) + Decimal(nano) / 10**9).
+
+    Незначащие нули дробной части отбрасываются, без дробной части — целое.
+    """
+    if not nano:
+        return str(units)
+    if units and (units < 0) != (nano < 0) or not units and -1000 < nano < 1000:
+        # Разные знаки (у брокера не встречается) и значения меньше 1e-6,
+        # которые Decimal печатает в экспоненциальной записи
+        return str((Decimal(units) + Decimal(nano).scaleb(-NANO_PLACES)).normalize())
+    return f"{'-' if nano < 0 else ''}{abs(units)}.{str(abs(nano)).rjust(NANO_PLACES, '0').rstrip('0')}"
@@ -0,0 +1,115 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination, Cursor
+
+
+class DealsCursorPagination(CursorPagination):
+    """Keyset-пагинация истории сделок по (date, Deal_ID).
+
+    Позиция курсора — дата и Deal_ID последней строки страницы, поэтому
+    страница N читается по индексу (portfolio, date, Deal_ID) так же
+    быстро, как первая, без OFFSET.
+
+    Сортировка — только ``?ordering=date|-date``: у курсора должен быть
+    стабильный ключ. Прежние asset__ticker, type и total (OrderingFilter)
+    больше не поддерживаются и дают 400, а не молча игнорируются.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = '-date'
+    ordering_param = 'ordering'
+    allowed_orderings = ('-date', 'date')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get(self.ordering_param) or self.ordering
+        if ordering not in self.allowed_orderings:
+            raise ValidationError({self.ordering_param: [
+                f"Unsupported ordering '{ordering}'. Expected one of: {', '.join(self.allowed_orderings)}."
+            ]})
+        return ordering
+
+    def _encode_position(self, deal):
+        return f"{deal.date.isoformat()}|{deal.Deal_ID}"
+
+    def _decode_position(self, position):
+        try:
+            date_str, deal_id = position.rsplit('|', 1)
+            date = parse_datetime(date_str)
+            deal_id = int(deal_id)
+        except (ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return date, deal_id
+
+    def _page_queryset(self, queryset, request, view):
+        """Срез на страницу + 1 строку; None, если пагинация выключена."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor.reverse if self.cursor else False
+        current_position = self.cursor.position if self.cursor else None
+
+        descending = self.ordering.startswith('-')
+        if descending != reverse:
+            queryset = queryset.order_by('-date', '-Deal_ID')
+            lookup = 'lt'
+        else:
+            queryset = queryset.order_by('date', 'Deal_ID')
+            lookup = 'gt'
+
+        if current_position is not None:
+            date, deal_id = self._decode_position(current_position)
+            # Избыточная граница date__lte/gte — условие диапазона по индексу (portfolio, date, Deal_ID):
+            # одно OR индекс не ограничивает, и страница N просматривала бы все более новые строки
+            queryset = queryset.filter(
+                Q(**{f'date__{lookup}e': date}),
+                Q(**{f'date__{lookup}': date}) | Q(date=date, **{f'Deal_ID__{lookup}': deal_id}),
+            )
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, results):
+        reverse = self.cursor.reverse if self.cursor else False
+        has_position = self.cursor is not None and self.cursor.position is not None
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = has_position
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = has_position
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self._page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page(list(queryset))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self._encode_position(self.page[-1])
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self._encode_position(self.page[0])
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
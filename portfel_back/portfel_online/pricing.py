@@ -0,0 +1,155 @@
+import logging
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .caching import invalidate_assets
+from .models import Assets
+from .valuation import revalue_portfolios
+
+logger = logging.getLogger(__name__)
+
+PRICE_QUANT = Decimal("0.0001")
+BULK_UPDATE_BATCH_SIZE = 500
+# Граница current_price (max_digits/decimal_places): цена больше уронила бы весь bulk_update
+_price_field = Assets._meta.get_field('current_price')
+MAX_PRICE = Decimal(10) ** (_price_field.max_digits - _price_field.decimal_places)
+
+
+class PriceTick:
+    __slots__ = ('ticker', 'isin', 'price', 'timestamp')
+
+    def __init__(self, ticker, isin, price, timestamp):
+        self.ticker = ticker
+        self.isin = isin
+        self.price = price
+        self.timestamp = timestamp
+
+
+def parse_timestamp(value):
+    if value in (None, ''):
+        return timezone.now()
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, (int, float)) or (isinstance(value, str) and value.replace('.', '', 1).isdigit()):
+        try:
+            parsed = datetime.fromtimestamp(float(value), tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            raise ValueError("Timestamp is out of range.")
+    else:
+        parsed = parse_datetime(str(value))
+        if parsed is None:
+            raise ValueError("Invalid timestamp format.")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def parse_text(value, name):
+    """Строковое поле из JSON: обрезанная строка или None. Число или объект — ошибка этой строки, а не 500."""
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{name} must be a string.")
+    return value.strip() or None
+
+
+def parse_tick(raw):
+    if not isinstance(raw, dict):
+        raise ValueError("Tick must be an object.")
+    ticker = parse_text(raw.get('ticker'), 'Ticker')
+    isin = parse_text(raw.get('isin') or raw.get('ISIN'), 'ISIN')
+    if not ticker and not isin:
+        raise ValueError("Ticker or ISIN is required.")
+    price_raw = raw.get('price')
+    if price_raw in (None, ''):
+        raise ValueError("Price is required.")
+    try:
+        price = Decimal(str(price_raw)).quantize(PRICE_QUANT, rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError("Invalid price format.")
+    if not price.is_finite():
+        raise ValueError("Invalid price format.")
+    if price >= MAX_PRICE:
+        raise ValueError(f"Price must be less than {MAX_PRICE}.")
+    if price < 0:
+        raise ValueError("Price cannot be negative.")
+    return PriceTick(ticker, isin, price, parse_timestamp(raw.get('timestamp')))
+
+
+def parse_ticks(raw_ticks):
+    ticks = []
+    errors = {}
+    for index, raw in enumerate(raw_ticks):
+        try:
+            ticks.append(parse_tick(raw))
+        except ValueError as e:
+            errors[index] = str(e)
+    return ticks, errors
+
+
+def ingest_price_ticks(ticks):
+    """Применяет пачку тиков: одно чтение активов, bulk_update цен и одна переоценка затронутых портфелей.
+
+    Для каждого актива берется самый свежий тик; тики старше уже принятой
+    цены (price_updated_at) отбрасываются.
+    """
+    result = {'received': len(ticks), 'applied': 0, 'stale': 0, 'unknown': [], 'portfolios_revalued': 0}
+    if not ticks:
+        return result
+
+    tickers = {t.ticker for t in ticks if t.ticker}
+    isins = {t.isin for t in ticks if t.isin}
+    assets_by_ticker = {}
+    assets_by_isin = {}
+    current = {}
+    for asset_id, ticker, isin, price, updated_at in Assets.objects.filter(
+        Q(ticker__in=tickers) | Q(ISIN__in=isins)
+    ).values_list('Asset_ID', 'ticker', 'ISIN', 'current_price', 'price_updated_at'):
+        assets_by_ticker.setdefault(ticker, []).append(asset_id)
+        assets_by_isin.setdefault(isin, []).append(asset_id)
+        current[asset_id] = (price, updated_at)
+
+    latest = {}
+    unknown = set()
+    for tick in ticks:
+        asset_ids = assets_by_isin.get(tick.isin) if tick.isin else assets_by_ticker.get(tick.ticker)
+        if not asset_ids:
+            unknown.add(tick.isin or tick.ticker)
+            continue
+        for asset_id in asset_ids:
+            previous = latest.get(asset_id)
+            if previous is None or tick.timestamp >= previous.timestamp:
+                latest[asset_id] = tick
+
+    to_update = []
+    repriced_ids = []
+    for asset_id, tick in latest.items():
+        old_price, updated_at = current[asset_id]
+        if updated_at is not None and tick.timestamp < updated_at:
+            result['stale'] += 1
+            continue
+        to_update.append(Assets(Asset_ID=asset_id, current_price=tick.price, price_updated_at=tick.timestamp))
+        if old_price != tick.price:
+            repriced_ids.append(asset_id)
+
+    with transaction.atomic():
+        Assets.objects.bulk_update(
+            to_update, ['current_price', 'price_updated_at'], batch_size=BULK_UPDATE_BATCH_SIZE
+        )
+        # bulk_update не шлет post_save, поэтому кэш каталога сбрасываем явно
+        invalidate_assets([asset.Asset_ID for asset in to_update])
+        if repriced_ids:
+            result['portfolios_revalued'] = revalue_portfolios(asset_ids=repriced_ids)
+
+    result['applied'] = len(to_update)
+    result['unknown'] = sorted(unknown)
+    logger.info(
+        f"Ingested {result['applied']} prices ({len(repriced_ids)} changed, {result['stale']} stale, "
+        f"{len(unknown)} unknown), revalued {result['portfolios_revalued']} portfolios"
+    )
+    return result
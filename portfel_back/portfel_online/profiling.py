@@ -0,0 +1,192 @@
+"""Профилирование отдельных запросов по требованию.
+
+Сотрудник (is_staff) включает профилировщик заголовком ``X-Profile: 1`` или
+параметром ``?profile=1``; кроме того, доля PROFILING_SAMPLE_RATE запросов
+профилируется случайно. Вьюха выполняется под cProfile, результат
+сохраняется в PROFILING_DIR как pstats (.prof — открывается snakeviz,
+flameprof, gprof2dot) и JSON с эндпоинтом, пользователем и числом SQL.
+Хранятся последние PROFILING_KEEP профилей.
+"""
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .metrics import current_metrics
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_PARAM = 'profile'
+PROFILE_ID_RE = re.compile(r'^\d{8}T\d{12}-[0-9a-f]{12}$')
+TOP_FUNCTIONS = 15
+
+
+def profile_path(profile_id, suffix='.prof'):
+    """Путь к файлу профиля; None для чужих имен (никаких ../ в URL)."""
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    return os.path.join(settings.PROFILING_DIR, f"{profile_id}{suffix}")
+
+
+def list_profiles(limit=50):
+    try:
+        names = sorted((name for name in os.listdir(settings.PROFILING_DIR) if name.endswith('.json')), reverse=True)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(settings.PROFILING_DIR, name), encoding='utf-8') as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            # Файл мог удалить соседний процесс при ротации
+            continue
+    return profiles
+
+
+def _prune():
+    names = sorted(name for name in os.listdir(settings.PROFILING_DIR) if name.endswith('.json'))
+    for name in names[:max(0, len(names) - settings.PROFILING_KEEP)]:
+        profile_id = name[:-len('.json')]
+        for suffix in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(settings.PROFILING_DIR, f"{profile_id}{suffix}"))
+            except FileNotFoundError:
+                pass
+
+
+def _top_functions(profiler):
+    stats = pstats.Stats(profiler)
+    return [
+        {
+            'function': f"{filename}:{line}({name})",
+            'calls': calls,
+            'total_ms': round(total * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+        }
+        for (filename, line, name), (_, calls, total, cumulative, _) in
+        sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+    ]
+
+
+def save_profile(profiler, meta):
+    now = datetime.now(dt_timezone.utc)
+    profile_id = f"{now:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:12]}"
+    meta = {'id': profile_id, 'created_at': now.isoformat(), **meta, 'top': _top_functions(profiler)}
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    profiler.dump_stats(profile_path(profile_id))
+    # JSON пишется последним: по нему профиль виден в списке
+    with open(profile_path(profile_id, '.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    _prune()
+    return profile_id
+
+
+def _staff_user(request):
+    # Флаг принимается только от сотрудника: до вьюхи пользователь еще не известен,
+    # поэтому DRF-аутентификация (Token/JWT) выполняется здесь
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = drf_request.user
+    except APIException:
+        return None
+    return user if user and user.is_staff else None
+
+
+def _requested(request):
+    return request.headers.get(PROFILE_HEADER) == '1' or request.GET.get(PROFILE_QUERY_PARAM) == '1'
+
+
+class ProfilingMiddleware:
+    """Выполняет вьюху под cProfile, если профиль запрошен сотрудником или выпал по сэмплированию.
+
+    Работает в process_view, поэтому под ASGI синхронная вьюха профилируется
+    в том же потоке, где выполняется. Асинхронные вьюхи не профилируются:
+    cProfile не отделяет их от других корутин цикла событий. Без флага и
+    сэмплирования запрос проходит без перехода в поток и без запросов к БД.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def _trigger(self, request, view_func):
+        if not settings.PROFILING_ENABLED or iscoroutinefunction(view_func):
+            return None
+        if _requested(request):
+            return 'flag'
+        if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return 'sample'
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        trigger = self._trigger(request, view_func)
+        if trigger is None:
+            return None
+        return self._profile(trigger, request, view_func, view_args, view_kwargs)
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        trigger = self._trigger(request, view_func)
+        if trigger is None:
+            return None
+        return await sync_to_async(self._profile, thread_sensitive=True)(
+            trigger, request, view_func, view_args, view_kwargs
+        )
+
+    def _profile(self, trigger, request, view_func, view_args, view_kwargs):
+        if trigger == 'flag' and _staff_user(request) is None:
+            return None
+        metrics = current_metrics()
+        queries_before = metrics.db_queries if metrics else 0
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = view_func(request, *view_args, **view_kwargs)
+            # DRF рендерит ответ после middleware — рендерер тоже входит в профиль
+            if callable(getattr(response, 'render', None)) and not response.is_rendered:
+                response.render()
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+
+        user = getattr(request, 'user', None)
+        authenticated = user is not None and user.is_authenticated
+        match = request.resolver_match
+        try:
+            profile_id = save_profile(profiler, {
+                'endpoint': (match.view_name or match.route) if match else None,
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'user_id': user.pk if authenticated else None,
+                'username': user.get_username() if authenticated else None,
+                'trigger': trigger,
+                'duration_ms': round(duration * 1000, 3),
+                'queries': metrics.db_queries - queries_before if metrics else None,
+            })
+        except OSError as e:
+            logger.error(f"Failed to save profile for {request.path}: {e}")
+        else:
+            response['X-Profile-Id'] = profile_id
+        return response
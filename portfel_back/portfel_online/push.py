@@ -0,0 +1,43 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from .models import Portfolios
+
+logger = logging.getLogger(__name__)
+
+PORTFOLIO_CHANGED_EVENT = 'portfolio.changed'
+
+
+def user_group(user_id):
+    return f"portfolios.user.{user_id}"
+
+
+def _send_portfolio_changes(portfolio_ids):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    by_user = {}
+    for portfolio_id, user_id in Portfolios.objects.filter(Port_ID__in=portfolio_ids).values_list('Port_ID', 'user_id'):
+        by_user.setdefault(user_id, []).append(portfolio_id)
+    try:
+        for user_id, user_portfolio_ids in by_user.items():
+            async_to_sync(channel_layer.group_send)(
+                user_group(user_id), {'type': PORTFOLIO_CHANGED_EVENT, 'portfolios': user_portfolio_ids}
+            )
+    except Exception as e:
+        # Push — best effort: недоступный channel layer не должен ронять запись
+        logger.error(f"Failed to push portfolio changes for {len(portfolio_ids)} portfolios: {e}")
+
+
+def notify_portfolios_changed(portfolio_ids):
+    """После коммита сообщает подписчикам, что агрегаты портфелей изменились.
+
+    Шлется одно событие на пользователя со списком портфелей; сами значения
+    читает consumer при отправке, поэтому частые изменения склеиваются.
+    """
+    portfolio_ids = list(portfolio_ids)
+    if portfolio_ids:
+        transaction.on_commit(lambda: _send_portfolio_changes(portfolio_ids))
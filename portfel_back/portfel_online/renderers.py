@@ -0,0 +1,67 @@
+import datetime
+import decimal
+import uuid
+
+import msgpack
+import orjson
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer
+
+# Отдельный media type: обычный application/json остается за JSONRenderer DRF,
+# у которого Decimal вне сериализаторов превращается во float
+FAST_JSON_MEDIA_TYPE = 'application/vnd.portfel+json'
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+
+
+def _isoformat(value):
+    # Как в JSONEncoder DRF: UTC с суффиксом Z
+    text = value.isoformat()
+    if text.endswith('+00:00'):
+        text = text[:-6] + 'Z'
+    return text
+
+
+def encode_default(value):
+    """Типы, которых нет в JSON/MessagePack. Decimal уходит строкой, без потери точности."""
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return _isoformat(value)
+    if isinstance(value, datetime.timedelta):
+        return str(value.total_seconds())
+    if isinstance(value, (uuid.UUID, Promise)):
+        return str(value)
+    if isinstance(value, (tuple, set, frozenset)):
+        return list(value)
+    if hasattr(value, 'tolist'):
+        # numpy-скаляры и массивы из аналитики
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+class FastJSONRenderer(BaseRenderer):
+    """JSON через orjson. Запрашивается ``Accept: application/vnd.portfel+json``."""
+    media_type = FAST_JSON_MEDIA_TYPE
+    format = 'fastjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Ошибки по строкам (тики, импорт сделок) — словари с int-ключами; ключи станут строками, как у json
+        return orjson.dumps(
+            data, default=encode_default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        )
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack. Запрашивается ``Accept: application/msgpack``."""
+    media_type = MSGPACK_MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True, datetime=False)
@@ -0,0 +1,58 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from rest_framework import filters
+
+SEARCH_CONFIG = 'simple'
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_prefix_query(text):
+    # "sber pref" -> 'sber:* & pref:*': поиск по началу слов, пока пользователь печатает
+    terms = _TERM_RE.findall(text)
+    if not terms:
+        return None
+    return SearchQuery(' & '.join(f"{term}:*" for term in terms), search_type='raw', config=SEARCH_CONFIG)
+
+
+def search_assets(queryset, text):
+    """Полнотекстовый поиск активов с ранжированием.
+
+    Совпадения ищутся по ``Assets.search_vector`` (GIN) и по подстроке в
+    тикере/ISIN/названии (триграммный GIN). Точное совпадение тикера или
+    ISIN всегда идет первым, дальше — по ts_rank.
+    """
+    text = text.replace('\x00', '').strip()
+    query = build_prefix_query(text)
+    if query is None:
+        return queryset
+    return queryset.annotate(
+        exact_match=Case(
+            When(Q(ticker__iexact=text) | Q(ISIN__iexact=text), then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        search_rank=SearchRank(F('search_vector'), query),
+    ).filter(
+        Q(search_vector=query)
+        | Q(ticker__icontains=text)
+        | Q(ISIN__icontains=text)
+        | Q(company__icontains=text)
+    ).order_by('-exact_match', '-search_rank', 'ticker', 'Asset_ID')
+
+
+class AssetSearchFilter(filters.SearchFilter):
+    """Тот же параметр ``?search=``, но через индексированный поиск на PostgreSQL.
+
+    На других СУБД остается поведение стандартного SearchFilter по ``search_fields``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if connections[queryset.db].vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+        text = request.query_params.get(self.search_param, '')
+        if not text.strip():
+            return queryset
+        return search_assets(queryset, text)
@@ -1,10 +1,22 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from .metrics import TimedSerializerMixin
 from .models import AssetTypes, Assets, Portfolios, PortfolioAssets, Deals, DealSource
 
 User = get_user_model()
 
-class AuthUserSerializer(serializers.ModelSerializer):
+class SparseFieldsetMixin:
+    """Принимает ``fields=[...]`` и оставляет в выдаче только эти поля."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+
+class AuthUserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('username', 'email', 'password')
@@ -18,17 +30,17 @@ class AuthUserSerializer(serializers.ModelSerializer):
         )
         return user
 
-class AssetTypesSerializer(serializers.ModelSerializer):
+class AssetTypesSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = AssetTypes
         fields = '__all__'
 
-class DealSourceSerializer(serializers.ModelSerializer):
+class DealSourceSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = DealSource
         fields = '__all__'
 
-class AssetsSerializer(serializers.ModelSerializer):
+class AssetsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     asset_type_name = serializers.CharField(source='asset_type.name', read_only=True)
     asset_type_id = serializers.PrimaryKeyRelatedField(
          queryset=AssetTypes.objects.all(), source='asset_type', write_only=True, required=False
@@ -51,7 +63,7 @@ class AssetsSerializer(serializers.ModelSerializer):
         ]
 
 
-class PortfolioAssetsSerializer(serializers.ModelSerializer):
+class PortfolioAssetsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     asset = AssetsSerializer(read_only=True)
     asset_id = serializers.PrimaryKeyRelatedField(
         queryset=Assets.objects.all(), source='asset', write_only=True
@@ -73,10 +85,21 @@ class PortfolioAssetsSerializer(serializers.ModelSerializer):
         read_only_fields = ['average_price', 'total_value', 'ID', 'portfolio', 'asset']
 
 
-class DealsSerializer(serializers.ModelSerializer):
+class OwnPortfolioField(serializers.PrimaryKeyRelatedField):
+    """Портфель из портфелей текущего пользователя: сделку нельзя создать или перенести в чужой."""
+
+    def get_queryset(self):
+        request = self.context.get('request')
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return Portfolios.objects.none()
+        return Portfolios.objects.filter(user=user)
+
+
+class DealsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     asset_ticker = serializers.CharField(source='asset.ticker', read_only=True)
     asset = serializers.PrimaryKeyRelatedField(queryset=Assets.objects.all())
-    portfolio = serializers.PrimaryKeyRelatedField(queryset=Portfolios.objects.all())
+    portfolio = OwnPortfolioField()
 
     class Meta:
         model = Deals
@@ -88,7 +111,7 @@ class DealsSerializer(serializers.ModelSerializer):
         read_only_fields = ['Deal_ID']
 
 
-class PortfoliosSerializer(serializers.ModelSerializer):
+class PortfoliosSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     portfolio_assets = PortfolioAssetsSerializer(
         many=True,
@@ -106,4 +129,8 @@ class PortfoliosSerializer(serializers.ModelSerializer):
         read_only_fields = [
             'Port_ID', 'user', 'username', 'total_value', 'profit_loss',
             'yield_percent', 'annual_yield', 'created_at'
+        ]
+        # ?view=summary: только заголовочные цифры, без вложенных позиций
+        summary_fields = [
+            'Port_ID', 'name', 'total_value', 'profit_loss', 'yield_percent', 'annual_yield', 'created_at',
         ]
\ No newline at end of file
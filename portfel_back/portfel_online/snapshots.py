@@ -0,0 +1,100 @@
+import logging
+from datetime import datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Portfolios, PortfolioSnapshots
+from .valuation import revalue_portfolios
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_BATCH_SIZE = 2000
+
+# Шаг снимков и допустимые разрешения для выдачи ряда
+SNAPSHOT_INTERVALS = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+RESOLUTIONS = ('hour', 'day', 'week', 'month')
+
+
+def snapshot_bucket(moment=None, interval=None):
+    interval = interval or getattr(settings, 'PORTFOLIO_SNAPSHOT_INTERVAL', 'day')
+    moment = moment or timezone.now()
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    moment = moment.astimezone(timezone.get_current_timezone())
+    if interval == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def take_snapshots(moment=None, interval=None):
+    """Снимок стоимости/себестоимости/P&L всех портфелей за текущий интервал.
+
+    Читает уже поддерживаемые агрегаты Portfolios потоком и пишет их
+    пачками через bulk_create с upsert, так что повторный запуск в том же
+    интервале перезаписывает снимок, а не дублирует его.
+    """
+    taken_at = snapshot_bucket(moment, interval)
+    # Портфели, чьи суммы еще не заполнены полным пересчетом, иначе попадут в снимок с нулями
+    pending = list(Portfolios.objects.filter(aggregates_reconciled=False).values_list('Port_ID', flat=True))
+    if pending:
+        revalue_portfolios(pending)
+    batch = []
+    written = 0
+    rows = Portfolios.objects.order_by('Port_ID').values_list('Port_ID', 'market_value', 'cost_basis')
+    for portfolio_id, market_value, cost_basis in rows.iterator(chunk_size=SNAPSHOT_BATCH_SIZE):
+        cost = (cost_basis or Decimal('0')).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        value = market_value or Decimal('0.00')
+        batch.append(PortfolioSnapshots(
+            portfolio_id=portfolio_id, taken_at=taken_at,
+            total_value=value, cost=cost, profit_loss=value - cost,
+        ))
+        if len(batch) >= SNAPSHOT_BATCH_SIZE:
+            written += _write(batch)
+            batch = []
+    if batch:
+        written += _write(batch)
+    logger.info(f"Stored {written} portfolio snapshots for {taken_at.isoformat()}")
+    return written
+
+
+def _write(batch):
+    PortfolioSnapshots.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=['portfolio', 'taken_at'],
+        update_fields=['total_value', 'cost', 'profit_loss'],
+    )
+    return len(batch)
+
+
+def parse_range_bound(raw):
+    try:
+        parsed = parse_datetime(raw)
+        if parsed is None:
+            day = parse_date(raw)
+            parsed = datetime.combine(day, time.min) if day else None
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def snapshot_series(portfolio_id, start, end, resolution='day'):
+    """Ряд снимков за [start, end], прореженный до ``resolution``.
+
+    Для каждого интервала берется последний снимок (значение на закрытие),
+    одним запросом по индексу (portfolio, taken_at) с DISTINCT ON.
+    """
+    return list(
+        PortfolioSnapshots.objects
+        .filter(portfolio_id=portfolio_id, taken_at__gte=start, taken_at__lte=end)
+        .annotate(bucket=Trunc('taken_at', resolution))
+        .order_by('bucket', '-taken_at')
+        .distinct('bucket')
+        .values('bucket', 'total_value', 'cost', 'profit_loss')
+    )
@@ -0,0 +1,26 @@
+"""Минимальные объекты каталога и сделок для тестов."""
+from decimal import Decimal
+
+from django.utils import timezone
+
+from portfel_online.ledger import COMPLETED_STATUS
+from portfel_online.models import Assets, AssetTypes, Deals
+
+
+def create_asset(ticker, price=None):
+    asset_type = AssetTypes.objects.get_or_create(name='Акции', defaults={'risk_level': 1, 'liquidity': 1})[0]
+    return Assets.objects.create(
+        ISIN=f'RU000{ticker}', ticker=ticker, company=f'{ticker} Corp', country='RU', region='Europe',
+        exchange='MOEX', market='Shares', trading_type='T+1', management_fee=0, currency='RUB',
+        description=ticker, dividend_yield=0, pe_ratio=0, pb_ratio=0, beta=Decimal('1.00'),
+        current_price=None if price is None else Decimal(price), asset_type=asset_type,
+    )
+
+
+def create_deal(portfolio, asset, is_buy, quantity, price, date=None, status=COMPLETED_STATUS):
+    quantity, price = Decimal(quantity), Decimal(price)
+    return Deals.objects.create(
+        portfolio=portfolio, asset=asset, address='test', status=status, type=is_buy,
+        quantity=quantity, price=price, total=(quantity * price).quantize(Decimal('0.01')),
+        commission=Decimal('0.00'), tax=Decimal('0.00'), date=date or timezone.now(),
+    )
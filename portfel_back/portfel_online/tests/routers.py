@@ -0,0 +1,8 @@
+from portfel_online.dbrouting import ReplicaRouter
+
+
+class TestReplicaRouter(ReplicaRouter):
+    """ReplicaRouter, который создает таблицы и в тестовой базе реплики."""
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
@@ -0,0 +1,27 @@
+"""Настройки тестов.
+
+    python manage.py test portfel_online.tests --settings=portfel_online.tests.settings
+
+Channel layer и кэш — в памяти процесса: тестам не нужен Redis, а пуши
+из кода идут в тот же InMemoryChannelLayer, что слушают consumers.
+"""
+from portfel.settings import *  # noqa: F401,F403
+
+REDIS_HOST = ''
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'portfel-tests',
+    }
+}
+CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+PROFILING_ENABLED = False
+
+# Отдельная тестовая база реплики вместо TEST.MIRROR: тесты маршрутизации видят, с какой базы
+# пришли данные. Чтение с нее включают только эти тесты (override_settings DATABASE_REPLICAS)
+DATABASES = {
+    'default': DATABASES['default'],
+    'replica_1': {**DATABASES['default'], 'TEST': {'NAME': f"test_{DATABASES['default']['NAME']}_replica"}},
+}
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['portfel_online.tests.routers.TestReplicaRouter']
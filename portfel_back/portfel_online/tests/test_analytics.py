@@ -0,0 +1,111 @@
+import math
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from portfel_online.analytics import (
+    compute_analytics, max_drawdown, period_returns, risk_metrics, weighted_average,
+)
+from portfel_online.models import PortfolioAssets, PortfolioSnapshots, Portfolios
+
+from .factories import create_asset
+
+User = get_user_model()
+
+PERIODS = 4
+
+
+class MetricsMathTests(SimpleTestCase):
+    def test_known_series(self):
+        # P&L 0 -> 10 -> -1 при стоимости 100 -> 110 -> 99: доходности +10% и -10%
+        returns = period_returns(np.array([100.0, 110.0, 99.0]), np.array([0.0, 10.0, -1.0]))
+        np.testing.assert_allclose(returns, [0.1, -0.1])
+
+        metrics = risk_metrics(returns, PERIODS)
+        # std(ddof=1) = sqrt(0.1² + 0.1²) = 0.1·√2, годовая — умножить на √4
+        self.assertAlmostEqual(metrics['volatility'], 0.1 * math.sqrt(2) * 2)
+        self.assertAlmostEqual(metrics['mean_return'], 0.0)
+        self.assertAlmostEqual(metrics['sharpe'], 0.0)
+        self.assertAlmostEqual(metrics['sortino'], 0.0)
+        # Пик 1.1 после первого периода, затем 1.1 · 0.9 = 0.99
+        self.assertAlmostEqual(max_drawdown(returns), -0.1)
+
+    def test_risk_free_rate_shifts_excess_return(self):
+        returns = np.array([0.03, 0.01])
+        metrics = risk_metrics(returns, PERIODS, risk_free_rate=0.04)
+        std = math.sqrt(2) * 0.01
+        self.assertAlmostEqual(metrics['sharpe'], (0.02 - 0.01) / std * 2)
+        # Безрисковая ставка за период 0.01 — ни одна доходность не ниже нее, Sortino не определен
+        self.assertIsNone(metrics['sortino'])
+
+    def test_weighted_beta(self):
+        self.assertAlmostEqual(weighted_average(np.array([100.0, 300.0]), np.array([1.0, 2.0])), 1.75)
+        self.assertIsNone(weighted_average(np.array([0.0, 0.0]), np.array([1.0, 2.0])))
+        self.assertIsNone(weighted_average(np.empty(0), np.empty(0)))
+
+    def test_single_snapshot(self):
+        returns = period_returns(np.array([100.0]), np.array([5.0]))
+        self.assertEqual(returns.size, 0)
+        self.assertEqual(set(risk_metrics(returns, PERIODS).values()), {None})
+        self.assertIsNone(max_drawdown(returns))
+        # Одной доходности для стандартного отклонения мало
+        self.assertEqual(set(risk_metrics(np.array([0.1]), PERIODS).values()), {None})
+
+    def test_zero_variance(self):
+        metrics = risk_metrics(np.array([0.01, 0.01, 0.01]), PERIODS)
+        self.assertEqual(metrics['volatility'], 0.0)
+        self.assertIsNone(metrics['sharpe'])
+        self.assertIsNone(metrics['sortino'])
+        self.assertAlmostEqual(metrics['mean_return'], 0.04)
+        self.assertEqual(max_drawdown(np.array([0.01, 0.01, 0.01])), 0.0)
+
+    def test_zero_value_period_has_zero_return(self):
+        returns = period_returns(np.array([0.0, 100.0, 110.0]), np.array([0.0, 0.0, 10.0]))
+        np.testing.assert_allclose(returns, [0.0, 0.1])
+
+
+@override_settings(PORTFOLIO_SNAPSHOT_INTERVAL='day', ANALYTICS_RISK_FREE_RATE=0.0)
+class ComputeAnalyticsTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('owner', password='password')
+        self.portfolio = Portfolios.objects.create(user=user, name='Основной')
+        for ticker, value, beta in (('SBER', '100.00', '1.00'), ('GAZP', '300.00', '2.00')):
+            asset = create_asset(ticker, '1.0000')
+            asset.beta = Decimal(beta)
+            asset.save(update_fields=['beta'])
+            PortfolioAssets.objects.create(
+                portfolio=self.portfolio, asset=asset, quantity=Decimal(value), average_price=Decimal('1.0000'),
+                total_value=Decimal(value),
+            )
+
+    def snapshot(self, days_ago, value, profit_loss):
+        PortfolioSnapshots.objects.create(
+            portfolio=self.portfolio, taken_at=timezone.now() - timedelta(days=days_ago),
+            total_value=Decimal(value), cost=Decimal(value) - Decimal(profit_loss), profit_loss=Decimal(profit_loss),
+        )
+
+    def test_snapshot_series(self):
+        for days_ago, value, profit_loss in ((3, '100', '0'), (2, '110', '10'), (1, '99', '-1')):
+            self.snapshot(days_ago, value, profit_loss)
+        # Снимок вне окна в ряд не попадает
+        self.snapshot(400, '50', '-50')
+        metrics = compute_analytics(self.portfolio.Port_ID)
+        self.assertEqual(metrics['positions'], 2)
+        self.assertEqual(metrics['total_value'], 400.0)
+        self.assertEqual(metrics['weighted_beta'], 1.75)
+        self.assertEqual(metrics['observations'], 2)
+        self.assertEqual(metrics['volatility'], round(0.1 * math.sqrt(2) * math.sqrt(365), 6))
+        self.assertEqual(metrics['max_drawdown'], -0.1)
+
+    def test_single_snapshot(self):
+        self.snapshot(1, '100', '0')
+        metrics = compute_analytics(self.portfolio.Port_ID)
+        self.assertEqual(metrics['observations'], 0)
+        self.assertIsNone(metrics['volatility'])
+        self.assertIsNone(metrics['sharpe'])
+        self.assertIsNone(metrics['max_drawdown'])
+        self.assertEqual(metrics['weighted_beta'], 1.75)
@@ -0,0 +1,79 @@
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+
+from portfel_online import async_views
+from portfel_online.models import Portfolios
+
+from .factories import create_asset, create_deal
+
+User = get_user_model()
+
+
+class AsyncReadViewTests(TestCase):
+    """/async/... против синхронных вьюсетов: те же ответы, не больше двух переходов в поток."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.headers = {'Authorization': f"Token {Token.objects.create(user=user).key}"}
+        self.portfolio = Portfolios.objects.create(user=user, name='Основной')
+        self.asset = create_asset('SBER', '250.5000')
+        for _ in range(3):
+            create_deal(self.portfolio, self.asset, True, '1', '250.5')
+
+    async def get(self, path, **headers):
+        """(ответ /async/<path>, число переходов в поток) и ответ синхронного /<path>."""
+        hops = []
+
+        def counting_sync_to_async(func, *args, **kwargs):
+            hops.append(func)
+            return sync_to_async(func, *args, **kwargs)
+
+        with mock.patch.object(async_views, 'sync_to_async', counting_sync_to_async):
+            response = await self.async_client.get(f'/async{path}', headers=headers)
+        expected = await sync_to_async(self.client.get)(path, headers=headers)
+        return response, len(hops), expected
+
+    def assertSameResponse(self, response, expected):
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response.get('ETag'), expected.get('ETag'))
+
+    async def test_anonymous_catalog_hit_skips_threads(self):
+        path = f'/assets/{self.asset.Asset_ID}/'
+        response, hops, _ = await self.get(path)
+        self.assertEqual((response.status_code, response['X-Cache'], hops), (200, 'MISS', 1))
+        response, hops, expected = await self.get(path)
+        self.assertEqual((response['X-Cache'], hops), ('HIT', 0))
+        self.assertSameResponse(response, expected)
+
+    async def test_authenticated_catalog_uses_one_hop_per_stage(self):
+        response, hops, _ = await self.get('/assets/', **self.headers)
+        self.assertEqual((response['X-Cache'], hops), ('MISS', 2))
+        response, hops, expected = await self.get('/assets/', **self.headers)
+        self.assertEqual((response['X-Cache'], hops), ('HIT', 1))
+        self.assertSameResponse(response, expected)
+
+    async def test_portfolio_responses_match_sync_viewsets(self):
+        for path in ('/portfolios/', '/portfolios/?view=summary', f'/portfolios/{self.portfolio.Port_ID}/',
+                     f'/portfolios/{self.portfolio.Port_ID}/deals/'):
+            with self.subTest(path=path):
+                response, hops, expected = await self.get(path, **self.headers)
+                self.assertEqual(hops, 2)
+                self.assertSameResponse(response, expected)
+
+                response, hops, _ = await self.get(path, **self.headers, **{'If-None-Match': expected['ETag']})
+                self.assertEqual((response.status_code, hops), (304, 1))
+
+    async def test_missing_objects_are_404(self):
+        for path, headers in ((f'/assets/{self.asset.Asset_ID + 1}/', {}), ('/portfolios/0/', self.headers)):
+            with self.subTest(path=path):
+                response, _, expected = await self.get(path, **headers)
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(expected.status_code, 404)
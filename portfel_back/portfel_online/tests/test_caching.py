@@ -0,0 +1,35 @@
+import time
+from unittest import mock
+
+from django.test import TestCase
+
+from portfel_online.caching import _version_key, get_cache
+
+from .factories import create_asset
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.addCleanup(get_cache().clear)
+
+    def test_detail_is_invalidated_when_asset_changes(self):
+        asset = create_asset('SBER', '250.0000')
+        url = f'/assets/{asset.Asset_ID}/'
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            asset.current_price = 251
+            asset.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['current_price'], '251.0000')
+
+    @mock.patch('portfel_online.caching.VERSION_TIMEOUT', 1)
+    def test_version_keys_of_missing_assets_expire(self):
+        key = _version_key('assets:987654')
+        self.assertEqual(self.client.get('/assets/987654/').status_code, 404)
+        self.assertIsNotNone(get_cache().get(key))
+        time.sleep(1.1)
+        self.assertIsNone(get_cache().get(key))
@@ -0,0 +1,118 @@
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from portfel_online.consumers import UNAUTHORIZED_CLOSE_CODE, QueryTokenAuthMiddleware
+from portfel_online.models import Portfolios
+from portfel_online.push import PORTFOLIO_CHANGED_EVENT, user_group
+from portfel_online.routing import websocket_urlpatterns
+from portfel_online.valuation import revalue_portfolios
+
+User = get_user_model()
+
+application = QueryTokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+PUSH_INTERVAL_MS = 300
+PUSH_INTERVAL = PUSH_INTERVAL_MS / 1000
+
+
+# consumer читает БД из своего потока — нужны закоммиченные данные, а не транзакция TestCase
+@override_settings(PORTFOLIO_PUSH_INTERVAL_MS=PUSH_INTERVAL_MS)
+class PortfolioUpdatesConsumerTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        self.token = Token.objects.create(user=self.user).key
+        self.first = Portfolios.objects.create(user=self.user, name='Первый').Port_ID
+        self.second = Portfolios.objects.create(user=self.user, name='Второй').Port_ID
+        self.foreign = Portfolios.objects.create(user=other, name='Чужой').Port_ID
+
+    async def connect(self, token=None):
+        path = '/ws/portfolios/' + (f'?token={token}' if token else '')
+        communicator = WebsocketCommunicator(application, path)
+        connected, close_code = await communicator.connect()
+        return communicator, connected, close_code
+
+    async def subscribe(self, portfolio_ids=()):
+        communicator, connected, _ = await self.connect(self.token)
+        self.assertTrue(connected)
+        await communicator.send_json_to({'action': 'subscribe', 'portfolios': list(portfolio_ids)})
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['type'], 'subscribed')
+        return communicator, message
+
+    async def push(self, *portfolio_ids):
+        await get_channel_layer().group_send(
+            user_group(self.user.pk), {'type': PORTFOLIO_CHANGED_EVENT, 'portfolios': list(portfolio_ids)}
+        )
+
+    async def receive_update(self, communicator):
+        message = await communicator.receive_json_from(timeout=PUSH_INTERVAL * 5)
+        self.assertEqual(message['type'], 'portfolio.update')
+        return sorted(portfolio['id'] for portfolio in message['portfolios'])
+
+    async def test_rejects_connection_without_token(self):
+        _, connected, close_code = await self.connect()
+        self.assertFalse(connected)
+        self.assertEqual(close_code, UNAUTHORIZED_CLOSE_CODE)
+
+    async def test_rejects_connection_with_invalid_token(self):
+        _, connected, close_code = await self.connect('not-a-token')
+        self.assertFalse(connected)
+        self.assertEqual(close_code, UNAUTHORIZED_CLOSE_CODE)
+
+    async def test_subscribe_returns_only_own_portfolios(self):
+        communicator, message = await self.subscribe([self.first, self.foreign])
+        self.assertEqual([portfolio['id'] for portfolio in message['portfolios']], [self.first])
+        await communicator.disconnect()
+
+    async def test_subscribe_without_ids_covers_all_own_portfolios(self):
+        communicator, message = await self.subscribe()
+        self.assertEqual(sorted(portfolio['id'] for portfolio in message['portfolios']), [self.first, self.second])
+        await communicator.disconnect()
+
+    async def test_invalid_portfolio_list_is_rejected(self):
+        communicator, connected, _ = await self.connect(self.token)
+        self.assertTrue(connected)
+        await communicator.send_json_to({'action': 'subscribe', 'portfolios': 'all'})
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['type'], 'error')
+        await communicator.disconnect()
+
+    async def test_changes_of_unsubscribed_portfolios_are_not_pushed(self):
+        communicator, _ = await self.subscribe()
+        await communicator.send_json_to({'action': 'unsubscribe', 'portfolios': [self.second]})
+        message = await communicator.receive_json_from()
+        self.assertEqual(message, {'type': 'unsubscribed', 'portfolios': [self.second]})
+
+        await self.push(self.second)
+        self.assertTrue(await communicator.receive_nothing(timeout=PUSH_INTERVAL * 2))
+        await self.push(self.first)
+        self.assertEqual(await self.receive_update(communicator), [self.first])
+        await communicator.disconnect()
+
+    async def test_changes_within_interval_are_coalesced(self):
+        communicator, _ = await self.subscribe()
+        await self.push(self.first)
+        self.assertEqual(await self.receive_update(communicator), [self.first])
+
+        # Следующее окно открывается через PORTFOLIO_PUSH_INTERVAL_MS после прошлой отправки
+        await self.push(self.first)
+        await self.push(self.second)
+        await self.push(self.first)
+        self.assertTrue(await communicator.receive_nothing(timeout=PUSH_INTERVAL / 2))
+        self.assertEqual(await self.receive_update(communicator), [self.first, self.second])
+        self.assertTrue(await communicator.receive_nothing(timeout=PUSH_INTERVAL * 2))
+        await communicator.disconnect()
+
+    async def test_revaluation_pushes_fresh_values_after_commit(self):
+        communicator, _ = await self.subscribe([self.first])
+        await database_sync_to_async(revalue_portfolios)([self.first])
+        message = await communicator.receive_json_from(timeout=PUSH_INTERVAL * 5)
+        self.assertEqual(message['type'], 'portfolio.update')
+        self.assertEqual([portfolio['id'] for portfolio in message['portfolios']], [self.first])
+        self.assertEqual(message['portfolios'][0]['version'], 2)
+        await communicator.disconnect()
@@ -0,0 +1,84 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError
+from django.http import HttpResponse
+from django.test import RequestFactory, TransactionTestCase, override_settings
+
+from portfel_online.dbrouting import ReplicaRoutingMiddleware, _health, use_primary
+from portfel_online.models import AssetTypes
+
+User = get_user_model()
+
+REPLICA = 'replica_1'
+
+
+# В тестовых базах разные строки AssetTypes: по прочитанному видно, куда ушел запрос.
+# TransactionTestCase — проверка здоровья закрывает соединение реплики, внутри atomic это сломало бы тест
+@override_settings(DATABASE_REPLICAS=[REPLICA], DATABASE_STICKY_SECONDS=1)
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', REPLICA}
+
+    def setUp(self):
+        _health.clear()
+        self.addCleanup(_health.clear)
+        self.user = User.objects.create_user('owner', password='password')
+        AssetTypes.objects.create(name='primary', risk_level=1, liquidity=1)
+        AssetTypes.objects.using(REPLICA).create(name='replica', risk_level=1, liquidity=1)
+
+    def request(self, method='get', user=None, write=False, pinned=False):
+        """Прогоняет запрос через ReplicaRoutingMiddleware; имена AssetTypes, прочитанные во вьюхе."""
+        names = []
+
+        def view(request):
+            if write:
+                AssetTypes.objects.create(name='written', risk_level=1, liquidity=1)
+            if pinned:
+                with use_primary():
+                    names.extend(AssetTypes.objects.order_by('name').values_list('name', flat=True))
+            else:
+                names.extend(AssetTypes.objects.order_by('name').values_list('name', flat=True))
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/')
+        request.user = user or self.user
+        ReplicaRoutingMiddleware(view)(request)
+        return names
+
+    def test_safe_reads_go_to_replica(self):
+        self.assertEqual(self.request(), ['replica'])
+        self.assertEqual(self.request('head'), ['replica'])
+
+    def test_unsafe_requests_and_use_primary_read_primary(self):
+        self.assertEqual(self.request('post'), ['primary'])
+        self.assertEqual(self.request(pinned=True), ['primary'])
+
+    def test_reads_outside_request_go_to_primary(self):
+        self.assertEqual(list(AssetTypes.objects.values_list('name', flat=True)), ['primary'])
+
+    def test_user_reads_primary_within_window_after_write(self):
+        self.assertEqual(self.request(write=True), ['primary', 'written'])
+        self.assertEqual(self.request(), ['primary', 'written'])
+        other = User.objects.create_user('other', password='password')
+        self.assertEqual(self.request(user=other), ['replica'])
+
+        time.sleep(settings.DATABASE_STICKY_SECONDS + 0.1)
+        self.assertEqual(self.request(), ['replica'])
+
+    def test_unavailable_replica_falls_back_to_primary(self):
+        with mock.patch('portfel_online.dbrouting.replica_lag', side_effect=DatabaseError('connection refused')):
+            self.assertEqual(self.request(), ['primary'])
+        # До следующей проверки реплика остается исключенной
+        self.assertEqual(self.request(), ['primary'])
+
+        with override_settings(DATABASE_REPLICA_CHECK_INTERVAL=0):
+            self.assertEqual(self.request(), ['replica'])
+
+    @override_settings(DATABASE_REPLICA_CHECK_INTERVAL=0)
+    def test_lagging_replica_is_excluded(self):
+        lag = settings.DATABASE_REPLICA_MAX_LAG_SECONDS + 1
+        with mock.patch('portfel_online.dbrouting.replica_lag', return_value=lag):
+            self.assertEqual(self.request(), ['primary'])
+        self.assertEqual(self.request(), ['replica'])
@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from portfel_online.deal_import import import_deals, parse_deal_row
+from portfel_online.models import Deals, PortfolioAssets, Portfolios
+
+from .factories import create_asset
+
+User = get_user_model()
+
+
+def row(**overrides):
+    return {'ticker': 'SBER', 'type': 'buy', 'quantity': '10', 'price': '100.5', 'date': '2025-03-01T10:00:00Z',
+            **overrides}
+
+
+class ParseDealRowTests(TestCase):
+    def test_non_string_text_fields_are_row_errors(self):
+        for field, value in (('ticker', 123), ('isin', {'code': 'RU0009029540'}), ('status', ['Completed'])):
+            with self.subTest(field=field), self.assertRaisesMessage(ValueError, 'must be a string'):
+                parse_deal_row(row(**{field: value}))
+
+    def test_total_defaults_to_rounded_quantity_times_price(self):
+        parsed = parse_deal_row(row(quantity='3', price='0.005'))
+        self.assertEqual(parsed.total, Decimal('0.02'))
+        self.assertEqual(parsed.status, 'Completed')
+
+
+class ImportDealsTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.portfolio = Portfolios.objects.create(user=user, name='Основной', aggregates_reconciled=True)
+        create_asset('SBER', '110.0000')
+
+    def test_invalid_rows_are_reported_per_row(self):
+        result = import_deals(self.portfolio.Port_ID, [
+            row(),
+            row(ticker=123),
+            row(quantity='NaN'),
+            row(price='1e20'),
+            row(date=10 ** 20),
+            row(ticker='UNKNOWN'),
+            None,
+            row(type='sell', quantity='4'),
+        ], skip_invalid=True)
+        self.assertEqual(result['imported'], 2)
+        self.assertEqual(sorted(result['errors']), [2, 3, 4, 5, 6, 7])
+        self.assertEqual(result['errors'][2], "Ticker must be a string.")
+        self.assertEqual(Deals.objects.filter(portfolio=self.portfolio).count(), 2)
+        self.assertEqual(PortfolioAssets.objects.get(portfolio=self.portfolio).quantity, 6)
+
+    def test_invalid_rows_abort_import_without_skip(self):
+        result = import_deals(self.portfolio.Port_ID, [row(), row(status=1)])
+        self.assertEqual(result['invalid'], 1)
+        self.assertFalse(Deals.objects.filter(portfolio=self.portfolio).exists())
@@ -0,0 +1,102 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from portfel_online.models import Deals, PortfolioAssets, Portfolios
+
+from .factories import create_asset, create_deal
+
+User = get_user_model()
+
+
+def deal_payload(portfolio, asset, is_buy=True, quantity='10', price='100'):
+    return {
+        'portfolio': portfolio.Port_ID, 'asset': asset.Asset_ID, 'address': 'test', 'status': 'Completed',
+        'type': is_buy, 'quantity': quantity, 'price': price, 'total': '0', 'commission': '0', 'tax': '0',
+        'date': '2025-03-01T10:00:00Z',
+    }
+
+
+class DealPortfolioOwnershipTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        self.portfolio = Portfolios.objects.create(user=self.user, name='Основной', aggregates_reconciled=True)
+        self.second = Portfolios.objects.create(user=self.user, name='Второй', aggregates_reconciled=True)
+        self.foreign = Portfolios.objects.create(user=other, name='Чужой', aggregates_reconciled=True)
+        self.asset = create_asset('SBER', '110.0000')
+        self.client.force_authenticate(self.user)
+        response = self.client.post(
+            f'/portfolios/{self.portfolio.Port_ID}/deals/', deal_payload(self.portfolio, self.asset), format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.deal_id = response.data['Deal_ID']
+
+    def test_deal_cannot_be_moved_into_foreign_portfolio(self):
+        response = self.client.patch(
+            f'/deals/{self.deal_id}/', {'portfolio': self.foreign.Port_ID}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('portfolio', response.data)
+        self.assertEqual(Deals.objects.get(Deal_ID=self.deal_id).portfolio_id, self.portfolio.Port_ID)
+        self.assertFalse(PortfolioAssets.objects.filter(portfolio=self.foreign).exists())
+
+    def test_deal_cannot_be_created_with_foreign_portfolio_in_body(self):
+        response = self.client.post(
+            f'/portfolios/{self.portfolio.Port_ID}/deals/', deal_payload(self.foreign, self.asset), format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_deal_can_be_moved_between_own_portfolios(self):
+        response = self.client.patch(
+            f'/deals/{self.deal_id}/', {'portfolio': self.second.Port_ID}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertFalse(PortfolioAssets.objects.filter(portfolio=self.portfolio).exists())
+        self.assertEqual(PortfolioAssets.objects.get(portfolio=self.second).quantity, 10)
+
+    def test_deleting_last_deal_closes_position(self):
+        self.assertEqual(self.client.delete(f'/deals/{self.deal_id}/').status_code, 204)
+        self.assertFalse(PortfolioAssets.objects.filter(portfolio=self.portfolio).exists())
+
+
+class DealHistoryPaginationTests(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        portfolio = Portfolios.objects.create(user=user, name='Основной')
+        asset = create_asset('SBER', '110.0000')
+        started = timezone.now() - timedelta(days=10)
+        # Две сделки в одну секунду: порядок внутри даты задает Deal_ID
+        dates = [started, started] + [started + timedelta(days=day) for day in (1, 2, 3)]
+        self.deal_ids = [create_deal(portfolio, asset, True, '1', '100', date=date).Deal_ID for date in dates]
+        self.url = f'/portfolios/{portfolio.Port_ID}/deals/'
+        self.client.force_authenticate(user)
+
+    def walk(self, **params):
+        response = self.client.get(self.url, {'page_size': 2, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        pages = [response.data]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).data)
+        return pages
+
+    def ids(self, page):
+        return [deal['Deal_ID'] for deal in page['results']]
+
+    def test_pages_follow_date_ordering(self):
+        for ordering, expected in (('-date', self.deal_ids[::-1]), ('date', self.deal_ids), ('', self.deal_ids[::-1])):
+            with self.subTest(ordering=ordering):
+                pages = self.walk(ordering=ordering)
+                self.assertEqual([deal_id for page in pages for deal_id in self.ids(page)], expected)
+                self.assertEqual(len(pages), 3)
+                previous = self.client.get(pages[-1]['previous']).data
+                self.assertEqual(self.ids(previous), self.ids(pages[-2]))
+
+    def test_unsupported_ordering_is_rejected(self):
+        for ordering in ('asset__ticker', '-total', 'type'):
+            with self.subTest(ordering=ordering):
+                response = self.client.get(self.url, {'ordering': ordering})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('ordering', response.data)
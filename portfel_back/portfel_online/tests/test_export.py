@@ -0,0 +1,63 @@
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db.models.query import QuerySet
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from portfel_online.models import Portfolios
+
+from .factories import create_asset, create_deal
+
+User = get_user_model()
+
+DEALS = 10
+
+
+class DealsExportTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.headers = {'Authorization': f"Token {Token.objects.create(user=user).key}"}
+        self.portfolio = Portfolios.objects.create(user=user, name='Основной')
+        asset = create_asset('SBER', '250.5000')
+        started = timezone.now() - timedelta(days=DEALS)
+        for day in range(DEALS):
+            create_deal(self.portfolio, asset, True, '1', '250.5', date=started + timedelta(days=day))
+        self.url = f'/portfolios/{self.portfolio.Port_ID}/deals/export/'
+
+    async def test_asgi_export_streams_before_queryset_is_read(self):
+        consumed = []
+        iterator = QuerySet.iterator
+
+        def counting_iterator(queryset, chunk_size=None):
+            for row in iterator(queryset, chunk_size=chunk_size):
+                consumed.append(row)
+                yield row
+
+        with mock.patch.object(QuerySet, 'iterator', counting_iterator), \
+                mock.patch('portfel_online.export.ROWS_PER_WRITE', 2):
+            response = await self.async_client.get(self.url, {'format': 'csv'}, headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            chunks = aiter(response.streaming_content)
+            self.assertTrue((await anext(chunks)).startswith(b'id,date,ticker'))
+            self.assertEqual(consumed, [])
+            self.assertEqual((await anext(chunks)).count(b'\n'), 2)
+            self.assertLess(len(consumed), DEALS)
+            rest = [chunk async for chunk in chunks]
+        self.assertEqual(len(consumed), DEALS)
+        self.assertEqual(b''.join(rest).count(b'\n'), DEALS - 2)
+
+    async def test_asgi_and_wsgi_exports_match(self):
+        for fmt in ('csv', 'ndjson'):
+            with self.subTest(fmt=fmt):
+                response = await self.async_client.get(self.url, {'format': fmt}, headers=self.headers)
+                streamed = b''.join([chunk async for chunk in response.streaming_content])
+                self.assertEqual(streamed, await sync_to_async(self.wsgi_export)(fmt))
+                self.assertEqual(streamed.count(b'\n'), DEALS + (fmt == 'csv'))
+
+    def wsgi_export(self, fmt):
+        response = self.client.get(self.url, {'format': fmt}, headers=self.headers)
+        return b''.join(response.streaming_content)
@@ -0,0 +1,177 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+
+from portfel_online.ledger import rebuild_portfolio
+from portfel_online.models import Deals, PortfolioAssets, Portfolios
+from portfel_online.tinkoff_sync import BrokerPosition, sync_positions
+from portfel_online.valuation import PORTFOLIO_AGGREGATE_FIELDS, revalue_portfolios
+
+from .factories import create_asset
+from .test_deals import deal_payload
+
+User = get_user_model()
+
+
+class AggregatesAgainstRecomputeTests(APITestCase):
+    """Инкрементальные агрегаты и позиции против полного пересчета после каждого изменения."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.portfolio = self.create_portfolio('Основной')
+        self.second = self.create_portfolio('Второй')
+        self.sber = create_asset('SBER', '110.1250')
+        self.gazp = create_asset('GAZP', '170.3350')
+        # Без текущей цены: позиция входит в себестоимость, но не в стоимость
+        self.unpriced = create_asset('UNPR')
+
+    def create_portfolio(self, name):
+        response = self.client.post('/portfolios/', {'name': name}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Portfolios.objects.get(Port_ID=response.data['Port_ID'])
+
+    def state(self, portfolio):
+        portfolio = Portfolios.objects.get(Port_ID=portfolio.Port_ID)
+        positions = {
+            asset_id: (quantity, average_price, total_value)
+            for asset_id, quantity, average_price, total_value in PortfolioAssets.objects.filter(
+                portfolio=portfolio
+            ).values_list('asset_id', 'quantity', 'average_price', 'total_value')
+        }
+        return {field: getattr(portfolio, field) for field in PORTFOLIO_AGGREGATE_FIELDS}, positions
+
+    def assertMatchesRebuild(self, *portfolios):
+        """Состояние после инкрементальных путей совпадает с пересборкой из журнала и переоценкой."""
+        for portfolio in portfolios:
+            incremental = self.state(portfolio)
+            self.assertTrue(Portfolios.objects.get(Port_ID=portfolio.Port_ID).aggregates_reconciled)
+            asset_ids = [self.sber.Asset_ID, self.gazp.Asset_ID, self.unpriced.Asset_ID]
+            rebuild_portfolio(portfolio.Port_ID, asset_ids=asset_ids)
+            self.assertEqual(incremental, self.state(portfolio), portfolio.name)
+
+    def assertMatchesRevalue(self, portfolio):
+        incremental = self.state(portfolio)
+        revalue_portfolios([portfolio.Port_ID])
+        self.assertEqual(incremental, self.state(portfolio))
+
+    def post_deal(self, portfolio, asset, is_buy=True, quantity='10', price='100', date='2025-03-01T10:00:00Z'):
+        payload = {**deal_payload(portfolio, asset, is_buy, quantity, price), 'date': date}
+        response = self.client.post(f'/portfolios/{portfolio.Port_ID}/deals/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['Deal_ID']
+
+    def test_created_deals(self):
+        self.post_deal(self.portfolio, self.sber, quantity='10', price='100.5')
+        self.assertMatchesRebuild(self.portfolio)
+        self.post_deal(self.portfolio, self.sber, quantity='5', price='120.3333', date='2025-03-02T10:00:00Z')
+        self.post_deal(self.portfolio, self.gazp, quantity='3', price='150', date='2025-03-02T11:00:00Z')
+        self.post_deal(self.portfolio, self.unpriced, quantity='7', price='12.5', date='2025-03-02T12:00:00Z')
+        self.assertMatchesRebuild(self.portfolio)
+        self.post_deal(self.portfolio, self.sber, False, quantity='4', price='130', date='2025-03-03T10:00:00Z')
+        self.assertMatchesRebuild(self.portfolio)
+        # Продажа всей позиции закрывает ее
+        self.post_deal(self.portfolio, self.gazp, False, quantity='3', price='160', date='2025-03-03T11:00:00Z')
+        self.assertNotIn(self.gazp.Asset_ID, self.state(self.portfolio)[1])
+        self.assertMatchesRebuild(self.portfolio)
+
+    def test_backdated_and_pending_deals(self):
+        self.post_deal(self.portfolio, self.sber, quantity='10', price='100', date='2025-03-05T10:00:00Z')
+        self.post_deal(self.portfolio, self.sber, quantity='10', price='80', date='2025-03-01T10:00:00Z')
+        self.assertMatchesRebuild(self.portfolio)
+        before = self.state(self.portfolio)
+        payload = {**deal_payload(self.portfolio, self.sber, quantity='99'), 'status': 'Pending'}
+        self.assertEqual(
+            self.client.post(f'/portfolios/{self.portfolio.Port_ID}/deals/', payload, format='json').status_code, 201
+        )
+        self.assertEqual(self.state(self.portfolio), before)
+        self.assertMatchesRebuild(self.portfolio)
+
+    def test_updated_deleted_and_moved_deals(self):
+        first = self.post_deal(self.portfolio, self.sber, quantity='10', price='100')
+        second = self.post_deal(self.portfolio, self.gazp, quantity='4', price='150', date='2025-03-02T10:00:00Z')
+        self.post_deal(self.second, self.sber, quantity='2', price='90')
+
+        response = self.client.patch(f'/deals/{first}/', {'quantity': '6', 'price': '101.2'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertMatchesRebuild(self.portfolio, self.second)
+
+        response = self.client.patch(f'/deals/{first}/', {'portfolio': self.second.Port_ID}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertNotIn(self.sber.Asset_ID, self.state(self.portfolio)[1])
+        self.assertMatchesRebuild(self.portfolio, self.second)
+
+        self.assertEqual(self.client.delete(f'/deals/{second}/').status_code, 204)
+        self.assertEqual(self.state(self.portfolio)[1], {})
+        self.assertEqual(self.state(self.portfolio)[0]['market_value'], Decimal('0.00'))
+        self.assertMatchesRebuild(self.portfolio, self.second)
+
+    def test_position_endpoint_changes(self):
+        def post_position(asset, quantity, price):
+            response = self.client.post('/portfolio-assets/', {
+                'portfolio': self.portfolio.Port_ID, 'asset_id': asset.Asset_ID, 'quantity': quantity, 'price': price,
+            }, format='json')
+            self.assertIn(response.status_code, (200, 201), response.data)
+            return response.data['ID']
+
+        post_position(self.sber, '3', '99.99')
+        post_position(self.sber, '2', '101.01')
+        unpriced = post_position(self.unpriced, '1', '10')
+        self.assertMatchesRevalue(self.portfolio)
+        self.assertEqual(self.client.delete(f'/portfolio-assets/{unpriced}/').status_code, 204)
+        self.assertMatchesRevalue(self.portfolio)
+
+    def test_unreconciled_portfolio_is_recomputed_before_delta(self):
+        self.post_deal(self.portfolio, self.sber, quantity='10', price='100')
+        # Суммы, записанные в обход пересчета (старые данные), дельтой не исправить
+        Portfolios.objects.filter(Port_ID=self.portfolio.Port_ID).update(
+            market_value=Decimal('12345.00'), cost_basis=Decimal('1'), priced_positions=7, aggregates_reconciled=False,
+        )
+        self.post_deal(self.portfolio, self.gazp, quantity='1', price='150', date='2025-03-02T10:00:00Z')
+        self.assertMatchesRebuild(self.portfolio)
+
+
+class BrokerSyncAgainstLedgerTests(APITestCase):
+    """sync_positions пишет в журнал сделки, повтор которых дает те же позиции и агрегаты."""
+
+    def setUp(self):
+        user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.portfolio = Portfolios.objects.create(user=user, name='Брокер', aggregates_reconciled=True)
+        self.assets = {ticker: create_asset(ticker, price) for ticker, price in (
+            ('SBER', '110.0000'), ('GAZP', '170.5000'), ('LKOH', '7000.0000'), ('YNDX', None),
+        )}
+        self.mapping = {f'FIGI-{ticker}': asset.Asset_ID for ticker, asset in self.assets.items()}
+
+    def sync(self, positions, prune=False):
+        broker = [
+            BrokerPosition(f'FIGI-{ticker}', 'share', Decimal(quantity), Decimal(average_price), None)
+            for ticker, quantity, average_price in positions
+        ]
+        return sync_positions(self.portfolio.Port_ID, broker, self.mapping, prune=prune)
+
+    def state(self):
+        portfolio = Portfolios.objects.get(Port_ID=self.portfolio.Port_ID)
+        positions = set(PortfolioAssets.objects.filter(portfolio=portfolio).values_list(
+            'asset_id', 'quantity', 'average_price', 'total_value',
+        ))
+        return {field: getattr(portfolio, field) for field in PORTFOLIO_AGGREGATE_FIELDS}, positions
+
+    def assertMatchesLedger(self):
+        synced = self.state()
+        rebuild_portfolio(self.portfolio.Port_ID, asset_ids=[asset.Asset_ID for asset in self.assets.values()])
+        self.assertEqual(synced, self.state())
+
+    def test_sync_rounds_match_ledger_replay(self):
+        self.sync([('SBER', '10', '100.0000'), ('GAZP', '5', '150.2500'), ('YNDX', '2', '2500.0000')])
+        self.assertMatchesLedger()
+        # Докупка, частичная продажа по той же средней, смена средней без смены количества и новая позиция
+        result = self.sync([
+            ('SBER', '15', '105.0000'), ('GAZP', '3', '150.2500'), ('YNDX', '2', '2400.0000'), ('LKOH', '1', '6900.0000'),
+        ])
+        self.assertEqual((result['created'], result['updated'], result['unchanged']), (1, 3, 0))
+        self.assertMatchesLedger()
+        result = self.sync([('SBER', '15', '105.0000')], prune=True)
+        self.assertEqual(result['removed'], 3)
+        self.assertMatchesLedger()
+        self.assertEqual(Deals.objects.filter(portfolio=self.portfolio).values('asset').distinct().count(), 4)
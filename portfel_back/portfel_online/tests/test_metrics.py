@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+
+@override_settings(METRICS_TOKEN='', METRICS_ALLOWED_NETWORKS=[])
+class MetricsAccessTests(TestCase):
+    def get(self, **headers):
+        return self.client.get('/metrics', headers=headers)
+
+    def token_header(self, is_staff):
+        user = User.objects.create_user('staff' if is_staff else 'user', password='password', is_staff=is_staff)
+        return f"Token {Token.objects.create(user=user).key}"
+
+    def test_anonymous_request_without_token_is_rejected(self):
+        self.assertEqual(self.get().status_code, 401)
+
+    def test_non_staff_user_is_forbidden(self):
+        self.assertEqual(self.get(Authorization=self.token_header(is_staff=False)).status_code, 403)
+
+    def test_staff_user_can_read_metrics(self):
+        response = self.get(Authorization=self.token_header(is_staff=True))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    @override_settings(METRICS_ALLOWED_NETWORKS=['127.0.0.0/8'])
+    def test_allowed_network_reads_without_credentials(self):
+        # Тестовый клиент ходит с REMOTE_ADDR 127.0.0.1
+        self.assertEqual(self.get().status_code, 200)
+
+    @override_settings(METRICS_TOKEN='secret', METRICS_ALLOWED_NETWORKS=['127.0.0.0/8'])
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(self.get(Authorization=self.token_header(is_staff=True)).status_code, 401)
+        self.assertEqual(self.get(Authorization='Bearer secret').status_code, 200)
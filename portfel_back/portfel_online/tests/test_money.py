@@ -0,0 +1,112 @@
+import random
+from decimal import Decimal, ROUND_HALF_EVEN, ROUND_HALF_UP
+
+from django.test import SimpleTestCase
+
+from portfel_online.ledger import apply_trade, apply_trade_scaled
+from portfel_online.money import (
+    MONEY_PLACES, NANO, PRICE_PLACES, QUANTITY_PLACES, div_round, from_decimal, from_units_nano, rescale, to_decimal,
+    units_nano_to_string,
+)
+
+ITERATIONS = 20_000
+SEED = 42
+PRICE_QUANT = Decimal("0.0001")
+MONEY_QUANT = Decimal("0.01")
+
+
+def legacy_units_nano_string(units, nano):
+    # Прежняя реализация tinkoff_money_to_decimal_string
+    return str(Decimal(units) + Decimal(nano) / Decimal(1_000_000_000))
+
+
+def random_units_nano(rng):
+    scale = rng.choice([0, 1, 10, 1000, 10 ** 6, 10 ** 12, 10 ** 18])
+    units = rng.randint(0, scale)
+    nano = rng.choice([0, rng.randint(0, 999), rng.randint(0, NANO - 1), rng.randint(0, 9999) * 100_000])
+    sign = rng.random()
+    if sign < 0.3:
+        units, nano = -units, -nano
+    elif sign < 0.35:
+        # Разные знаки units и nano брокер не присылает, но прежний код их допускал
+        nano = -nano
+    return units, nano
+
+
+def random_decimal(rng, max_digits, places):
+    value = rng.choice([rng.randint(0, 10 ** max_digits - 1), rng.randint(0, 10 ** places * 10)])
+    return Decimal(value).scaleb(-places)
+
+
+class MoneyAgainstDecimalTests(SimpleTestCase):
+    """Целочисленная арифметика money против Decimal на случайных данных."""
+
+    def setUp(self):
+        self.rng = random.Random(SEED)
+
+    def assertSameDecimal(self, expected, actual, case):
+        # Совпадение значения и числа знаков (экспоненты), как видно в БД и в JSON
+        self.assertEqual(expected, actual, case)
+        if expected:
+            self.assertEqual(expected.as_tuple().exponent, actual.as_tuple().exponent, case)
+
+    def test_units_nano_strings(self):
+        for _ in range(ITERATIONS):
+            units, nano = random_units_nano(self.rng)
+            expected = legacy_units_nano_string(units, nano)
+            self.assertEqual(units_nano_to_string(units, nano), expected, (units, nano))
+            self.assertSameDecimal(
+                Decimal(expected).quantize(PRICE_QUANT, rounding=ROUND_HALF_UP),
+                to_decimal(from_units_nano(units, nano, PRICE_PLACES, ROUND_HALF_UP), PRICE_PLACES),
+                (units, nano),
+            )
+
+    def test_rounding_of_products(self):
+        for _ in range(ITERATIONS):
+            quantity = random_decimal(self.rng, 15, QUANTITY_PLACES)
+            price = random_decimal(self.rng, 12, PRICE_PLACES)
+            if self.rng.random() < 0.5:
+                price = -price
+            scaled = from_decimal(quantity, QUANTITY_PLACES) * from_decimal(price, PRICE_PLACES)
+            for rounding in (ROUND_HALF_UP, ROUND_HALF_EVEN):
+                self.assertSameDecimal(
+                    (quantity * price).quantize(MONEY_QUANT, rounding=rounding),
+                    to_decimal(rescale(scaled, QUANTITY_PLACES + PRICE_PLACES, MONEY_PLACES, rounding), MONEY_PLACES),
+                    (quantity, price, rounding),
+                )
+            precise = price / 7
+            self.assertEqual(
+                to_decimal(from_decimal(precise, PRICE_PLACES), PRICE_PLACES), precise.quantize(PRICE_QUANT), precise
+            )
+
+    def test_half_rounding(self):
+        for numerator, half_even, half_up in ((5, 0, 1), (15, 2, 2), (25, 2, 3), (-5, 0, -1), (-25, -2, -3)):
+            self.assertEqual(div_round(numerator, 10, ROUND_HALF_EVEN), half_even, numerator)
+            self.assertEqual(div_round(numerator, 10, ROUND_HALF_UP), half_up, numerator)
+            self.assertEqual(div_round(-numerator, -10, ROUND_HALF_UP), half_up, numerator)
+
+    def test_ledger_replay(self):
+        # Несколько активов, чтобы позиции закрывались продажами и открывались снова
+        decimal_positions = {}
+        scaled_positions = {}
+        for _ in range(ITERATIONS):
+            asset_id = self.rng.randint(1, 5)
+            is_buy = self.rng.random() < 0.6
+            quantity = random_decimal(self.rng, self.rng.choice([4, 8, 11]), QUANTITY_PLACES) or Decimal('0.0001')
+            price = random_decimal(self.rng, self.rng.choice([5, 8, 12]), PRICE_PLACES)
+            case = (decimal_positions.get(asset_id), is_buy, quantity, price)
+
+            expected = apply_trade(decimal_positions.get(asset_id), is_buy, quantity, price)
+            actual = apply_trade_scaled(
+                scaled_positions.get(asset_id), is_buy,
+                from_decimal(quantity, QUANTITY_PLACES), from_decimal(price, PRICE_PLACES),
+            )
+            self.assertEqual(expected is None, actual is None, case)
+            if expected is not None:
+                self.assertEqual(expected[0], to_decimal(actual[0], QUANTITY_PLACES), case)
+                self.assertSameDecimal(expected[1], to_decimal(actual[1], PRICE_PLACES), case)
+            for positions, state in ((decimal_positions, expected), (scaled_positions, actual)):
+                if state is None:
+                    positions.pop(asset_id, None)
+                else:
+                    positions[asset_id] = state
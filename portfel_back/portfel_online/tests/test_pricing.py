@@ -0,0 +1,26 @@
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+
+from portfel_online.pricing import MAX_PRICE, parse_ticks
+
+
+class ParseTicksTests(SimpleTestCase):
+    def test_invalid_ticks_become_row_errors(self):
+        ticks, errors = parse_ticks([
+            {'ticker': 'SBER', 'price': '250.12345', 'timestamp': 1740830400},
+            {'ticker': 123, 'price': '1'},
+            {'isin': ['RU0009029540'], 'price': '1'},
+            {'ticker': 'GAZP', 'price': 'NaN'},
+            {'ticker': 'GAZP', 'price': 'Infinity'},
+            {'ticker': 'GAZP', 'price': str(MAX_PRICE)},
+            {'ticker': 'GAZP', 'price': '-1'},
+            {'ticker': 'GAZP', 'price': '1', 'timestamp': 10 ** 20},
+            {'ticker': ' ', 'price': '1'},
+            'SBER',
+        ])
+        self.assertEqual([(tick.ticker, tick.price) for tick in ticks], [('SBER', Decimal('250.1235'))])
+        self.assertEqual(sorted(errors), list(range(1, 10)))
+        self.assertEqual(errors[1], "Ticker must be a string.")
+        self.assertEqual(errors[2], "ISIN must be a string.")
+        self.assertEqual(errors[7], "Timestamp is out of range.")
@@ -0,0 +1,40 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import msgpack
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from portfel_online.renderers import FAST_JSON_MEDIA_TYPE, FastJSONRenderer, MessagePackRenderer
+
+User = get_user_model()
+
+
+class RendererTests(SimpleTestCase):
+    def test_fast_json_matches_drf_json_for_row_errors(self):
+        data = {'errors': {0: {'price': 'Price must be a finite number.'}, 12: 'Ticker is required.'}}
+        rendered = FastJSONRenderer().render(data)
+        self.assertEqual(json.loads(rendered), json.loads(JSONRenderer().render(data)))
+        self.assertEqual(json.loads(rendered)['errors']['12'], 'Ticker is required.')
+
+    def test_values_without_json_type(self):
+        data = {'price': Decimal('250.1000'), 'at': datetime(2025, 3, 1, 12, 30, tzinfo=timezone.utc)}
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), {'price': '250.1000', 'at': '2025-03-01T12:30:00Z'})
+        self.assertEqual(
+            msgpack.unpackb(MessagePackRenderer().render(data)), {'price': '250.1000', 'at': '2025-03-01T12:30:00Z'}
+        )
+
+
+class RowErrorsRenderingTests(APITestCase):
+    def test_tick_errors_render_as_fast_json(self):
+        staff = User.objects.create_user('staff', password='password', is_staff=True)
+        self.client.force_authenticate(staff)
+        response = self.client.post(
+            '/prices/ticks/', [{'ticker': '', 'price': '1'}], format='json', HTTP_ACCEPT=FAST_JSON_MEDIA_TYPE
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], FAST_JSON_MEDIA_TYPE)
+        self.assertEqual(list(json.loads(response.content)['errors']), ['0'])
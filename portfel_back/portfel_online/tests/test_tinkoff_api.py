@@ -0,0 +1,97 @@
+import time
+from concurrent import futures
+
+import grpc
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, override_settings
+from tinkoff.invest.exceptions import RequestError
+
+from portfel_online import tinkoff_api
+
+SLOW_SECONDS = 2.0
+TIMEOUT = 0.2
+
+
+def _echo(request, context):
+    if request == b'slow':
+        time.sleep(SLOW_SECONDS)
+    return request
+
+
+class TinkoffChannelTests(SimpleTestCase):
+    """Каналы к брокеру против локального gRPC-сервера."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+        cls.server.add_generic_rpc_handlers([grpc.method_handlers_generic_handler(
+            'test.Echo', {'Call': grpc.unary_unary_rpc_method_handler(_echo)},
+        )])
+        cls.port = cls.server.add_insecure_port('127.0.0.1:0')
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop(None)
+        super().tearDownClass()
+
+    def setUp(self):
+        settings = override_settings(
+            TINKOFF_API_TARGET=f'127.0.0.1:{self.port}', TINKOFF_API_INSECURE=True, TINKOFF_API_TIMEOUT=TIMEOUT,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(self.reset_sync_channel)
+        self.reset_sync_channel()
+
+    def reset_sync_channel(self):
+        if tinkoff_api._sync_channel is not None:
+            tinkoff_api._sync_channel.close()
+        tinkoff_api._sync_channel = None
+
+    def test_sync_calls_have_deadline(self):
+        call = tinkoff_api.get_sync_channel().unary_unary('/test.Echo/Call')
+        self.assertEqual(call(b'fast'), b'fast')
+
+        started = time.monotonic()
+        with self.assertRaises(grpc.RpcError) as raised:
+            call(b'slow')
+        self.assertEqual(raised.exception.code(), grpc.StatusCode.DEADLINE_EXCEEDED)
+        self.assertLess(time.monotonic() - started, SLOW_SECONDS)
+        # Явный таймаут вызова интерсептор не трогает
+        self.assertEqual(call(b'fast', timeout=5), b'fast')
+
+    def test_deadline_maps_to_gateway_timeout(self):
+        with self.assertRaises(grpc.RpcError) as raised:
+            tinkoff_api.get_sync_channel().unary_unary('/test.Echo/Call')(b'slow')
+        # Так SDK оборачивает ошибку gRPC
+        error = RequestError(raised.exception.code(), raised.exception.details(), raised.exception.trailing_metadata())
+        self.assertEqual(tinkoff_api.request_error_payload(error)[1], 504)
+
+    def test_request_scoped_loop_closes_its_channel(self):
+        async def call(shared):
+            async with tinkoff_api.async_channel(shared) as channel:
+                response = await channel.unary_unary('/test.Echo/Call')(b'fast')
+            return response, channel
+
+        before = len(tinkoff_api._async_channels)
+        # async_to_sync — как асинхронная вьюха под WSGI: новый цикл на каждый вызов
+        for _ in range(3):
+            response, channel = async_to_sync(call)(False)
+            self.assertEqual(response, b'fast')
+            self.assertEqual(channel.get_state(), grpc.ChannelConnectivity.SHUTDOWN)
+        self.assertEqual(len(tinkoff_api._async_channels), before)
+
+    def test_long_lived_loop_reuses_channel(self):
+        async def calls():
+            channels = []
+            for _ in range(2):
+                async with tinkoff_api.async_channel() as channel:
+                    self.assertEqual(await channel.unary_unary('/test.Echo/Call')(b'fast'), b'fast')
+                channels.append(channel)
+            await channels[0].close()
+            return channels
+
+        first, second = async_to_sync(calls)()
+        self.assertIs(first, second)
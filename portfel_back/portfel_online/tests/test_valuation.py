@@ -0,0 +1,106 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from portfel_online.models import PortfolioAssets, Portfolios
+from portfel_online.valuation import revalue_portfolios
+
+from .factories import create_asset
+
+User = get_user_model()
+
+CENT = Decimal('0.01')
+
+# Произведения ровно на полкопейки и рядом с ними: ROUND_HALF_UP против банковского округления
+HALF_CENT_POSITIONS = [
+    ('1.0000', '2.1250'),   # 2.125  -> 2.13 (HALF_EVEN дал бы 2.12)
+    ('3.0000', '0.0050'),   # 0.015  -> 0.02
+    ('0.5000', '0.0100'),   # 0.005  -> 0.01
+    ('7.0000', '0.3550'),   # 2.485  -> 2.49
+    ('1.5000', '1.2345'),   # 1.85175 -> 1.85
+    ('0.0001', '49.9999'),  # 0.00499999 -> 0.00
+]
+
+
+def legacy_totals(positions):
+    """Прежний пересчет из DealsViewSet: Decimal.quantize по каждой позиции.
+
+    ``positions`` — список (количество, средняя цена, текущая цена или None).
+    Возвращает стоимости позиций и (total_value, profit_loss, yield_percent) портфеля.
+    """
+    values = []
+    total_value = Decimal('0.0')
+    total_cost = Decimal('0.0')
+    has_current_prices = False
+    for quantity, average_price, current_price in positions:
+        value = Decimal('0.0')
+        if current_price is not None:
+            value = (quantity * current_price).quantize(CENT, rounding=ROUND_HALF_UP)
+            total_value += value
+            has_current_prices = True
+        values.append(value)
+        total_cost += quantity * average_price
+    total_value = total_value.quantize(CENT, rounding=ROUND_HALF_UP)
+    total_cost = total_cost.quantize(CENT, rounding=ROUND_HALF_UP)
+    profit_loss = Decimal('0.00')
+    yield_percent = Decimal('0.0000')
+    if has_current_prices:
+        profit_loss = total_value - total_cost
+        if total_cost > 0:
+            yield_percent = (profit_loss / total_cost * 100).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
+    return values, (int(total_value), profit_loss, yield_percent)
+
+
+class RevalueAgainstDecimalTests(TestCase):
+    """revalue_portfolios (ROUND в SQL и bulk_update) против прежнего Decimal-пути."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='password')
+
+    def create_portfolio(self, positions):
+        portfolio = Portfolios.objects.create(user=self.user, name=f'P{Portfolios.objects.count()}')
+        for number, (quantity, average_price, current_price) in enumerate(positions):
+            asset = create_asset(f'T{portfolio.Port_ID}X{number}', current_price)
+            PortfolioAssets.objects.create(
+                portfolio=portfolio, asset=asset, quantity=Decimal(quantity),
+                average_price=Decimal(average_price), total_value=Decimal('999.99'),
+            )
+        return portfolio
+
+    def assertMatchesLegacy(self, portfolio, positions):
+        positions = [
+            (Decimal(quantity), Decimal(average_price), None if price is None else Decimal(price))
+            for quantity, average_price, price in positions
+        ]
+        expected_values, expected_totals = legacy_totals(positions)
+        actual_values = list(
+            PortfolioAssets.objects.filter(portfolio=portfolio).order_by('ID').values_list('total_value', flat=True)
+        )
+        self.assertEqual(actual_values, expected_values)
+        portfolio.refresh_from_db()
+        self.assertEqual((portfolio.total_value, portfolio.profit_loss, portfolio.yield_percent), expected_totals)
+        self.assertTrue(portfolio.aggregates_reconciled)
+
+    def test_half_cent_boundaries(self):
+        positions = [(quantity, '1.0000', price) for quantity, price in HALF_CENT_POSITIONS]
+        portfolio = self.create_portfolio(positions)
+        revalue_portfolios([portfolio.Port_ID])
+        self.assertMatchesLegacy(portfolio, positions)
+        self.assertEqual(
+            list(PortfolioAssets.objects.filter(portfolio=portfolio).order_by('ID').values_list('total_value', flat=True)),
+            [Decimal(value) for value in ('2.13', '0.02', '0.01', '2.49', '1.85', '0.00')],
+        )
+
+    def test_positions_without_price(self):
+        # Без текущих цен стоимость и прибыль нулевые, себестоимость в убыток не записывается
+        unpriced = [('10.0000', '100.0000', None), ('2.0000', '5.5000', None)]
+        mixed = [('10.0000', '100.0000', None), ('4.0000', '10.0000', '12.3450')]
+        portfolios = [self.create_portfolio(unpriced), self.create_portfolio(mixed), self.create_portfolio([])]
+        self.assertEqual(revalue_portfolios([portfolio.Port_ID for portfolio in portfolios]), 3)
+
+        self.assertMatchesLegacy(portfolios[0], unpriced)
+        self.assertEqual(portfolios[0].profit_loss, Decimal('0.00'))
+        self.assertMatchesLegacy(portfolios[1], mixed)
+        self.assertEqual(portfolios[1].profit_loss, Decimal('-990.62'))
+        self.assertMatchesLegacy(portfolios[2], [])
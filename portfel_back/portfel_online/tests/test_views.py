@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+
+from portfel_online.models import Portfolios
+
+User = get_user_model()
+
+
+class PortfolioDetailActionsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.client.force_authenticate(self.user)
+
+    def test_non_numeric_pk_is_not_found(self):
+        for method, path in (
+            ('get', '/portfolios/abc/history/'),
+            ('get', '/portfolios/abc/analytics/'),
+            ('get', '/portfolios/abc/positions/export/?format=csv'),
+            ('post', '/portfolios/abc/tinkoff-sync/'),
+            ('get', '/portfolios/abc/'),
+            ('get', '/portfolios/abc/deals/'),
+            ('get', '/portfolios/abc/deals/export/?format=csv'),
+            ('post', '/portfolios/abc/deals/import/'),
+            ('get', '/async/portfolios/abc/'),
+            ('get', '/async/portfolios/abc/deals/'),
+        ):
+            with self.subTest(path=path):
+                response = getattr(self.client, method)(path, {'tinkoff_token': 't'} if method == 'post' else None)
+                self.assertEqual(response.status_code, 404)
+
+    def test_foreign_portfolio_is_not_found(self):
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        foreign = Portfolios.objects.create(user=other, name='Чужой')
+        for path in ('history', 'analytics'):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(f'/portfolios/{foreign.Port_ID}/{path}/').status_code, 404)
+
@@ -0,0 +1,313 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import weakref
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+
+import grpc
+from cachetools import TTLCache
+from django.conf import settings
+from rest_framework import status
+from tinkoff.invest import AccessLevel
+from tinkoff.invest.async_services import AsyncServices
+from tinkoff.invest.services import Services
+
+from .metrics import AsyncGrpcTimingInterceptor, GrpcTimingInterceptor
+from .money import units_nano_to_string
+
+logger = logging.getLogger(__name__)
+
+TINKOFF_APP_NAME = "your_app_name.my_portfolio_emulator"
+ACCOUNT_STATUS_OPEN = 2
+CHANNEL_OPTIONS = [
+    ('grpc.keepalive_time_ms', 60_000),
+    ('grpc.max_receive_message_length', 16 * 1024 * 1024),
+]
+
+# grpc.aio-канал привязан к циклу событий: под ASGI он один на процесс и
+# переиспользуется всеми запросами, а токен уходит в метаданные каждого вызова.
+# Под WSGI у каждого запроса свой цикл — там канал не кэшируется (async_channel)
+_async_channels = weakref.WeakKeyDictionary()
+# Синхронный канал потокобезопасен — один на процесс
+_sync_channel = None
+_sync_channel_lock = threading.Lock()
+
+# Кэш в памяти процесса по sha256 токена — сам токен нигде не хранится.
+# Портфель живет недолго, выбранный счет меняется редко и кэшируется дольше
+_cache_lock = threading.Lock()
+_portfolio_cache = TTLCache(maxsize=1024, ttl=settings.TINKOFF_PORTFOLIO_CACHE_TTL)
+_account_cache = TTLCache(maxsize=4096, ttl=settings.TINKOFF_ACCOUNT_CACHE_TTL)
+_inflight = {}
+_async_inflight = weakref.WeakKeyDictionary()
+
+
+class TinkoffAccountError(Exception):
+    pass
+
+
+def tinkoff_money_to_decimal_string(money_value):
+    if money_value is None:
+        return None
+    if not hasattr(money_value, 'units') or not hasattr(money_value, 'nano'):
+         logger.warning(f"Input object lacks 'units' or 'nano': {money_value}")
+         return None
+    try:
+        return units_nano_to_string(money_value.units, money_value.nano)
+    except Exception as e:
+        logger.error(f"Error converting Tinkoff value to Decimal: {money_value}, Error: {e}")
+        return None
+
+
+def select_account(accounts):
+    """Открытый счет с полным доступом или только чтением, иначе первый открытый."""
+    if not accounts:
+        raise TinkoffAccountError("No Tinkoff accounts found for this token.")
+    for acc in accounts:
+        if acc.status == ACCOUNT_STATUS_OPEN and acc.access_level in (
+            AccessLevel.ACCOUNT_ACCESS_LEVEL_FULL_ACCESS,
+            AccessLevel.ACCOUNT_ACCESS_LEVEL_READ_ONLY
+        ):
+            logger.info(f"Found accessible Tinkoff account: {acc.id} (Access: {acc.access_level.name})")
+            return acc.id
+
+    first_acc = accounts[0]
+    if first_acc.status == ACCOUNT_STATUS_OPEN:
+        logger.warning(f"No account with full/read-only access found. Trying the first open account: {first_acc.id} (Status: {first_acc.status}, Access: {first_acc.access_level.name})")
+        return first_acc.id
+    logger.error(f"First account found ({first_acc.id}) is not open (Status: {first_acc.status}). Cannot proceed.")
+    raise TinkoffAccountError("No suitable Tinkoff accounts found (check access level and status).")
+
+
+def portfolio_payload(account_id, portfolio_response):
+    return {
+        'account_id': account_id,
+        'total_amount_shares': tinkoff_money_to_decimal_string(portfolio_response.total_amount_shares),
+        'total_amount_bonds': tinkoff_money_to_decimal_string(portfolio_response.total_amount_bonds),
+        'total_amount_etf': tinkoff_money_to_decimal_string(portfolio_response.total_amount_etf),
+        'total_amount_currencies': tinkoff_money_to_decimal_string(portfolio_response.total_amount_currencies),
+        'total_amount_futures': tinkoff_money_to_decimal_string(portfolio_response.total_amount_futures),
+        'expected_yield': tinkoff_money_to_decimal_string(portfolio_response.expected_yield),
+        'total_amount_portfolio': tinkoff_money_to_decimal_string(portfolio_response.total_amount_portfolio),
+        'positions': [
+            {
+                'figi': pos.figi,
+                'instrument_type': pos.instrument_type,
+                'quantity': tinkoff_money_to_decimal_string(pos.quantity),
+                'average_position_price': tinkoff_money_to_decimal_string(pos.average_position_price),
+                'average_position_price_currency': pos.average_position_price.currency if pos.average_position_price else None,
+                'expected_yield': tinkoff_money_to_decimal_string(pos.expected_yield),
+                'current_nkd': tinkoff_money_to_decimal_string(pos.current_nkd),
+                'current_nkd_currency': pos.current_nkd.currency if pos.current_nkd else None,
+                'current_price': tinkoff_money_to_decimal_string(pos.current_price),
+                'current_price_currency': pos.current_price.currency if pos.current_price else None,
+                'quantity_lots': tinkoff_money_to_decimal_string(pos.quantity_lots),
+            } for pos in portfolio_response.positions if pos
+        ],
+    }
+
+
+def request_error_payload(e):
+    """Ответ (тело, статус) на ошибку gRPC-запроса к Tinkoff API."""
+    if hasattr(e, 'code') and e.code == grpc.StatusCode.UNAUTHENTICATED:
+        logger.error(f"Tinkoff API Unauthenticated: Code={e.code}, Details='{e.details}'", exc_info=False)
+        return {"error": "Authentication failed: Invalid or expired Tinkoff API token."}, status.HTTP_401_UNAUTHORIZED
+
+    elif hasattr(e, 'code') and e.code == grpc.StatusCode.PERMISSION_DENIED:
+        logger.error(f"Tinkoff API Permission Denied: Code={e.code}, Details='{e.details}'", exc_info=False)
+        return {"error": "Permission denied: Token lacks necessary rights for this operation."}, status.HTTP_403_FORBIDDEN
+
+    elif hasattr(e, 'code') and e.code == grpc.StatusCode.DEADLINE_EXCEEDED:
+        logger.error(f"Tinkoff API call timed out after {settings.TINKOFF_API_TIMEOUT}s")
+        return {"error": "Tinkoff API did not respond in time."}, status.HTTP_504_GATEWAY_TIMEOUT
+
+    elif hasattr(e, 'code') and e.code == grpc.StatusCode.NOT_FOUND:
+        logger.error(f"Tinkoff API Not Found: Code={e.code}, Details='{e.details}'", exc_info=False)
+        return {"error": f"Tinkoff resource not found: {e.details}"}, status.HTTP_404_NOT_FOUND
+
+    tracking_id = getattr(e, 'tracking_id', 'N/A')
+    error_code_name = e.code.name if hasattr(e, 'code') and hasattr(e.code, 'name') else 'UNKNOWN'
+    logger.error(f"Tinkoff API RequestError: Code={error_code_name}, Details='{getattr(e, 'details', 'Unknown')}', TrackingID={tracking_id}", exc_info=True)
+    error_message = f"Tinkoff API request error: {getattr(e, 'details', 'An error occurred with the request')} (Code: {error_code_name})"
+    status_code = status.HTTP_502_BAD_GATEWAY if tracking_id != 'N/A' else status.HTTP_500_INTERNAL_SERVER_ERROR
+    return {"error": error_message}, status_code
+
+
+def _open_channel(channel_module, **kwargs):
+    target = settings.TINKOFF_API_TARGET
+    logger.info(f"Opening Tinkoff API channel to {target}")
+    if settings.TINKOFF_API_INSECURE:
+        return channel_module.insecure_channel(target, options=CHANNEL_OPTIONS, **kwargs)
+    return channel_module.secure_channel(target, grpc.ssl_channel_credentials(), options=CHANNEL_OPTIONS, **kwargs)
+
+
+class DeadlineInterceptor(grpc.UnaryUnaryClientInterceptor):
+    """Дедлайн TINKOFF_API_TIMEOUT на вызовы синхронного канала: методы Services SDK таймаут не принимают."""
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        if client_call_details.timeout is None:
+            client_call_details = client_call_details._replace(timeout=settings.TINKOFF_API_TIMEOUT)
+        return continuation(client_call_details, request)
+
+
+def get_sync_channel():
+    global _sync_channel
+    with _sync_channel_lock:
+        if _sync_channel is None:
+            # Интерсептор времени добавляет вызовы в Server-Timing запроса
+            _sync_channel = grpc.intercept_channel(
+                _open_channel(grpc), DeadlineInterceptor(), GrpcTimingInterceptor()
+            )
+        return _sync_channel
+
+
+def sync_services(token):
+    return Services(get_sync_channel(), token=token, app_name=TINKOFF_APP_NAME)
+
+
+def _open_async_channel():
+    return _open_channel(grpc.aio, interceptors=[AsyncGrpcTimingInterceptor()])
+
+
+def get_async_channel():
+    loop = asyncio.get_running_loop()
+    channel = _async_channels.get(loop)
+    if channel is None:
+        channel = _async_channels[loop] = _open_async_channel()
+    return channel
+
+
+@asynccontextmanager
+async def async_channel(shared=True):
+    """grpc.aio-канал для вызовов в текущем цикле событий.
+
+    ``shared`` — цикл живет весь процесс (ASGI), канал берется из кэша.
+    Иначе цикл создан на один запрос (асинхронная вьюха под WSGI): канал
+    открывается на время вызовов и закрывается, чтобы не пережить свой цикл.
+    """
+    if shared:
+        yield get_async_channel()
+        return
+    channel = _open_async_channel()
+    try:
+        yield channel
+    finally:
+        await channel.close()
+
+
+async def _call(awaitable):
+    # Таймаут на каждый вызов: зависший брокер не держит запрос дольше TINKOFF_API_TIMEOUT
+    return await asyncio.wait_for(awaitable, timeout=settings.TINKOFF_API_TIMEOUT)
+
+
+def token_key(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _cache_get(cache, key):
+    with _cache_lock:
+        return cache.get(key)
+
+
+def _cache_set(cache, key, value):
+    with _cache_lock:
+        cache[key] = value
+
+
+def _cache_pop(cache, key):
+    with _cache_lock:
+        cache.pop(key, None)
+
+
+def fetch_portfolio_response(services, key):
+    """(счет, ответ get_portfolio) с кэшем выбранного счета по ключу токена."""
+    account_id = _cache_get(_account_cache, key)
+    if account_id is None:
+        account_id = select_account(services.users.get_accounts().accounts)
+        _cache_set(_account_cache, key, account_id)
+    logger.info(f"Fetching Tinkoff portfolio for account ID: {account_id}")
+    try:
+        return account_id, services.operations.get_portfolio(account_id=account_id)
+    except Exception:
+        # Счет могли закрыть или отозвать доступ — в следующий раз выбираем заново
+        _cache_pop(_account_cache, key)
+        raise
+
+
+def _fetch_portfolio_sync(token, key):
+    account_id, portfolio_response = fetch_portfolio_response(sync_services(token), key)
+    return portfolio_payload(account_id, portfolio_response)
+
+
+async def _fetch_portfolio_async(token, key, shared_channel):
+    async with async_channel(shared_channel) as channel:
+        services = AsyncServices(channel, token=token, app_name=TINKOFF_APP_NAME)
+        account_id = _cache_get(_account_cache, key)
+        if account_id is None:
+            accounts_response = await _call(services.users.get_accounts())
+            account_id = select_account(accounts_response.accounts)
+            _cache_set(_account_cache, key, account_id)
+        logger.info(f"Fetching Tinkoff portfolio for account ID: {account_id}")
+        try:
+            portfolio_response = await _call(services.operations.get_portfolio(account_id=account_id))
+        except Exception:
+            _cache_pop(_account_cache, key)
+            raise
+    return portfolio_payload(account_id, portfolio_response)
+
+
+def get_portfolio_cached(token):
+    """Портфель Tinkoff с TTL-кэшем и склейкой параллельных запросов: (данные, из кэша ли).
+
+    Пока запрос по токену в полете, остальные потоки ждут его результат
+    (или ошибку) вместо своего похода к брокеру. Ошибки не кэшируются.
+    """
+    key = token_key(token)
+    with _cache_lock:
+        payload = _portfolio_cache.get(key)
+        if payload is not None:
+            return payload, True
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    if not leader:
+        return future.result(), False
+
+    try:
+        payload = _fetch_portfolio_sync(token, key)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        _cache_set(_portfolio_cache, key, payload)
+        future.set_result(payload)
+        return payload, False
+    finally:
+        with _cache_lock:
+            _inflight.pop(key, None)
+
+
+async def get_portfolio_cached_async(token, shared_channel=True):
+    """Асинхронный вариант get_portfolio_cached с тем же кэшем.
+
+    ``shared_channel=False`` — для цикла событий на один запрос (см. async_channel).
+    """
+    key = token_key(token)
+    payload = _cache_get(_portfolio_cache, key)
+    if payload is not None:
+        return payload, True
+
+    inflight = _async_inflight.setdefault(asyncio.get_running_loop(), {})
+    task = inflight.get(key)
+    if task is None:
+        async def fetch():
+            payload = await _fetch_portfolio_async(token, key, shared_channel)
+            _cache_set(_portfolio_cache, key, payload)
+            return payload
+
+        task = inflight[key] = asyncio.ensure_future(fetch())
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+    # shield: отключившийся клиент не отменяет общий запрос для остальных
+    return await asyncio.shield(task), False
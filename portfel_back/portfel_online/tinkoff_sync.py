@@ -0,0 +1,219 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .ledger import apply_trade
+from .models import AssetFigis, Assets, Deals, Portfolios, PortfolioAssets
+from .money import PRICE_PLACES, from_units_nano, to_decimal
+from .tinkoff_api import fetch_portfolio_response, sync_services, token_key
+from .valuation import revalue_portfolios
+
+logger = logging.getLogger(__name__)
+
+SYNC_DEAL_ADDRESS = "Tinkoff Broker"
+QUANT = Decimal("0.0001")
+# FIGI, не найденные в каталоге, переспрашиваются у брокера не чаще раза в сутки
+UNRESOLVED_RETRY_AFTER = timedelta(days=1)
+# instrument_type позиции -> метод InstrumentsService со списком инструментов этого типа
+INSTRUMENT_LISTINGS = {
+    'share': 'shares',
+    'bond': 'bonds',
+    'etf': 'etfs',
+    'currency': 'currencies',
+    'futures': 'futures',
+}
+
+
+class BrokerPosition:
+    __slots__ = ('figi', 'instrument_type', 'quantity', 'average_price', 'current_price')
+
+    def __init__(self, figi, instrument_type, quantity, average_price, current_price):
+        self.figi = figi
+        self.instrument_type = instrument_type
+        self.quantity = quantity
+        self.average_price = average_price
+        self.current_price = current_price
+
+
+def _decimal(value):
+    if value is None or not hasattr(value, 'units') or not hasattr(value, 'nano'):
+        return None
+    return to_decimal(from_units_nano(value.units, value.nano, PRICE_PLACES, ROUND_HALF_UP), PRICE_PLACES)
+
+
+def broker_positions(portfolio_response):
+    positions = []
+    for pos in portfolio_response.positions:
+        if not pos:
+            continue
+        quantity = _decimal(pos.quantity)
+        if not quantity or quantity <= 0:
+            # Шорты и нулевые остатки в PortfolioAssets не переносим
+            continue
+        positions.append(BrokerPosition(
+            pos.figi, pos.instrument_type, quantity,
+            _decimal(pos.average_position_price) or Decimal('0.0000'), _decimal(pos.current_price),
+        ))
+    return positions
+
+
+def resolve_figis(services, positions):
+    """FIGI -> Asset_ID (или None) по индексу AssetFigis.
+
+    Неизвестные FIGI ищутся у брокера списком инструментов по типу (не больше
+    одного вызова на тип), затем одним запросом по ISIN/тикеру в каталоге.
+    Результат, включая промахи, сохраняется в индекс.
+    """
+    figis = {position.figi for position in positions}
+    retry_before = timezone.now() - UNRESOLVED_RETRY_AFTER
+    mapping = {}
+    for figi, asset_id, resolved_at in AssetFigis.objects.filter(figi__in=figis).values_list(
+        'figi', 'asset_id', 'resolved_at'
+    ):
+        if asset_id is not None or resolved_at >= retry_before:
+            mapping[figi] = asset_id
+
+    wanted = {}
+    for position in positions:
+        if position.figi not in mapping:
+            wanted.setdefault(INSTRUMENT_LISTINGS.get(position.instrument_type), set()).add(position.figi)
+    if not wanted:
+        return mapping
+
+    identifiers = {}
+    for listing, listing_figis in wanted.items():
+        if listing is None:
+            continue
+        for instrument in getattr(services.instruments, listing)().instruments:
+            if instrument.figi in listing_figis:
+                identifiers[instrument.figi] = (instrument.ticker or None, getattr(instrument, 'isin', '') or None)
+
+    tickers = {ticker for ticker, _ in identifiers.values() if ticker}
+    isins = {isin for _, isin in identifiers.values() if isin}
+    by_ticker = {}
+    by_isin = {}
+    for asset_id, ticker, isin in Assets.objects.filter(
+        Q(ticker__in=tickers) | Q(ISIN__in=isins)
+    ).values_list('Asset_ID', 'ticker', 'ISIN'):
+        by_ticker.setdefault(ticker, []).append(asset_id)
+        by_isin.setdefault(isin, []).append(asset_id)
+
+    now = timezone.now()
+    rows = []
+    for figi in set().union(*wanted.values()):
+        ticker, isin = identifiers.get(figi, (None, None))
+        candidates = by_isin.get(isin) or by_ticker.get(ticker) or []
+        asset_id = candidates[0] if len(candidates) == 1 else None
+        mapping[figi] = asset_id
+        rows.append(AssetFigis(figi=figi, asset_id=asset_id, resolved_at=now))
+    AssetFigis.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['figi'], update_fields=['asset', 'resolved_at']
+    )
+    logger.info(f"Resolved {len(rows)} FIGIs via broker instrument listings ({sum(1 for r in rows if r.asset_id)} mapped)")
+    return mapping
+
+
+def adjustment_trades(old_quantity, old_avg_price, new_quantity, new_avg_price, price):
+    """Сделки (покупка?, количество, цена), переводящие позицию в журнале в состояние брокера.
+
+    Повтор журнала (ledger.replay_deals) должен давать ровно новое
+    состояние, поэтому при несовпадении позиция закрывается и открывается заново.
+    """
+    delta = new_quantity - old_quantity
+    if delta > 0:
+        buy_price = ((new_avg_price * new_quantity - old_avg_price * old_quantity) / delta).quantize(QUANT)
+        if buy_price >= 0 and apply_trade((old_quantity, old_avg_price), True, delta, buy_price) == (new_quantity, new_avg_price):
+            return [(True, delta, buy_price)]
+    elif delta < 0 and old_avg_price == new_avg_price:
+        return [(False, -delta, price or old_avg_price)]
+    return [(False, old_quantity, price or old_avg_price), (True, new_quantity, new_avg_price)]
+
+
+def _deal(portfolio_id, asset_id, is_buy, quantity, price, date):
+    return Deals(
+        portfolio_id=portfolio_id, asset_id=asset_id, address=SYNC_DEAL_ADDRESS, status="Completed",
+        type=is_buy, quantity=quantity, price=price,
+        total=(quantity * price).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
+        commission=Decimal('0.00'), tax=Decimal('0.00'), date=date,
+    )
+
+
+def sync_positions(portfolio_id, positions, mapping, prune=False):
+    """Переносит позиции брокера в PortfolioAssets одной транзакцией и одним пересчетом.
+
+    Изменения записываются и в журнал сделок, чтобы rebuild_positions давал
+    тот же результат. ``prune`` закрывает позиции, которых у брокера нет.
+    """
+    targets = {}
+    unmapped = []
+    for position in positions:
+        asset_id = mapping.get(position.figi)
+        if asset_id is None:
+            unmapped.append(position.figi)
+            continue
+        quantity, cost, price = targets.get(asset_id, (Decimal('0'), Decimal('0'), None))
+        targets[asset_id] = (
+            quantity + position.quantity,
+            cost + position.quantity * position.average_price,
+            position.current_price or price,
+        )
+
+    result = {'created': 0, 'updated': 0, 'unchanged': 0, 'removed': 0, 'deals': 0, 'unmapped': sorted(unmapped)}
+    now = timezone.now()
+    with transaction.atomic():
+        Portfolios.objects.select_for_update().get(Port_ID=portfolio_id)
+        existing = {pa.asset_id: pa for pa in PortfolioAssets.objects.filter(portfolio_id=portfolio_id)}
+        to_create = []
+        to_update = []
+        deals = []
+        for asset_id, (quantity, cost, price) in targets.items():
+            average_price = (cost / quantity).quantize(QUANT)
+            portfolio_asset = existing.pop(asset_id, None)
+            if portfolio_asset is None:
+                to_create.append(PortfolioAssets(
+                    portfolio_id=portfolio_id, asset_id=asset_id, quantity=quantity,
+                    average_price=average_price, total_value=Decimal('0.00'),
+                ))
+                deals.append(_deal(portfolio_id, asset_id, True, quantity, average_price, now))
+                continue
+            if portfolio_asset.quantity == quantity and portfolio_asset.average_price == average_price:
+                result['unchanged'] += 1
+                continue
+            for is_buy, trade_quantity, trade_price in adjustment_trades(
+                portfolio_asset.quantity, portfolio_asset.average_price or Decimal('0.0000'), quantity, average_price, price
+            ):
+                deals.append(_deal(portfolio_id, asset_id, is_buy, trade_quantity, trade_price, now))
+            portfolio_asset.quantity = quantity
+            portfolio_asset.average_price = average_price
+            to_update.append(portfolio_asset)
+
+        if prune and existing:
+            for portfolio_asset in existing.values():
+                deals.append(_deal(
+                    portfolio_id, portfolio_asset.asset_id, False, portfolio_asset.quantity,
+                    portfolio_asset.average_price or Decimal('0.0000'), now,
+                ))
+            PortfolioAssets.objects.filter(ID__in=[pa.ID for pa in existing.values()]).delete()
+            result['removed'] = len(existing)
+
+        PortfolioAssets.objects.bulk_create(to_create)
+        PortfolioAssets.objects.bulk_update(to_update, ['quantity', 'average_price'])
+        Deals.objects.bulk_create(deals)
+        revalue_portfolios([portfolio_id])
+
+    result.update(created=len(to_create), updated=len(to_update), deals=len(deals))
+    logger.info(f"Synced broker positions into Portfolio ID: {portfolio_id}: {result}")
+    return result
+
+
+def sync_tinkoff_portfolio(token, portfolio_id, prune=False):
+    services = sync_services(token)
+    account_id, portfolio_response = fetch_portfolio_response(services, token_key(token))
+    positions = broker_positions(portfolio_response)
+    mapping = resolve_figis(services, positions)
+    result = sync_positions(portfolio_id, positions, mapping, prune)
+    return {'account_id': account_id, 'positions': len(positions), **result}
@@ -0,0 +1,177 @@
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+from .models import Assets, Portfolios, PortfolioAssets
+from .push import notify_portfolios_changed
+
+logger = logging.getLogger(__name__)
+
+PORTFOLIO_AGGREGATE_FIELDS = [
+    'total_value', 'profit_loss', 'yield_percent', 'annual_yield',
+    'market_value', 'cost_basis', 'priced_positions',
+]
+
+
+def _position_value_expression():
+    # ROUND(numeric, 2) в PostgreSQL округляет половину от нуля — то же, что ROUND_HALF_UP у Decimal
+    position_value = Assets.objects.filter(Asset_ID=OuterRef('asset_id')).annotate(
+        position_value=Round(
+            ExpressionWrapper(
+                OuterRef('quantity') * F('current_price'),
+                output_field=DecimalField(max_digits=27, decimal_places=8),
+            ),
+            2,
+            output_field=DecimalField(max_digits=15, decimal_places=2),
+        )
+    ).values('position_value')[:1]
+    return Coalesce(
+        Subquery(position_value),
+        Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=15, decimal_places=2),
+    )
+
+
+def apply_portfolio_totals(portfolio, value, cost, priced_positions):
+    value = value or Decimal('0.0')
+    cost = cost or Decimal('0.0')
+    portfolio.market_value = value
+    portfolio.cost_basis = cost
+    portfolio.priced_positions = priced_positions
+    value = value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    cost = cost.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    portfolio.total_value = int(value) if value == value.to_integral_value() else value
+    if priced_positions:
+        portfolio.profit_loss = value - cost
+        if cost > 0:
+            yield_percent = (portfolio.profit_loss / cost) * 100
+            portfolio.yield_percent = yield_percent.quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
+        else:
+            portfolio.yield_percent = Decimal('0.0000')
+    else:
+        portfolio.profit_loss = Decimal('0.00')
+        portfolio.yield_percent = Decimal('0.0000')
+    portfolio.annual_yield = Decimal('0.0000')
+    return portfolio
+
+
+def build_portfolio_totals(portfolio_id, value, cost, priced_positions):
+    portfolio = apply_portfolio_totals(Portfolios(Port_ID=portfolio_id), value, cost, priced_positions)
+    portfolio.aggregates_reconciled = True
+    return portfolio
+
+
+def position_value(quantity, current_price):
+    if current_price is None or quantity is None:
+        return Decimal('0.00')
+    return (quantity * current_price).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def position_contribution(portfolio_asset, current_price):
+    """Вклад позиции в агрегаты портфеля: (стоимость, себестоимость, есть ли цена)."""
+    if portfolio_asset is None:
+        return Decimal('0.00'), Decimal('0.0'), 0
+    cost = Decimal('0.0')
+    if portfolio_asset.average_price is not None and portfolio_asset.quantity is not None:
+        cost = portfolio_asset.quantity * portfolio_asset.average_price
+    return portfolio_asset.total_value or Decimal('0.00'), cost, int(current_price is not None)
+
+
+def apply_position_delta(portfolio, old_contribution, new_contribution):
+    """Обновляет агрегаты портфеля по изменению одной позиции.
+
+    Портфель должен быть заблокирован (select_for_update) в текущей
+    транзакции — так же, как и запись PortfolioAssets. Если суммы портфеля
+    еще не заполнены полным пересчетом, дельта их исказила бы — портфель
+    пересчитывается целиком по уже записанным позициям.
+    """
+    if not portfolio.aggregates_reconciled:
+        revalue_portfolios([portfolio.Port_ID])
+        portfolio.refresh_from_db(fields=PORTFOLIO_AGGREGATE_FIELDS + ['aggregates_reconciled', 'version'])
+        logger.info(f"Reconciled aggregates of Portfolio ID: {portfolio.Port_ID} instead of applying a delta")
+        return
+    old_value, old_cost, old_priced = old_contribution
+    new_value, new_cost, new_priced = new_contribution
+    apply_portfolio_totals(
+        portfolio,
+        portfolio.market_value - old_value + new_value,
+        portfolio.cost_basis - old_cost + new_cost,
+        max(portfolio.priced_positions - old_priced + new_priced, 0),
+    )
+    portfolio.save(update_fields=PORTFOLIO_AGGREGATE_FIELDS)
+    notify_portfolios_changed([portfolio.Port_ID])
+    logger.info(f"Applied position delta to Portfolio ID: {portfolio.Port_ID}")
+
+
+def revalue_portfolios(portfolio_ids=None, asset_ids=None):
+    """Пересчитывает стоимость позиций и агрегаты портфелей.
+
+    Один UPDATE по позициям, один агрегирующий запрос и один bulk_update
+    по портфелям, независимо от количества позиций. ``portfolio_ids=None``
+    означает все портфели; ``asset_ids`` ограничивает переоценку позициями
+    в этих активах и портфелями, которые их держат.
+    """
+    if portfolio_ids is not None:
+        portfolio_ids = list(portfolio_ids)
+        if not portfolio_ids:
+            return 0
+    if asset_ids is not None:
+        asset_ids = list(asset_ids)
+        if not asset_ids:
+            return 0
+
+    with transaction.atomic():
+        # Блокируем портфели в порядке Port_ID, как и инкрементальный путь (apply_position_delta)
+        locked = Portfolios.objects.select_for_update().order_by('Port_ID')
+        if portfolio_ids is not None:
+            locked = locked.filter(Port_ID__in=portfolio_ids)
+        if asset_ids is not None:
+            locked = locked.filter(Port_ID__in=Subquery(
+                PortfolioAssets.objects.filter(asset_id__in=asset_ids).values('portfolio_id')
+            ))
+        portfolio_ids = list(locked.values_list('Port_ID', flat=True))
+        if not portfolio_ids:
+            return 0
+
+        positions_qs = PortfolioAssets.objects.filter(portfolio_id__in=portfolio_ids)
+        changed_positions = positions_qs if asset_ids is None else positions_qs.filter(asset_id__in=asset_ids)
+        changed_positions.update(total_value=_position_value_expression())
+
+        totals = positions_qs.order_by().values('portfolio_id').annotate(
+            value=Sum('total_value'),
+            cost=Sum(
+                F('quantity') * F('average_price'),
+                output_field=DecimalField(max_digits=27, decimal_places=8),
+            ),
+            priced_positions=Count('ID', filter=Q(asset__current_price__isnull=False)),
+        )
+        totals_by_portfolio = {row['portfolio_id']: row for row in totals}
+
+        updated = []
+        for portfolio_id in portfolio_ids:
+            row = totals_by_portfolio.get(portfolio_id)
+            if row is None:
+                updated.append(build_portfolio_totals(portfolio_id, None, None, 0))
+            else:
+                updated.append(build_portfolio_totals(
+                    portfolio_id, row['value'], row['cost'], row['priced_positions']
+                ))
+        for portfolio in updated:
+            portfolio.version = F('version') + 1
+        Portfolios.objects.bulk_update(
+            updated, PORTFOLIO_AGGREGATE_FIELDS + ['aggregates_reconciled', 'version'], batch_size=1000
+        )
+        notify_portfolios_changed(portfolio_ids)
+
+    logger.info(f"Revalued {len(updated)} portfolios")
+    return len(updated)
+
+
+def revalue_portfolio(portfolio):
+    if not portfolio:
+        return
+    revalue_portfolios([portfolio.Port_ID])
+    logger.info(f"Finished recalculating aggregates for Portfolio ID: {portfolio.Port_ID}")
@@ -1,12 +1,29 @@
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.response import Response
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import serializers
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+import asyncio
+import csv
+import io
+import ipaddress
+import json
 import logging
+import os
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Prefetch
 from django.utils import timezone
+from datetime import timedelta
 from django.contrib.auth import get_user_model
+from django.http import FileResponse, HttpResponse, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 
 from .serializers import (
     AssetTypesSerializer, DealSourceSerializer, AssetsSerializer,
@@ -16,25 +33,46 @@ from .serializers import (
 from .models import (
     AssetTypes, Assets, Portfolios, PortfolioAssets, Deals, DealSource
 )
+from .analytics import get_portfolio_analytics
+from .caching import CachedReadMixin, ASSETS_NAMESPACE, ASSET_TYPES_NAMESPACE
+from .conditional import PortfolioETagMixin, touch_portfolios
+from .deal_import import DEFAULT_ADDRESS as DEFAULT_IMPORT_ADDRESS, import_deals, read_rows as read_report_rows
+from .export import EXPORT_RENDERERS, deals_export, is_asgi_request, positions_export
+from .ledger import apply_deal, rebuild_portfolio
+from .metrics import render_metrics
+from .pagination import DealsCursorPagination
+from .pricing import parse_ticks, ingest_price_ticks
+from .profiling import list_profiles, profile_path
+from .search import AssetSearchFilter
+from .snapshots import RESOLUTIONS as SNAPSHOT_RESOLUTIONS, parse_range_bound, snapshot_series
+from .valuation import (
+    revalue_portfolio, position_value, position_contribution, apply_position_delta
+)
 
-import grpc # Import grpc
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from tinkoff.invest import (
-    Client,
     # PortfolioRequest, # No longer strictly needed here, but kept for potential future use
-    AccessLevel,
     InvestError
 )
-# Only import RequestError from exceptions
 from tinkoff.invest.exceptions import (
+    AioRequestError,
     RequestError
 )
+from .tinkoff_api import (
+    TinkoffAccountError, get_portfolio_cached, get_portfolio_cached_async, request_error_payload
+)
+from .tinkoff_sync import sync_tinkoff_portfolio
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
 
-class AssetTypesViewSet(viewsets.ReadOnlyModelViewSet):
+class AssetTypesViewSet(CachedReadMixin, viewsets.ReadOnlyModelViewSet):
+    cache_list_namespaces = (ASSET_TYPES_NAMESPACE,)
+    cache_detail_namespaces = (ASSET_TYPES_NAMESPACE,)
     queryset = AssetTypes.objects.all()
     serializer_class = AssetTypesSerializer
     permission_classes = [permissions.AllowAny]
@@ -49,25 +87,152 @@ class DealSourceViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['name']
     ordering_fields = ['name']
 
-class AssetsViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Assets.objects.select_related('asset_type').all()
+class AssetsViewSet(CachedReadMixin, viewsets.ReadOnlyModelViewSet):
+    # Изменение одного актива сбрасывает списки, но только его собственную деталь
+    cache_list_namespaces = (ASSETS_NAMESPACE, ASSET_TYPES_NAMESPACE)
+    cache_detail_namespaces = (ASSET_TYPES_NAMESPACE,)
+    cache_object_namespace = ASSETS_NAMESPACE
+    queryset = Assets.objects.select_related('asset_type').defer('search_vector')
     serializer_class = AssetsSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, AssetSearchFilter, filters.OrderingFilter]
     filterset_fields = ['asset_type', 'currency', 'exchange', 'market', 'country']
     search_fields = ['ticker', 'ISIN', 'company', 'description']
     ordering_fields = ['ticker', 'company', 'currency', 'asset_type__name']
 
 
-class PortfoliosViewSet(viewsets.ModelViewSet):
+class PortfoliosViewSet(PortfolioETagMixin, viewsets.ModelViewSet):
     serializer_class = PortfoliosSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # Нечисловой pk не доходит до вьюх (404 от роутера): регулярку берут и /portfolios/{pk}/...,
+    # и вложенные /portfolios/{portfolio_pk}/deals/..., так что int(pk) в действиях безопасен
+    lookup_value_regex = r'\d+'
     filter_backends = [filters.OrderingFilter, filters.SearchFilter]
     search_fields = ['name']
     ordering_fields = ['name', 'created_at', 'total_value', 'profit_loss']
 
+    def get_requested_fields(self):
+        if self.action not in ('list', 'retrieve'):
+            return None
+        if self.request.query_params.get('view') == 'summary':
+            return PortfoliosSerializer.Meta.summary_fields
+        fields_param = self.request.query_params.get('fields')
+        if not fields_param:
+            return None
+        return [name.strip() for name in fields_param.split(',') if name.strip()]
+
+    def get_etag_portfolios(self):
+        portfolios = super().get_etag_portfolios()
+        if self.action == 'retrieve':
+            portfolios = portfolios.filter(Port_ID=self.kwargs.get('pk'))
+        return portfolios
+
+    def perform_update(self, serializer):
+        portfolio = serializer.save()
+        touch_portfolios([portfolio.Port_ID])
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
     def get_queryset(self):
-        return Portfolios.objects.filter(user=self.request.user)
+        queryset = Portfolios.objects.filter(user=self.request.user).select_related('user')
+        fields = self.get_requested_fields()
+        if fields is None or 'portfolio_assets' in fields:
+            # Позиции, активы и типы активов — одним запросом на весь список портфелей
+            queryset = queryset.prefetch_related(Prefetch(
+                'portfolioassets_set',
+                queryset=PortfolioAssets.objects.select_related('asset', 'asset__asset_type').defer('asset__search_vector')
+            ))
+        return queryset
+
+    @action(detail=True, methods=['get'], url_path='history')
+    def history(self, request, pk=None):
+        portfolio_id = int(pk)
+        if not Portfolios.objects.filter(Port_ID=portfolio_id, user=request.user).exists():
+            return Response({"detail": "Portfolio not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        resolution = request.query_params.get('resolution', 'day')
+        if resolution not in SNAPSHOT_RESOLUTIONS:
+            return Response(
+                {"resolution": f"Must be one of: {', '.join(SNAPSHOT_RESOLUTIONS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        end = timezone.now()
+        start = end - timedelta(days=365)
+        for param in ('start', 'end'):
+            raw = request.query_params.get(param)
+            if not raw:
+                continue
+            parsed = parse_range_bound(raw)
+            if parsed is None:
+                return Response({param: "Invalid date format."}, status=status.HTTP_400_BAD_REQUEST)
+            if param == 'start':
+                start = parsed
+            else:
+                end = parsed
+        if start > end:
+            return Response({"start": "Start must be before end."}, status=status.HTTP_400_BAD_REQUEST)
+
+        points = snapshot_series(portfolio_id, start, end, resolution)
+        return Response({
+            'portfolio': portfolio_id,
+            'resolution': resolution,
+            'start': start,
+            'end': end,
+            'points': [
+                {
+                    'timestamp': point['bucket'],
+                    'total_value': point['total_value'],
+                    'cost': point['cost'],
+                    'profit_loss': point['profit_loss'],
+                } for point in points
+            ],
+        })
+
+    @action(detail=True, methods=['get'], url_path='analytics')
+    def analytics(self, request, pk=None):
+        portfolio_id = int(pk)
+        version = Portfolios.objects.filter(Port_ID=portfolio_id, user=request.user).values_list('version', flat=True).first()
+        if version is None:
+            return Response({"detail": "Portfolio not found."}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            window_days = int(request.query_params.get('days', 365))
+            if not 2 <= window_days <= 3650: raise ValueError
+        except ValueError:
+            return Response({"days": "Must be an integer between 2 and 3650."}, status=status.HTTP_400_BAD_REQUEST)
+        result = get_portfolio_analytics(portfolio_id, version, window_days)
+        return Response({'portfolio': portfolio_id, 'window_days': window_days, **result})
+
+    @action(detail=True, methods=['get'], url_path='positions/export', renderer_classes=EXPORT_RENDERERS)
+    def export_positions(self, request, pk=None):
+        # Формат выбирает content negotiation: ?format=csv|ndjson или Accept
+        portfolio_id = int(pk)
+        if not Portfolios.objects.filter(Port_ID=portfolio_id, user=request.user).exists():
+            return Response({"detail": "Portfolio not found."}, status=status.HTTP_404_NOT_FOUND)
+        return positions_export(portfolio_id, request.accepted_renderer.format, asynchronous=is_asgi_request(request))
+
+    @action(detail=True, methods=['post'], url_path='tinkoff-sync')
+    def tinkoff_sync(self, request, pk=None):
+        portfolio_id = int(pk)
+        if not Portfolios.objects.filter(Port_ID=portfolio_id, user=request.user).exists():
+            return Response({"detail": "Portfolio not found."}, status=status.HTTP_404_NOT_FOUND)
+        tinkoff_token = request.data.get('tinkoff_token')
+        if not tinkoff_token:
+            return Response({"error": "Tinkoff API token is required."}, status=status.HTTP_400_BAD_REQUEST)
+        prune = str(request.data.get('prune', '')).lower() in ('1', 'true', 'yes')
+
+        try:
+            result = sync_tinkoff_portfolio(tinkoff_token, portfolio_id, prune=prune)
+        except TinkoffAccountError as e:
+            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except RequestError as e:
+            error_data, status_code = request_error_payload(e)
+            return Response(error_data, status=status_code)
+        except InvestError as e:
+            logger.error(f"Tinkoff Invest Library Error: {e}", exc_info=True)
+            return Response({"error": f"Tinkoff SDK Error: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(result, status=status.HTTP_200_OK)
 
     def perform_create(self, serializer):
         serializer.save(
@@ -75,11 +240,13 @@ class PortfoliosViewSet(viewsets.ModelViewSet):
             total_value=0,
             profit_loss=Decimal('0.00'),
             yield_percent=Decimal('0.0000'),
-            annual_yield=Decimal('0.0000')
+            annual_yield=Decimal('0.0000'),
+            # Пустой портфель: нулевые суммы точны, пересчет не нужен
+            aggregates_reconciled=True,
         )
 
 
-class PortfolioAssetsViewSet(viewsets.ModelViewSet):
+class PortfolioAssetsViewSet(PortfolioETagMixin, viewsets.ModelViewSet):
     serializer_class = PortfolioAssetsSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
@@ -92,47 +259,7 @@ class PortfolioAssetsViewSet(viewsets.ModelViewSet):
         return PortfolioAssets.objects.filter(portfolio_id__in=user_portfolio_ids).select_related('asset', 'portfolio', 'asset__asset_type')
 
     def recalculate_portfolio_aggregates(self, portfolio):
-        if not portfolio: return
-        total_portfolio_value = Decimal('0.0')
-        total_portfolio_cost = Decimal('0.0')
-        has_current_prices = False
-        portfolio_assets = PortfolioAssets.objects.filter(portfolio=portfolio).select_related('asset')
-        with transaction.atomic():
-            if not portfolio_assets.exists():
-                portfolio.total_value = 0
-                portfolio.profit_loss = Decimal('0.00')
-                portfolio.yield_percent = Decimal('0.0000')
-                portfolio.annual_yield = Decimal('0.0000')
-                portfolio.save(update_fields=['total_value', 'profit_loss', 'yield_percent', 'annual_yield'])
-                return
-            for pa in portfolio_assets:
-                current_price = pa.asset.current_price
-                asset_total_value = Decimal('0.0')
-                if current_price is not None and pa.quantity is not None:
-                    asset_total_value = (pa.quantity * current_price).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                    total_portfolio_value += asset_total_value
-                    has_current_prices = True
-                if pa.total_value != asset_total_value:
-                    pa.total_value = asset_total_value
-                    pa.save(update_fields=['total_value'])
-                if pa.average_price is not None and pa.quantity is not None:
-                   total_portfolio_cost += (pa.quantity * pa.average_price)
-            total_portfolio_value = total_portfolio_value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-            total_portfolio_cost = total_portfolio_cost.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-            portfolio.total_value = int(total_portfolio_value) if total_portfolio_value == total_portfolio_value.to_integral_value() else total_portfolio_value
-            if has_current_prices:
-                portfolio.profit_loss = total_portfolio_value - total_portfolio_cost
-                if total_portfolio_cost > 0:
-                    yield_percent = (portfolio.profit_loss / total_portfolio_cost) * 100
-                    portfolio.yield_percent = yield_percent.quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
-                else:
-                    portfolio.yield_percent = Decimal('0.0000')
-            else:
-                portfolio.profit_loss = Decimal('0.00')
-                portfolio.yield_percent = Decimal('0.0000')
-            portfolio.annual_yield = Decimal('0.0000')
-            portfolio.save(update_fields=['total_value', 'profit_loss', 'yield_percent', 'annual_yield'])
-        logger.info(f"Finished recalculating aggregates for Portfolio ID: {portfolio.Port_ID}")
+        revalue_portfolio(portfolio)
 
     def _create_deal_from_pa_change(self, portfolio_asset, quantity, price, is_buy):
         try:
@@ -204,6 +331,8 @@ class PortfolioAssetsViewSet(viewsets.ModelViewSet):
                     }
                 )
 
+                old_contribution = position_contribution(None if created else portfolio_asset, asset.current_price)
+
                 if not created:
                     old_quantity = portfolio_asset.quantity
                     old_avg_price = portfolio_asset.average_price or Decimal('0.0')
@@ -217,12 +346,14 @@ class PortfolioAssetsViewSet(viewsets.ModelViewSet):
                     portfolio_asset.quantity = new_total_quantity
                     portfolio_asset.average_price = new_avg_price.quantize(Decimal("0.0001"))
 
-                portfolio_asset.save(update_fields=['quantity', 'average_price'])
+                portfolio_asset.total_value = position_value(portfolio_asset.quantity, asset.current_price)
+                portfolio_asset.save(update_fields=['quantity', 'average_price', 'total_value'])
                 self._create_deal_from_pa_change(portfolio_asset, quantity_dec, price_dec, is_buy=True)
+                apply_position_delta(
+                    portfolio, old_contribution,
+                    position_contribution(portfolio_asset, asset.current_price)
+                )
 
-            self.recalculate_portfolio_aggregates(portfolio)
-
-            portfolio_asset.refresh_from_db()
             serializer = self.get_serializer(portfolio_asset)
             return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
@@ -239,35 +370,47 @@ class PortfolioAssetsViewSet(viewsets.ModelViewSet):
         sell_price = instance.average_price or Decimal('0.00')
 
         try:
-            self._create_deal_from_pa_change(instance, quantity_to_sell, sell_price, is_buy=False)
-            instance.delete()
-            self.recalculate_portfolio_aggregates(portfolio)
-            logger.info(f"Deleted PortfolioAsset for {asset_ticker} in portfolio {portfolio.Port_ID} and recalculated aggregates.")
+            with transaction.atomic():
+                portfolio = Portfolios.objects.select_for_update().get(Port_ID=portfolio.Port_ID)
+                old_contribution = position_contribution(instance, instance.asset.current_price)
+                self._create_deal_from_pa_change(instance, quantity_to_sell, sell_price, is_buy=False)
+                instance.delete()
+                apply_position_delta(portfolio, old_contribution, position_contribution(None, None))
+            logger.info(f"Deleted PortfolioAsset for {asset_ticker} in portfolio {portfolio.Port_ID} and updated aggregates.")
         except Exception as e:
             logger.error(f"Error during perform_destroy for PortfolioAsset {instance.ID}: {e}", exc_info=True)
             raise serializers.ValidationError(f"Ошибка при удалении актива и создании сделки: {e}")
 
 
-class DealsViewSet(viewsets.ModelViewSet):
+class DealsViewSet(PortfolioETagMixin, viewsets.ModelViewSet):
     serializer_class = DealsSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
+    # Порядок (?ordering=date|-date) задает keyset-пагинация по (date, Deal_ID); другие значения — 400
+    pagination_class = DealsCursorPagination
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['asset', 'type', 'status']
     search_fields = ['asset__ticker', 'asset__company']
-    ordering_fields = ['date', 'asset__ticker', 'type', 'total']
 
     def update_portfolio_assets_from_deal(self, deal_instance):
-        logger.warning(f"Function update_portfolio_assets_from_deal not fully implemented for Deal ID: {deal_instance.Deal_ID}")
-        pass
-
-    def recalculate_portfolio_aggregates(self, portfolio):
-         if not portfolio: return
-         logger.info(f"Recalculating aggregates in DealsViewSet for Portfolio ID: {portfolio.Port_ID}")
-         try:
-             pa_viewset = PortfolioAssetsViewSet()
-             pa_viewset.recalculate_portfolio_aggregates(portfolio)
-         except Exception as e:
-             logger.error(f"Failed to recalculate portfolio from DealsViewSet: {e}", exc_info=True)
+        # Позиция и агрегаты портфеля обновляются по одной сделке, без пересчета всего портфеля
+        apply_deal(deal_instance)
+
+    def rebuild_portfolio_positions(self, *deals):
+        # Изменение или удаление сделки меняет историю — позиции пересобираются из журнала.
+        # deals — пары (портфель, актив) сделки до и после изменения: позиция по активу,
+        # у которого в портфеле не осталось сделок, закрывается
+        asset_ids = {}
+        for portfolio_id, asset_id in deals:
+            asset_ids.setdefault(portfolio_id, set()).add(asset_id)
+        for portfolio_id in sorted(asset_ids):
+            rebuild_portfolio(portfolio_id, asset_ids=asset_ids[portfolio_id])
+
+    def get_etag_portfolios(self):
+        portfolios = super().get_etag_portfolios()
+        portfolio_pk = self.kwargs.get('portfolio_pk')
+        if portfolio_pk:
+            portfolios = portfolios.filter(Port_ID=portfolio_pk)
+        return portfolios
 
     def get_queryset(self):
         portfolio_pk = self.kwargs.get('portfolio_pk')
@@ -285,16 +428,92 @@ class DealsViewSet(viewsets.ModelViewSet):
         portfolio_pk = self.kwargs.get('portfolio_pk')
         try:
             portfolio = Portfolios.objects.get(Port_ID=portfolio_pk, user=self.request.user)
-            deal_instance = serializer.save(portfolio=portfolio)
-            self.update_portfolio_assets_from_deal(deal_instance)
-            self.recalculate_portfolio_aggregates(portfolio)
-            logger.info(f"Deal {deal_instance.Deal_ID} created for portfolio {portfolio_pk}. Aggregates updated (TODO: Verify logic).")
+            with transaction.atomic():
+                deal_instance = serializer.save(portfolio=portfolio)
+                self.update_portfolio_assets_from_deal(deal_instance)
+            logger.info(f"Deal {deal_instance.Deal_ID} created for portfolio {portfolio_pk}. Positions and aggregates updated.")
         except Portfolios.DoesNotExist:
             raise serializers.ValidationError("Указанный портфель не найден или не принадлежит вам.")
         except Exception as e:
              logger.exception(f"Error creating deal for portfolio {portfolio_pk}")
              raise serializers.ValidationError(f"Ошибка при создании сделки: {e}")
 
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_report(self, request, portfolio_pk=None):
+        portfolio_id = int(portfolio_pk)
+        if not Portfolios.objects.filter(Port_ID=portfolio_id, user=request.user).exists():
+            return Response({"detail": "Portfolio not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"file": "A CSV or NDJSON report file is required."}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or ('csv' if upload.name.lower().endswith('.csv') else 'ndjson')
+        if file_format not in ('csv', 'ndjson'):
+            return Response({"file_format": "Must be csv or ndjson."}, status=status.HTTP_400_BAD_REQUEST)
+
+        address = DEFAULT_IMPORT_ADDRESS
+        source_id = request.data.get('source')
+        if source_id:
+            try:
+                address = DealSource.objects.get(Source_ID=source_id).name
+            except (DealSource.DoesNotExist, ValueError):
+                return Response({"source": "Deal source not found."}, status=status.HTTP_400_BAD_REQUEST)
+        skip_invalid = str(request.data.get('skip_invalid', '')).lower() in ('1', 'true', 'yes')
+
+        # Файл читается потоком, без загрузки отчета в память целиком
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            result = import_deals(portfolio_id, read_report_rows(stream, file_format), address, skip_invalid=skip_invalid)
+        except (csv.Error, UnicodeDecodeError) as e:
+            return Response({"file": f"Could not read report: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        failed = result['invalid'] and not skip_invalid
+        return Response(result, status=status.HTTP_400_BAD_REQUEST if failed else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='export', renderer_classes=EXPORT_RENDERERS)
+    def export(self, request, portfolio_pk=None):
+        portfolio_id = int(portfolio_pk)
+        if not Portfolios.objects.filter(Port_ID=portfolio_id, user=request.user).exists():
+            return Response({"detail": "Portfolio not found."}, status=status.HTTP_404_NOT_FOUND)
+        return deals_export(portfolio_id, request.accepted_renderer.format, asynchronous=is_asgi_request(request))
+
+    def perform_update(self, serializer):
+        old_deal = (serializer.instance.portfolio_id, serializer.instance.asset_id)
+        with transaction.atomic():
+            deal_instance = serializer.save()
+            self.rebuild_portfolio_positions(old_deal, (deal_instance.portfolio_id, deal_instance.asset_id))
+
+    def perform_destroy(self, instance):
+        deal = (instance.portfolio_id, instance.asset_id)
+        with transaction.atomic():
+            instance.delete()
+            self.rebuild_portfolio_positions(deal)
+
+
+class PriceTicksView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+    max_batch_size = 10000
+
+    def post(self, request, *args, **kwargs):
+        raw_ticks = request.data.get('ticks') if isinstance(request.data, dict) else request.data
+        if not isinstance(raw_ticks, list) or not raw_ticks:
+            return Response({"ticks": "A non-empty list of ticks is required."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(raw_ticks) > self.max_batch_size:
+            return Response(
+                {"ticks": f"Batch size cannot exceed {self.max_batch_size} ticks."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        ticks, errors = parse_ticks(raw_ticks)
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = ingest_price_ticks(ticks)
+        except Exception as e:
+            logger.exception("Error while ingesting price ticks")
+            return Response({"detail": f"An internal error occurred: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(result, status=status.HTTP_200_OK)
+
 
 class AuthUserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
@@ -302,20 +521,6 @@ class AuthUserViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAdminUser]
 
 
-def tinkoff_money_to_decimal_string(money_value):
-    if money_value is None:
-        return None
-    if not hasattr(money_value, 'units') or not hasattr(money_value, 'nano'):
-         logger.warning(f"Input object lacks 'units' or 'nano': {money_value}")
-         return None
-    try:
-        fractional = Decimal(money_value.nano) / Decimal(1_000_000_000)
-        total = Decimal(money_value.units) + fractional
-        return str(total)
-    except Exception as e:
-        logger.error(f"Error converting Tinkoff value to Decimal: {money_value}, Error: {e}")
-        return None
-
 class TinkoffPortfolioView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -328,108 +533,142 @@ class TinkoffPortfolioView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        app_name = "your_app_name.my_portfolio_emulator"
-
         try:
-            with Client(token=tinkoff_token, app_name=app_name) as client:
-                accounts_response = client.users.get_accounts()
-
-                if not accounts_response.accounts:
-                     return Response(
-                        {"error": "No Tinkoff accounts found for this token."},
-                        status=status.HTTP_404_NOT_FOUND
-                    )
-
-                target_account_id = None
-                for acc in accounts_response.accounts:
-                    if acc.status == 2 and acc.access_level in (
-                        AccessLevel.ACCOUNT_ACCESS_LEVEL_FULL_ACCESS,
-                        AccessLevel.ACCOUNT_ACCESS_LEVEL_READ_ONLY
-                    ):
-                       target_account_id = acc.id
-                       logger.info(f"Found accessible Tinkoff account: {target_account_id} (Access: {acc.access_level.name})")
-                       break
-
-                if not target_account_id:
-                    if accounts_response.accounts:
-                        first_acc = accounts_response.accounts[0]
-                        if first_acc.status == 2: # 2 is ACCOUNT_STATUS_OPEN
-                            target_account_id = first_acc.id
-                            logger.warning(f"No account with full/read-only access found. Trying the first open account: {target_account_id} (Status: {first_acc.status}, Access: {first_acc.access_level.name})")
-                        else:
-                            logger.error(f"First account found ({first_acc.id}) is not open (Status: {first_acc.status}). Cannot proceed.")
-                            return Response(
-                                {"error": "No suitable Tinkoff accounts found (check access level and status)."},
-                                status=status.HTTP_404_NOT_FOUND
-                            )
-                    else:
-                         return Response(
-                            {"error": "No Tinkoff accounts found for this token."},
-                            status=status.HTTP_404_NOT_FOUND
-                        )
-
-                logger.info(f"Fetching Tinkoff portfolio for account ID: {target_account_id}")
-
-                portfolio_response = client.operations.get_portfolio(account_id=target_account_id)
-
-                result_data = {
-                    'account_id': target_account_id,
-                    'total_amount_shares': tinkoff_money_to_decimal_string(portfolio_response.total_amount_shares),
-                    'total_amount_bonds': tinkoff_money_to_decimal_string(portfolio_response.total_amount_bonds),
-                    'total_amount_etf': tinkoff_money_to_decimal_string(portfolio_response.total_amount_etf),
-                    'total_amount_currencies': tinkoff_money_to_decimal_string(portfolio_response.total_amount_currencies),
-                    'total_amount_futures': tinkoff_money_to_decimal_string(portfolio_response.total_amount_futures),
-                    'expected_yield': tinkoff_money_to_decimal_string(portfolio_response.expected_yield),
-                    'total_amount_portfolio': tinkoff_money_to_decimal_string(portfolio_response.total_amount_portfolio),
-                    'positions': [
-                        {
-                            'figi': pos.figi,
-                            'instrument_type': pos.instrument_type,
-                            'quantity': tinkoff_money_to_decimal_string(pos.quantity),
-                            'average_position_price': tinkoff_money_to_decimal_string(pos.average_position_price),
-                            'average_position_price_currency': pos.average_position_price.currency if pos.average_position_price else None,
-                            'expected_yield': tinkoff_money_to_decimal_string(pos.expected_yield),
-                            'current_nkd': tinkoff_money_to_decimal_string(pos.current_nkd),
-                            'current_nkd_currency': pos.current_nkd.currency if pos.current_nkd else None,
-                            'current_price': tinkoff_money_to_decimal_string(pos.current_price),
-                            'current_price_currency': pos.current_price.currency if pos.current_price else None,
-                            'quantity_lots': tinkoff_money_to_decimal_string(pos.quantity_lots),
-                        } for pos in portfolio_response.positions if pos
-                    ],
-                }
-                return Response(result_data, status=status.HTTP_200_OK)
+            result_data, cached = get_portfolio_cached(tinkoff_token)
+            return Response({**result_data, 'cached': cached}, status=status.HTTP_200_OK)
+
+        except TinkoffAccountError as e:
+            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
 
         except RequestError as e:
-            if hasattr(e, 'code') and e.code == grpc.StatusCode.UNAUTHENTICATED:
-                logger.error(f"Tinkoff API Unauthenticated: Code={e.code}, Details='{e.details}'", exc_info=False)
-                error_message = "Authentication failed: Invalid or expired Tinkoff API token."
-                return Response({"error": error_message}, status=status.HTTP_401_UNAUTHORIZED)
+            error_data, status_code = request_error_payload(e)
+            return Response(error_data, status=status_code)
 
-            elif hasattr(e, 'code') and e.code == grpc.StatusCode.PERMISSION_DENIED:
-                logger.error(f"Tinkoff API Permission Denied: Code={e.code}, Details='{e.details}'", exc_info=False)
-                error_message = "Permission denied: Token lacks necessary rights for this operation."
-                return Response({"error": error_message}, status=status.HTTP_403_FORBIDDEN)
+        except InvestError as e:
+             logger.error(f"Tinkoff Invest Library Error: {e}", exc_info=True)
+             return Response({"error": f"Tinkoff SDK Error: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            elif hasattr(e, 'code') and e.code == grpc.StatusCode.NOT_FOUND:
-                logger.error(f"Tinkoff API Not Found: Code={e.code}, Details='{e.details}'", exc_info=False)
-                error_message = f"Tinkoff resource not found: {e.details}"
-                return Response({"error": error_message}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            logger.exception("Unexpected error while fetching Tinkoff portfolio")
+            return Response(
+                {"error": f"An unexpected server error occurred: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
 
-            else:
-                tracking_id = getattr(e, 'tracking_id', 'N/A')
-                error_code_name = e.code.name if hasattr(e, 'code') and hasattr(e.code, 'name') else 'UNKNOWN'
-                logger.error(f"Tinkoff API RequestError: Code={error_code_name}, Details='{getattr(e, 'details', 'Unknown')}', TrackingID={tracking_id}", exc_info=True)
-                error_message = f"Tinkoff API request error: {getattr(e, 'details', 'An error occurred with the request')} (Code: {error_code_name})"
-                status_code = status.HTTP_502_BAD_GATEWAY if tracking_id != 'N/A' else status.HTTP_500_INTERNAL_SERVER_ERROR
-                return Response({"error": error_message}, status=status_code)
+
+def _authenticate(request):
+    # DRF-аутентификация (Token/JWT) для обычной Django-вьюхи
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = drf_request.user
+    except APIException:
+        return None
+    return user if user and user.is_authenticated else None
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncTinkoffPortfolioView(View):
+    """Асинхронная версия TinkoffPortfolioView для ASGI.
+
+    Не держит воркер на время gRPC-вызовов: под ASGI канал к брокеру общий
+    для процесса, на каждый вызов действует TINKOFF_API_TIMEOUT. Кэш и
+    склейка запросов общие с синхронной вьюхой.
+    """
+    http_method_names = ['post']
+
+    async def post(self, request, *args, **kwargs):
+        user = await sync_to_async(_authenticate)(request)
+        if user is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({"error": "Invalid JSON body."}, status=status.HTTP_400_BAD_REQUEST)
+        tinkoff_token = data.get('tinkoff_token') if isinstance(data, dict) else None
+        if not tinkoff_token:
+            return JsonResponse({"error": "Tinkoff API token is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # Под WSGI вьюха выполняется в своем цикле на запрос — кэшированный канал пережил бы его
+            result_data, cached = await get_portfolio_cached_async(
+                tinkoff_token, shared_channel=is_asgi_request(request)
+            )
+            return JsonResponse({**result_data, 'cached': cached}, status=status.HTTP_200_OK)
+
+        except TinkoffAccountError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+        except (RequestError, AioRequestError) as e:
+            error_data, status_code = request_error_payload(e)
+            return JsonResponse(error_data, status=status_code)
+
+        except asyncio.TimeoutError:
+            logger.error(f"Tinkoff API call timed out after {settings.TINKOFF_API_TIMEOUT}s")
+            return JsonResponse({"error": "Tinkoff API did not respond in time."}, status=status.HTTP_504_GATEWAY_TIMEOUT)
 
         except InvestError as e:
              logger.error(f"Tinkoff Invest Library Error: {e}", exc_info=True)
-             return Response({"error": f"Tinkoff SDK Error: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+             return JsonResponse({"error": f"Tinkoff SDK Error: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         except Exception as e:
             logger.exception("Unexpected error while fetching Tinkoff portfolio")
-            return Response(
+            return JsonResponse(
                 {"error": f"An unexpected server error occurred: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+
+def _internal_address(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_NETWORKS)
+
+
+class MetricsView(View):
+    """Гистограммы запросов процесса для Prometheus.
+
+    Если задан METRICS_TOKEN, нужен заголовок ``Authorization: Bearer <token>``.
+    Без токена метрики отдаются только адресам из METRICS_ALLOWED_NETWORKS
+    и сотрудникам (is_staff).
+    """
+    http_method_names = ['get']
+
+    def get(self, request, *args, **kwargs):
+        token = settings.METRICS_TOKEN
+        if token:
+            if not constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {token}"):
+                return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+        elif not _internal_address(request.META.get('REMOTE_ADDR', '')):
+            user = _authenticate(request)
+            if user is None:
+                return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+            if not user.is_staff:
+                return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class ProfilesView(APIView):
+    """Последние профили запросов (ProfilingMiddleware), только для сотрудников."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get('limit', 50))
+        except ValueError:
+            return Response({"limit": "Must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(list_profiles(max(1, min(limit, settings.PROFILING_KEEP))))
+
+
+class ProfileDownloadView(APIView):
+    """Файл pstats профиля для snakeviz/flameprof, только для сотрудников."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, profile_id, *args, **kwargs):
+        path = profile_path(profile_id)
+        if path is None or not os.path.exists(path):
+            return Response({"detail": "Profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f"{profile_id}.prof",
+                            content_type='application/octet-stream')
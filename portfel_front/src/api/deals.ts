@@ -1,9 +1,22 @@
 import { apiClient } from './index';
 import { Deal } from '../types/portfolio';
 
+export interface DealsPage {
+    next: string | null;
+    previous: string | null;
+    results: Deal[];
+}
+
 export const dealsApi = {
-    getPortfolioDeals: async (portfolioId: number): Promise<Deal[]> => {
-        const response = await apiClient.get(`/portfolios/${portfolioId}/deals/`);
+    // Первая страница истории (keyset-пагинация на бэкенде); дальше — по ссылке next
+    getPortfolioDeals: async (portfolioId: number): Promise<DealsPage> => {
+        const response = await apiClient.get<DealsPage>(`/portfolios/${portfolioId}/deals/`);
+        return response.data;
+    },
+
+    // Следующая/предыдущая страница по ссылке next/previous из ответа
+    getDealsPage: async (url: string): Promise<DealsPage> => {
+        const response = await apiClient.get<DealsPage>(url);
         return response.data;
     },
 
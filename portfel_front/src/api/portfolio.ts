@@ -1,5 +1,5 @@
 import { apiClient } from './index';
-import { Portfolio, PortfolioAsset } from '../types/portfolio';
+import { Portfolio, PortfolioAsset, PortfolioHistory } from '../types/portfolio';
 
 export const portfolioApi = {
     getPortfolios: async (): Promise<Portfolio[]> => {
@@ -17,6 +17,15 @@ export const portfolioApi = {
         return response.data;
     },
 
+    // Ряд снимков стоимости для PerformanceChart, уже прореженный на бэкенде
+    getPortfolioHistory: async (
+        portfolioId: number,
+        params: { start?: string; end?: string; resolution?: PortfolioHistory['resolution'] } = {}
+    ): Promise<PortfolioHistory> => {
+        const response = await apiClient.get(`/portfolios/${portfolioId}/history/`, { params });
+        return response.data;
+    },
+
     deletePortfolio: async (portfolioId: number) => {
         await apiClient.delete(`/portfolios/${portfolioId}/`);
     },
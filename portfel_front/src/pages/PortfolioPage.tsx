@@ -10,7 +10,7 @@ import {
     fetchTinkoffPortfolio,
     clearTinkoffData
 } from '../store/slices/portfolioSlice';
-import {fetchPortfolioDeals, addNewDeal} from '../store/slices/dealsSlice';
+import {fetchPortfolioDeals, fetchMoreDeals, addNewDeal} from '../store/slices/dealsSlice';
 import {Asset, PortfolioAsset, Deal} from '../types/portfolio';
 import {
     Button,
@@ -84,7 +84,9 @@ const PortfolioDetail = () => {
 
     const {
         deals,
+        next: dealsNext,
         status: dealsStatus,
+        loadMoreStatus: dealsLoadMoreStatus,
         error: dealsError,
     } = useAppSelector((state) => state.deals);
 
@@ -479,6 +481,20 @@ const PortfolioDetail = () => {
                                     </Table>
                                 </TableContainer>
                             )}
+                            {dealsStatus !== 'loading' && dealsNext && (
+                                <Box sx={{display: 'flex', justifyContent: 'center', alignItems: 'center', gap: 2, mt: 2}}>
+                                    {dealsLoadMoreStatus === 'failed' && (
+                                        <Typography variant="body2" color="error">Failed to load more deals.</Typography>
+                                    )}
+                                    <Button
+                                        variant="outlined"
+                                        onClick={() => dispatch(fetchMoreDeals())}
+                                        disabled={dealsLoadMoreStatus === 'loading'}
+                                    >
+                                        {dealsLoadMoreStatus === 'loading' ? <CircularProgress size={24}/> : 'Load more'}
+                                    </Button>
+                                </Box>
+                            )}
                         </Paper>
                     </Grid>
 
@@ -1,16 +1,22 @@
 import { createAsyncThunk, createSlice } from '@reduxjs/toolkit';
 import { dealsApi } from '../../api/deals';
+import type { RootState } from '../store';
 import { Deal } from '../../types/portfolio';
 
 interface DealsState {
     deals: Deal[];
+    // Ссылка на следующую страницу истории; null — загружена вся история
+    next: string | null;
     status: 'idle' | 'loading' | 'succeeded' | 'failed';
+    loadMoreStatus: 'idle' | 'loading' | 'failed';
     error: string | null;
 }
 
 const initialState: DealsState = {
     deals: [],
+    next: null,
     status: 'idle',
+    loadMoreStatus: 'idle',
     error: null,
 };
 
@@ -25,6 +31,21 @@ export const fetchPortfolioDeals = createAsyncThunk(
     }
 );
 
+export const fetchMoreDeals = createAsyncThunk(
+    'deals/fetchMore',
+    async (_: void, { getState, rejectWithValue }) => {
+        const next = (getState() as RootState).deals.next;
+        if (!next) {
+            return rejectWithValue('No more deals');
+        }
+        try {
+            return await dealsApi.getDealsPage(next);
+        } catch (error) {
+            return rejectWithValue('Failed to fetch more deals');
+        }
+    }
+);
+
 export const addNewDeal = createAsyncThunk(
     'deals/add',
     async (
@@ -50,7 +71,20 @@ const dealsSlice = createSlice({
             })
             .addCase(fetchPortfolioDeals.fulfilled, (state, action) => {
                 state.status = 'succeeded';
-                state.deals = action.payload;
+                state.deals = action.payload.results;
+                state.next = action.payload.next;
+                state.loadMoreStatus = 'idle';
+            })
+            .addCase(fetchMoreDeals.pending, (state) => {
+                state.loadMoreStatus = 'loading';
+            })
+            .addCase(fetchMoreDeals.fulfilled, (state, action) => {
+                state.loadMoreStatus = 'idle';
+                state.deals.push(...action.payload.results);
+                state.next = action.payload.next;
+            })
+            .addCase(fetchMoreDeals.rejected, (state) => {
+                state.loadMoreStatus = 'failed';
             })
             .addCase(addNewDeal.fulfilled, (state, action) => {
                 state.deals.push(action.payload);
@@ -10,6 +10,21 @@ export interface Portfolio {
     portfolio_assets: PortfolioAsset[];
 }
 
+export interface PortfolioHistoryPoint {
+    timestamp: string;
+    total_value: string;
+    cost: string;
+    profit_loss: string;
+}
+
+export interface PortfolioHistory {
+    portfolio: number;
+    resolution: 'hour' | 'day' | 'week' | 'month';
+    start: string;
+    end: string;
+    points: PortfolioHistoryPoint[];
+}
+
 export interface PortfolioAsset {
     ID: number;
     portfolio: number;